@@ -1,6 +1,7 @@
+import asyncio
 import json
 import logging
-from typing import Callable
+from collections.abc import Callable
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from decouple import config
@@ -15,7 +16,9 @@ from telegram.ext import (
 )
 
 from bus_service.adapter import BusServiceAdapter
-from utils.custom_typings import AllBusRoutes, AllBusStops, BusRoute, BusStop
+from bus_service.bus_arrival import close_client, get_cache_stats
+from bus_service.prefetch import register_prefetch_job
+from bus_service.snapshot import read_snapshot, write_snapshot
 from reply_handlers.callback_query_handler import (
     bus_stop_handler,
     route_direction_handler,
@@ -27,7 +30,9 @@ from reply_handlers.settings_handler import (
 )
 from reply_handlers.text_reply_handler import message_handler
 from scripts import fetch_routes, fetch_stops
-from storage.adapter import StorageUtility
+from storage.adapter import StorageUtility, create_backend
+from storage.async_adapter import AsyncStorageUtility
+from utils.custom_typings import AllBusRoutes, AllBusStops
 
 # Enable logging
 logging.basicConfig(
@@ -39,6 +44,12 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 DEVELOPMENT_MODE = config("DEVELOPMENT_MODE", default=False, cast=bool)
+# local copy of the datasets used for a fast start, refreshed from the LTA API
+SNAPSHOT_PATH = config("SNAPSHOT_PATH", default="bus_data.snapshot", cast=str)
+# stops within this distance in metres are listed when a location is sent
+NEARBY_RADIUS = config("NEARBY_RADIUS", default=400, cast=float)
+MIN_NEARBY_STOPS = 3  # listed even if they are further than NEARBY_RADIUS
+MAX_NEARBY_STOPS = 8
 
 
 # Define a few command handlers. These usually take the two arguments update and
@@ -54,6 +65,12 @@ async def start(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
 View the list of bus routes along the bus stop with the bus number
 `170`
 
+View the bus services stopping at a bus stop
+`services 08031`
+
+Plan a trip between two bus stops, with up to one transfer
+`plan 45359 59009`
+
 Save the BusStopCode for quick access and view the list of saved stops with /list
 `save 08031`
 
@@ -66,7 +83,10 @@ You can also send your location to find the nearest stops!
 
 def location_handler(bus_service_adapter: BusServiceAdapter) -> Callable:
     """
-    send prompt for users to select nearest bus stop (out of 3 candidates)
+    send prompt for users to select a nearby bus stop
+
+    lists every stop within NEARBY_RADIUS, up to MAX_NEARBY_STOPS,
+    or the MIN_NEARBY_STOPS closest stops if there are not enough nearby
     """
 
     async def location(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
@@ -74,18 +94,21 @@ def location_handler(bus_service_adapter: BusServiceAdapter) -> Callable:
         if update.message is None or update.message.location is None:
             return
         # get nearest stops
-        latitude = update.message.location.latitude
-        longitude = update.message.location.longitude
-        nearest_stops: list[BusStop] = bus_service_adapter.get_nearest_stops(
-            (latitude, longitude), 3
-        )
+        coord = (update.message.location.latitude, update.message.location.longitude)
+        index = bus_service_adapter.index
+        nearby_stops = index.get_stops_within(coord, NEARBY_RADIUS, MAX_NEARBY_STOPS)
+        if len(nearby_stops) < MIN_NEARBY_STOPS:
+            nearby_stops = index.get_nearest_stops(coord, MIN_NEARBY_STOPS)
 
         # build keyboard
-        keyboard = list(map(get_stop_inline_button, nearest_stops))
+        keyboard = [
+            get_stop_inline_button(stop, distance) for stop, distance in nearby_stops
+        ]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
         await update.message.reply_text(
-            "Here are the 3 closest bus stops:", reply_markup=reply_markup
+            f"Here are the {len(nearby_stops)} closest bus stops:",
+            reply_markup=reply_markup,
         )
 
     return location
@@ -93,45 +116,112 @@ def location_handler(bus_service_adapter: BusServiceAdapter) -> Callable:
 
 def fetch_stops_and_routes(
     development_mode: bool = False,
-) -> tuple[list[BusStop], list[BusRoute]]:
+) -> tuple[AllBusStops, AllBusRoutes]:
     """
     Fetches bus stops and routes data.
     """
     if development_mode:
         with open("bus_stops.json") as f1, open("bus_routes.json") as f2:
             all_stops: AllBusStops = json.load(f1)
-            bus_stops = all_stops["bus_stops"]
             all_routes: AllBusRoutes = json.load(f2)
-            bus_routes = all_routes["bus_routes"]
         logger.info("Load data from local filesystem")
     else:
         all_stops: AllBusStops = fetch_stops.run()
-        bus_stops = all_stops["bus_stops"]
         all_routes: AllBusRoutes = fetch_routes.run()
-        bus_routes = all_routes["bus_routes"]
         logger.info("Fetched latest data from LTA API")
-    return bus_stops, bus_routes
+    return all_stops, all_routes
 
 
 def refresh_bus_service_adapter(bus_service_adapter: BusServiceAdapter):
     """refreshes the service integrator"""
 
     def refresh() -> None:
-        bus_service_adapter.refresh(*fetch_stops_and_routes())
+        all_stops, all_routes = fetch_stops_and_routes()
+        index = bus_service_adapter.index
+        changed = (
+            all_stops["checksum"] != index.stops_checksum
+            or all_routes["checksum"] != index.routes_checksum
+        )
+        bus_service_adapter.refresh(all_stops, all_routes)
+        if changed:
+            index = bus_service_adapter.index
+            write_snapshot(
+                SNAPSHOT_PATH,
+                all_stops,
+                all_routes,
+                index.token_postings,
+                index.route_table,
+            )
+            logger.info("Saved snapshot to %s", SNAPSHOT_PATH)
 
     return refresh
 
 
+def load_bus_service_adapter(
+    scheduler: BackgroundScheduler,
+) -> BusServiceAdapter:
+    """
+    create the service integrator
+
+    starts from the local snapshot if there is one and refreshes it from the API
+    in the background, otherwise waits for the API
+    """
+    if DEVELOPMENT_MODE:
+        return BusServiceAdapter(*fetch_stops_and_routes(development_mode=True))
+
+    snapshot = read_snapshot(SNAPSHOT_PATH)
+    if snapshot is None:
+        all_stops, all_routes = fetch_stops_and_routes()
+        bus_service_adapter = BusServiceAdapter(all_stops, all_routes)
+        index = bus_service_adapter.index
+        write_snapshot(
+            SNAPSHOT_PATH,
+            all_stops,
+            all_routes,
+            index.token_postings,
+            index.route_table,
+        )
+        return bus_service_adapter
+
+    logger.info("Load data from snapshot %s", SNAPSHOT_PATH)
+    bus_service_adapter = BusServiceAdapter(*snapshot)
+    # without a trigger, the job runs once as soon as the scheduler starts
+    scheduler.add_job(refresh_bus_service_adapter(bus_service_adapter))
+    return bus_service_adapter
+
+
+def log_cache_stats(storage_utility: AsyncStorageUtility) -> None:
+    """logs arrival and profile cache statistics to help with sizing the caches"""
+    logger.info("Arrival cache stats: %s", get_cache_stats())
+    logger.info(
+        "Profile cache stats: %s", storage_utility.storage_utility.get_cache_stats()
+    )
+
+
+def shutdown_handler(storage_utility: AsyncStorageUtility) -> Callable:
+    async def shutdown(_: Application) -> None:
+        """release resources held by the application"""
+        await close_client()
+        # waits for queued writes to be committed
+        await asyncio.to_thread(storage_utility.close)
+
+    return shutdown
+
+
 def main() -> None:
     """Start the bot."""
     # Init application state
-    bus_service_adapter = BusServiceAdapter(
-        *fetch_stops_and_routes(development_mode=DEVELOPMENT_MODE)
+    scheduler = BackgroundScheduler()
+    bus_service_adapter = load_bus_service_adapter(scheduler)
+    storage_utility = AsyncStorageUtility(
+        # user data is only kept in memory during development,
+        # unless STORAGE_BACKEND is set
+        StorageUtility(
+            create_backend(default="memory" if DEVELOPMENT_MODE else "sqlite")
+        )
     )
-    storage_utility = StorageUtility(in_memory=DEVELOPMENT_MODE)
 
     # Fetch new data once a week on Sundays
-    scheduler = BackgroundScheduler()
     scheduler.add_job(
         refresh_bus_service_adapter(bus_service_adapter),
         trigger="cron",
@@ -139,10 +229,21 @@ def main() -> None:
         hour=0,
         minute=0,
     )
+    scheduler.add_job(
+        log_cache_stats, args=[storage_utility], trigger="interval", hours=1
+    )
     scheduler.start()
 
     # Create the Application and pass it your bot's token.
-    application = Application.builder().token(config("BOT_TOKEN", cast=str)).build()
+    # updates are handled concurrently so that a slow LTA request for one user
+    # does not hold up replies to everyone else
+    application = (
+        Application.builder()
+        .token(config("BOT_TOKEN", cast=str))
+        .concurrent_updates(True)
+        .post_shutdown(shutdown_handler(storage_utility))
+        .build()
+    )
 
     # on different commands
     application.add_handler(CommandHandler("start", start))
@@ -171,6 +272,9 @@ def main() -> None:
     # settings
     register_settings_handlers(application, bus_service_adapter, storage_utility)
 
+    # keep arrival timings of saved stops warm
+    register_prefetch_job(application, storage_utility)
+
     # Run the bot until the user presses Ctrl-C
     application.run_polling(allowed_updates=Update.ALL_TYPES)
 
@@ -2,24 +2,169 @@
 composes functions to give enhanced output
 """
 
-from typing import Callable
+import logging
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
 
-from utils.custom_typings import BusRoute, BusStop
-from .bus_route import bus_route_utility
-from .bus_stops import bus_stop_utility
+from utils.custom_typings import AllBusRoutes, AllBusStops
 
-type GetRouteStops = Callable[[str, int], list[BusStop] | None]
+from .bus_route import (
+    GetStopServices,
+    RouteStops,
+    RouteTable,
+    bus_route_utility,
+    create_route_table,
+)
+from .bus_stops import (
+    BusStopUtility,
+    GetNearestStops,
+    GetNearestStopsBatch,
+    GetStopInfo,
+    GetStopPairsWithin,
+    GetStopsWithin,
+    bus_stop_utility,
+)
+from .journey_planner import PlanJourney, journey_planner_utility
+from .route_graph import GetShortestPath, route_graph_utility
+from .stop_search import SearchPossibleStops, TokenPostings, create_token_postings
+
+logger = logging.getLogger(__name__)
+
+type GetRouteStops = Callable[[str, int], RouteStops | None]
+
+
+@dataclass(frozen=True)
+class BusServiceIndex:
+    """
+    one generation of indexes, built from a single version of the datasets
+
+    never modified once built, a refresh builds a new generation instead
+    """
+
+    stops_checksum: str
+    routes_checksum: str
+    get_nearest_stops: GetNearestStops
+    get_nearest_stops_batch: GetNearestStopsBatch
+    get_stops_within: GetStopsWithin
+    get_stop_info: GetStopInfo
+    search_possible_stops: SearchPossibleStops
+    get_stop_pairs_within: GetStopPairsWithin
+    get_route_stops: GetRouteStops
+    get_stop_services: GetStopServices
+    plan_journey: PlanJourney
+    get_shortest_path: GetShortestPath
+    # kept so a snapshot can be written without building them again
+    token_postings: TokenPostings
+    route_table: RouteTable
+
+
+def build_index(
+    all_stops: AllBusStops,
+    all_routes: AllBusRoutes,
+    previous: BusServiceIndex | None = None,
+    token_postings: TokenPostings | None = None,
+    route_table: RouteTable | None = None,
+) -> BusServiceIndex:
+    """
+    build a generation of indexes
+
+    indexes of the previous generation are reused when the checksum
+    of their source data has not changed
+    token_postings and route_table can be passed in if they were already built,
+    e.g. when loaded from a snapshot
+    """
+    if previous is None or all_stops["checksum"] != previous.stops_checksum:
+        start = time.perf_counter()
+        if token_postings is None:
+            token_postings = create_token_postings(all_stops["bus_stops"])
+        stop_utility = bus_stop_utility(all_stops["bus_stops"], token_postings)
+        logger.info(
+            "Bus stops changed (checksum %s -> %s), rebuilt %d stops in %.3fs",
+            previous and previous.stops_checksum,
+            all_stops["checksum"],
+            len(all_stops["bus_stops"]),
+            time.perf_counter() - start,
+        )
+        # the route index resolves stops, so it is rebuilt whenever the stops change
+        routes_changed = True
+    else:
+        stop_utility = BusStopUtility(
+            get_nearest_stops=previous.get_nearest_stops,
+            get_nearest_stops_batch=previous.get_nearest_stops_batch,
+            get_stops_within=previous.get_stops_within,
+            get_stop_info=previous.get_stop_info,
+            search_possible_stops=previous.search_possible_stops,
+            get_stop_pairs_within=previous.get_stop_pairs_within,
+        )
+        token_postings = previous.token_postings
+        routes_changed = all_routes["checksum"] != previous.routes_checksum
+        logger.info("Bus stops unchanged, skipped rebuild")
+
+    if previous is None or routes_changed:
+        start = time.perf_counter()
+        if route_table is None:
+            route_table = create_route_table(all_routes["bus_routes"])
+        get_route_stops, get_stop_services = bus_route_utility(
+            all_routes["bus_routes"], stop_utility.get_stop_info, route_table
+        )
+        # a new planner starts with an empty cache of journeys
+        plan_journey = journey_planner_utility(get_route_stops, get_stop_services)
+        get_shortest_path = route_graph_utility(
+            all_stops["bus_stops"], route_table, stop_utility.get_stop_pairs_within
+        )
+        logger.info(
+            "Bus routes changed (checksum %s -> %s), rebuilt %d routes in %.3fs",
+            previous and previous.routes_checksum,
+            all_routes["checksum"],
+            len(all_routes["bus_routes"]),
+            time.perf_counter() - start,
+        )
+    else:
+        get_route_stops = previous.get_route_stops
+        get_stop_services = previous.get_stop_services
+        plan_journey = previous.plan_journey
+        get_shortest_path = previous.get_shortest_path
+        route_table = previous.route_table
+        logger.info("Bus routes unchanged, skipped rebuild")
+
+    return BusServiceIndex(
+        stops_checksum=all_stops["checksum"],
+        routes_checksum=all_routes["checksum"],
+        **stop_utility._asdict(),
+        get_route_stops=get_route_stops,
+        get_stop_services=get_stop_services,
+        plan_journey=plan_journey,
+        get_shortest_path=get_shortest_path,
+        token_postings=token_postings,
+        route_table=route_table,
+    )
 
 
 class BusServiceAdapter:
-    def __init__(self, bus_stops: list[BusStop], bus_routes: list[BusRoute]) -> None:
-        self.refresh(bus_stops, bus_routes)
-
-    def refresh(self, bus_stops: list[BusStop], bus_routes: list[BusRoute]) -> None:
-        """update functions"""
-        (
-            self.get_nearest_stops,
-            self.get_stop_info,
-            self.search_possible_stops,
-        ) = bus_stop_utility(bus_stops)
-        self.get_route_stops = bus_route_utility(bus_routes, self.get_stop_info)
+    """
+    holds the current generation of indexes
+
+    handlers should read self.index once and use it for the whole request,
+    so that a refresh part way through does not mix data from two generations
+    """
+
+    def __init__(
+        self,
+        all_stops: AllBusStops,
+        all_routes: AllBusRoutes,
+        token_postings: TokenPostings | None = None,
+        route_table: RouteTable | None = None,
+    ) -> None:
+        self.index = build_index(
+            all_stops, all_routes, None, token_postings, route_table
+        )
+
+    def refresh(self, all_stops: AllBusStops, all_routes: AllBusRoutes) -> None:
+        """
+        build the next generation of indexes and publish it
+
+        the new generation is built while the current one keeps serving requests,
+        then replaces it with a single reference assignment
+        """
+        self.index = build_index(all_stops, all_routes, previous=self.index)
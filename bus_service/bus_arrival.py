@@ -1,35 +1,160 @@
+import asyncio
+from collections import Counter
 from datetime import datetime
+import logging
 
 from decouple import config
-import requests
+import httpx
 
 from utils.custom_typings import BusArrivalServiceResponse, BusInfo, TimestampISO8601
-from utils.lru_cache import LRUCache
+from utils.lru_cache import CacheStats, LRUCache
+
+logger = logging.getLogger(__name__)
 
 URL_GET_ARRIVING_BUSSES = (
     "https://datamall2.mytransport.sg/ltaodataservice/v3/BusArrival"
 )
 
-__bus_info_cache = LRUCache[list[BusInfo]](ttl=20, item_limit=100)
+# time in seconds
+CONNECT_TIMEOUT = config("LTA_CONNECT_TIMEOUT", default=3.0, cast=float)
+READ_TIMEOUT = config("LTA_READ_TIMEOUT", default=5.0, cast=float)
+# upper bound on concurrent connections kept open to the LTA API
+MAX_CONNECTIONS = config("LTA_MAX_CONNECTIONS", default=20, cast=int)
+
+# arrival timings are served as they are for CACHE_TTL seconds
+# after which they are refreshed in the background while the stale copy is served,
+# up to CACHE_HARD_TTL seconds after they were fetched
+CACHE_TTL = config("ARRIVAL_CACHE_TTL", default=20, cast=int)
+CACHE_HARD_TTL = config("ARRIVAL_CACHE_HARD_TTL", default=60, cast=int)
+# number of bus stops to keep arrival timings for
+CACHE_SIZE = config("ARRIVAL_CACHE_SIZE", default=100, cast=int)
+
+__bus_info_cache = LRUCache[list[BusInfo]](
+    ttl=CACHE_TTL, item_limit=CACHE_SIZE, hard_ttl=CACHE_HARD_TTL
+)
+__client: httpx.AsyncClient | None = None
+# upstream requests that have not completed yet, keyed by BusStopCode
+__in_flight: dict[str, asyncio.Task[list[BusInfo]]] = {}
+# number of user lookups for each BusStopCode, bucketed by hour of day
+__request_counts: list[Counter[str]] = [Counter() for _ in range(24)]
+
+
+def __get_client() -> httpx.AsyncClient:
+    """
+    lazily create the shared HTTP client
+
+    the client is created on first use so that it is bound to the event loop
+    of the running application instead of the one (if any) at import time
+    """
+    global __client
+    if __client is None or __client.is_closed:
+        __client = httpx.AsyncClient(
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS,
+            ),
+        )
+    return __client
+
+
+async def close_client() -> None:
+    """
+    close the pooled connections to the LTA API
+    should be called once when the application shuts down
+    """
+    global __client
+    if __client is not None:
+        await __client.aclose()
+        __client = None
+
+
+def get_request_counts(hour: int) -> Counter[str]:
+    """
+    get the number of lookups for each bus stop made during an hour of the day
+    """
+    return __request_counts[hour].copy()
+
+
+def get_cache_stats() -> CacheStats:
+    """
+    get hit/miss statistics of the arrival timings cache
+    """
+    return __bus_info_cache.stats()
+
+
+async def get_arriving_busses(bus_stop_code: str) -> list[BusInfo]:
+    """
+    get bus arrival timings for a stop
+
+    stale timings are still accurate for display since arrival times are absolute
+    timestamps, so they are returned immediately while a refresh runs in the background
+    """
+    __request_counts[datetime.now().hour][bus_stop_code] += 1
+    cached = __bus_info_cache.get_stale(bus_stop_code)
+    if cached is not None:
+        arriving_busses, is_stale = cached
+        if is_stale:
+            __fetch_once(bus_stop_code)
+        return arriving_busses
+    # shield the shared request so that a cancelled caller
+    # does not cancel it for everyone else waiting on it
+    return await asyncio.shield(__fetch_once(bus_stop_code))
+
+
+async def prefetch_arriving_busses(bus_stop_code: str) -> bool:
+    """
+    warm the cache for a bus stop ahead of user lookups
+
+    returns False without making a request if the cached timings are still fresh
+    """
+    if __bus_info_cache.is_fresh(bus_stop_code):
+        return False
+    await asyncio.shield(__fetch_once(bus_stop_code))
+    return True
+
+
+def __fetch_once(bus_stop_code: str) -> asyncio.Task[list[BusInfo]]:
+    """
+    get the upstream request for a bus stop, starting one if none is in flight
+
+    concurrent cache misses for the same stop share a single request
+    """
+    task = __in_flight.get(bus_stop_code)
+    if task is None:
+        task = asyncio.create_task(__fetch_and_cache(bus_stop_code))
+        __in_flight[bus_stop_code] = task
+        task.add_done_callback(lambda t: __on_fetch_done(bus_stop_code, t))
+    return task
+
+
+def __on_fetch_done(bus_stop_code: str, task: asyncio.Task[list[BusInfo]]) -> None:
+    __in_flight.pop(bus_stop_code, None)
+    # background refreshes have no caller to raise to, so log their failures here
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(
+            "Failed to fetch arrivals for %s: %r", bus_stop_code, task.exception()
+        )
 
 
-def get_arriving_busses(bus_stop_code: str) -> list[BusInfo]:
-    arriving_busses = __bus_info_cache.get(bus_stop_code)
-    if arriving_busses is None:
-        arriving_busses = fetch_arriving_busses(bus_stop_code)
-        __bus_info_cache.set(bus_stop_code, arriving_busses)
+async def __fetch_and_cache(bus_stop_code: str) -> list[BusInfo]:
+    arriving_busses = await fetch_arriving_busses(bus_stop_code)
+    __bus_info_cache.set(bus_stop_code, arriving_busses)
     return arriving_busses
 
 
-def fetch_arriving_busses(bus_stop_code: str) -> list[BusInfo]:
+async def fetch_arriving_busses(bus_stop_code: str) -> list[BusInfo]:
     """
     fetch bus arrival timings from the LTA API
-    TODO add try-except to handle non status 200 responses
-    TODO add timeout for responses
+    raises httpx.HTTPError on timeouts and non status 2xx responses
+    TODO handle errors and show a message to the user
     """
     params = {"BusStopCode": bus_stop_code}
     headers = {"AccountKey": config("ACCOUNT_KEY")}
-    res = requests.get(URL_GET_ARRIVING_BUSSES, headers=headers, params=params)
+    res = await __get_client().get(
+        URL_GET_ARRIVING_BUSSES, headers=headers, params=params
+    )
+    res.raise_for_status()
     json_data: BusArrivalServiceResponse = res.json()
     return json_data["Services"]
 
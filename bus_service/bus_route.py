@@ -2,50 +2,175 @@
 search for bus stops within a route
 """
 
-from typing import Callable
+from collections.abc import Sequence
+from typing import Callable, NamedTuple
+
+import numpy as np
 
 from bus_service.bus_stops import GetStopInfo
 from utils.custom_typings import BusRoute, BusStop
 
-type GetBusRoute = Callable[[str, int], list[BusStop] | None]
+# columns of first_last_bus
+FIRST_LAST_BUS_FIELDS = (
+    "WD_FirstBus",
+    "WD_LastBus",
+    "SAT_FirstBus",
+    "SAT_LastBus",
+    "SUN_FirstBus",
+    "SUN_LastBus",
+)
+NO_SERVICE = -1  # "-" in the LTA dataset
+
+
+class RouteTable(NamedTuple):
+    """
+    columns of the bus routes dataset,
+    with rows sorted by ServiceNo, Direction and StopSequence
+
+    the rows of keys[i] are offsets[i] to offsets[i + 1]
+    """
+
+    keys: list[tuple[str, int]]  # (ServiceNo, Direction) of each route
+    offsets: np.ndarray  # int64
+    stop_codes: list[str]
+    distances: np.ndarray  # float32, in km from the start of the route
+    # int16 with a column for each of FIRST_LAST_BUS_FIELDS,
+    # in minutes after midnight, or NO_SERVICE
+    first_last_bus: np.ndarray
+
+
+class RouteStops(NamedTuple):
+    """
+    stops along a route with the distance and first/last bus times at each stop
+    """
+
+    stops: tuple[BusStop, ...]
+    distances: np.ndarray
+    first_last_bus: np.ndarray
+
+
+class StopService(NamedTuple):
+    """
+    a service calling at a bus stop
+    """
+
+    service: str  # ServiceNo
+    direction: int
+    sequence: int  # position of the stop in RouteStops.stops, starting from 0
+
+
+type GetBusRoute = Callable[[str, int], RouteStops | None]
+type GetStopServices = Callable[[str], Sequence[StopService]]
+
+
+def parse_bus_time(value: str) -> int:
+    """
+    convert a time from the LTA dataset to minutes after midnight
+    e.g. "0530" -> 330, "-" -> NO_SERVICE
+    """
+    if len(value) != 4 or not value.isdigit():
+        return NO_SERVICE
+    return int(value[:2]) * 60 + int(value[2:])
+
+
+def create_route_table(bus_routes: Sequence[BusRoute]) -> RouteTable:
+    """
+    sort bus routes by StopSequence and store them as columns
+    """
+    # rows are not guaranteed to be in order, e.g. if pages were fetched out of order
+    rows = sorted(
+        bus_routes,
+        key=lambda route: (
+            route["ServiceNo"],
+            route["Direction"],
+            route["StopSequence"],
+        ),
+    )
+
+    keys: list[tuple[str, int]] = []
+    lengths: list[int] = []
+    for route in rows:
+        key = (route["ServiceNo"], route["Direction"])
+        if len(keys) == 0 or keys[-1] != key:
+            keys.append(key)
+            lengths.append(0)
+        lengths[-1] += 1
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    return RouteTable(
+        keys=keys,
+        offsets=offsets,
+        stop_codes=[route["BusStopCode"] for route in rows],
+        distances=np.array([route["Distance"] for route in rows], dtype=np.float32),
+        first_last_bus=np.array(
+            [
+                [parse_bus_time(route[field]) for field in FIRST_LAST_BUS_FIELDS]
+                for route in rows
+            ],
+            dtype=np.int16,
+        ).reshape(-1, len(FIRST_LAST_BUS_FIELDS)),
+    )
 
 
 def bus_route_utility(
-    bus_routes: list[BusRoute], get_stop_info: GetStopInfo
-) -> GetBusRoute:
-    # {"67": ["44009", "44461", "44469", "44009"]}
-    bus_route_map: dict[tuple[str, int], list[str]] = {}
-
-    for route in bus_routes:
-        service_number = route["ServiceNo"]
-        direction = route["Direction"]
-        service = (service_number, direction)
-        if service not in bus_route_map:
-            bus_route_map[service] = []
-        bus_route_map[service].append(route["BusStopCode"])
-
-    def __get_bus_route(bus_number: str, direction: int) -> list[str] | None:
-        """
-        search for bus stops within a route
+    bus_routes: Sequence[BusRoute],
+    get_stop_info: GetStopInfo,
+    route_table: RouteTable | None = None,
+) -> tuple[GetBusRoute, GetStopServices]:
+    """
+    route_table can be passed in if it was already built for these routes,
+    e.g. when loaded from a snapshot
+    """
+    if route_table is None:
+        route_table = create_route_table(bus_routes)
 
-        returns a list of BusStopCode
-        """
-        return bus_route_map.get((bus_number, direction), None)
+    # resolve the stops of every route once, so lookups do not create new objects
+    # stops that are not in the list of stops are left out
+    resolved_routes: dict[tuple[str, int], RouteStops] = {}
+    bounds = route_table.offsets.tolist()
+    for key, start, end in zip(route_table.keys, bounds, bounds[1:]):
+        route_stops = [
+            get_stop_info(code) for code in route_table.stop_codes[start:end]
+        ]
+        known = [idx for idx, stop in enumerate(route_stops) if stop is not None]
+        if len(known) == end - start:
+            rows: slice | np.ndarray = slice(start, end)  # views instead of copies
+        else:
+            rows = np.array(known, dtype=np.int64) + start
+        resolved_routes[key] = RouteStops(
+            stops=tuple(stop for stop in route_stops if stop is not None),
+            distances=route_table.distances[rows],
+            first_last_bus=route_table.first_last_bus[rows],
+        )
+
+    # reverse index of BusStopCode to the services calling there, in route order
+    stop_services: dict[str, list[StopService]] = {}
+    for (service, direction), route in resolved_routes.items():
+        for sequence, stop in enumerate(route.stops):
+            if stop["BusStopCode"] not in stop_services:
+                stop_services[stop["BusStopCode"]] = []
+            stop_services[stop["BusStopCode"]].append(
+                StopService(service, direction, sequence)
+            )
 
-    def get_route_stops(bus_number: str, direction: int) -> list[BusStop] | None:
+    def get_route_stops(bus_number: str, direction: int) -> RouteStops | None:
         """
         get list stops along a bus route
         has either 1 or 2 possible directions (loop or bidirectional)
         """
-        route = __get_bus_route(bus_number, direction)
+        route = resolved_routes.get((bus_number, direction), None)
 
         if route is None:
             # possible that route 2 does not exist
-            route = __get_bus_route(bus_number, 1)
-        if route is None:
-            return None
+            route = resolved_routes.get((bus_number, 1), None)
+        return route
 
-        route_stops = map(get_stop_info, route)
-        return [route for route in route_stops if route is not None]
+    def get_stop_services(bus_stop_code: str) -> Sequence[StopService]:
+        """
+        get the services calling at a bus stop
+        a service is listed once for each time it calls at the stop
+        """
+        return stop_services.get(bus_stop_code, ())
 
-    return get_route_stops
+    return (get_route_stops, get_stop_services)
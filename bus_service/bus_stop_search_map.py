@@ -1,3 +1,5 @@
+from dataclasses import dataclass, field
+
 # full word to the abbreviations are on openstreetmap
 WORDS_MAP = {
     "academy": "acad",  # Civil Defence Acad
@@ -85,8 +87,86 @@ WORDS_MAP = {
 # S.A. Deaf -> Singapore Association
 
 
-def transform_query_token(query_token: str) -> str:
+# abbreviations to the full words they are used for, e.g. "int" -> ["interchange"]
+FULL_WORDS: dict[str, list[str]] = {}
+for word, abbreviation in WORDS_MAP.items():
+    if " " not in word:
+        FULL_WORDS.setdefault(abbreviation, []).append(word)
+
+
+@dataclass
+class PhraseTrie:
+    """
+    trie of phrases with more than one word, with one node per word
+    """
+
+    children: dict[str, "PhraseTrie"] = field(default_factory=dict)
+    abbreviation: str | None = None  # set if a phrase ends at this node
+
+
+def create_phrase_trie(words_map: dict[str, str]) -> PhraseTrie:
+    trie = PhraseTrie()
+    for phrase, abbreviation in words_map.items():
+        words = phrase.split()
+        if len(words) < 2:
+            continue
+        node = trie
+        for word in words:
+            node = node.children.setdefault(word, PhraseTrie())
+        node.abbreviation = abbreviation
+    return trie
+
+
+PHRASE_TRIE = create_phrase_trie(WORDS_MAP)
+
+
+def match_phrase(tokens: list[str], start: int) -> tuple[int, str] | None:
+    """
+    find the longest phrase starting at tokens[start]
+
+    returns the index after the end of the phrase and its abbreviation
+    """
+    node = PHRASE_TRIE
+    match = None
+    for end in range(start, len(tokens)):
+        next_node = node.children.get(tokens[end])
+        if next_node is None:
+            break
+        node = next_node
+        if node.abbreviation is not None:
+            match = (end + 1, node.abbreviation)
+    return match
+
+
+def normalise_query(tokens: list[str]) -> list[str]:
+    """
+    replace phrases in a lowercase query with their abbreviation
+    e.g. ["choa", "chu", "kang", "int"] -> ["cck", "int"]
+    """
+    normalised: list[str] = []
+    pos = 0
+    while pos < len(tokens):
+        match = match_phrase(tokens, pos)
+        if match is None:
+            normalised.append(tokens[pos])
+            pos += 1
+        else:
+            pos, abbreviation = match
+            normalised.append(abbreviation)
+    return normalised
+
+
+def expand_tokens(tokens: list[str]) -> list[list[str]]:
     """
-    transforms search query using a word mapping if it exists
+    add the full words of abbreviations, and abbreviations of phrases, to the
+    lowercase tokens of a description, at the position of the first word
+    e.g. ["choa", "chu", "kang", "int"]
+      -> [["choa", "cck"], ["chu"], ["kang"], ["int", "interchange"]]
     """
-    return WORDS_MAP.get(query_token) or query_token
+    expanded: list[list[str]] = []
+    for pos, token in enumerate(tokens):
+        aliases = [token, *FULL_WORDS.get(token, ())]
+        if token in PHRASE_TRIE.children and (match := match_phrase(tokens, pos)):
+            aliases.append(match[1])
+        expanded.append(aliases)
+    return expanded
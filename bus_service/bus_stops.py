@@ -1,88 +1,153 @@
 # workaround: pylance does not resolve cKDTree correctly
 from scipy.spatial import cKDTree as KDTree  # type: ignore[attr-defined]
 
-from typing import Callable, Optional
+from collections.abc import Sequence
+from typing import Callable, NamedTuple, Optional
+
+import numpy as np
+
 from utils.custom_typings import BusStop, Coordinate
-from .bus_stop_search_map import transform_query_token
+from .stop_search import SearchPossibleStops, TokenPostings, stop_search_utility
+
+EARTH_RADIUS = 6_371_008.8  # mean radius in metres
+
+
+class NearbyStop(NamedTuple):
+    stop: BusStop
+    distance: float  # in metres
 
-type GetNearestStops = Callable[[Coordinate, Optional[int]], list[BusStop]]
+
+type GetNearestStops = Callable[[Coordinate, int], list[NearbyStop]]
+type GetNearestStopsBatch = Callable[
+    [Sequence[Coordinate] | np.ndarray, int], list[list[NearbyStop]]
+]
+type GetStopsWithin = Callable[[Coordinate, float, Optional[int]], list[NearbyStop]]
 type GetStopInfo = Callable[[str], BusStop | None]
-type SearchPossibleStops = Callable[[list[str]], list[BusStop]]
+# pairs of indexes into the list of stops, and the distance between each pair
+type GetStopPairsWithin = Callable[[float], tuple[np.ndarray, np.ndarray]]
+
+
+class BusStopUtility(NamedTuple):
+    get_nearest_stops: GetNearestStops
+    get_nearest_stops_batch: GetNearestStopsBatch
+    get_stops_within: GetStopsWithin
+    get_stop_info: GetStopInfo
+    search_possible_stops: SearchPossibleStops
+    get_stop_pairs_within: GetStopPairsWithin
+
+
+def project_coordinates(coords: np.ndarray, origin: Coordinate) -> np.ndarray:
+    """
+    project (latitude, longitude) pairs onto a plane, in metres from origin
+
+    uses an equirectangular projection centred on origin,
+    which is accurate to well within a metre over the size of Singapore
+    """
+    origin_latitude, origin_longitude = origin
+    radians = np.radians(np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+    x = (radians[:, 1] - np.radians(origin_longitude)) * np.cos(
+        np.radians(origin_latitude)
+    )
+    y = radians[:, 0] - np.radians(origin_latitude)
+    return np.column_stack((x, y)) * EARTH_RADIUS
 
 
 def bus_stop_utility(
-    stops: list[BusStop],
-) -> tuple[GetNearestStops, GetStopInfo, SearchPossibleStops]:
+    stops: list[BusStop], token_postings: TokenPostings | None = None
+) -> BusStopUtility:
     """
     TODO description
     TODO usage instructions
+
+    token_postings can be passed in if it was already built for these stops,
+    e.g. when loaded from a snapshot
     """
     # convert [{"Latitude": 1, "Longitude": 130}] -> [(1, 130)]
-    stop_coordinates = tuple(
-        map(lambda stop: (stop["Latitude"], stop["Longitude"]), stops)
+    stop_coordinates = np.array(
+        [(stop["Latitude"], stop["Longitude"]) for stop in stops], dtype=np.float64
+    ).reshape(-1, 2)
+    # build the tree in metres, so distances are the same in every direction
+    origin: Coordinate = (
+        tuple(stop_coordinates.mean(axis=0).tolist()) if len(stops) > 0 else (0, 0)
     )
-    kd_tree = KDTree(stop_coordinates)
-
-    def get_nearest_stops(
-        coord: Coordinate, num_stops: Optional[int] = 3
-    ) -> list[BusStop]:
-        _, nd_indexes = kd_tree.query([coord], k=num_stops)
-        # convert numpy 2d array (with only 1 row) to list of integers
-        # numpy_ndarray -> [[1, 2, 3]] -> [1, 2, 3]
-        indexes = nd_indexes.tolist()[0]
-        # indexes is type Any since it is either (1) an integer or (2) array of integers
-        # should always be array of integers since we always(?) query for multiple stops
-        nearest_stops = list(map(lambda x: stops[x], indexes))
-        return nearest_stops
+    kd_tree = KDTree(project_coordinates(stop_coordinates, origin))
 
-    # create dictionary with BusStopCode as key and BusStop as value
-    stops_map = dict(zip(map(lambda x: x["BusStopCode"], stops), stops))
+    def to_nearby_stops(distances: list[float], indexes: list[int]) -> list[NearbyStop]:
+        return [
+            NearbyStop(stops[idx], distance)
+            for distance, idx in zip(distances, indexes)
+            # missing neighbours are reported with index len(stops)
+            if idx < len(stops)
+        ]
 
-    def get_stop_info(bus_stop_code: str) -> BusStop | None:
+    def get_nearest_stops(coord: Coordinate, num_stops: int = 3) -> list[NearbyStop]:
         """
-        obtain BusStop information for a given bus stop code
+        get the num_stops closest stops, nearest first
         """
-        return stops_map.get(bus_stop_code, None)
+        point = project_coordinates(coord, origin)[0]
+        # query with a list of k so results are always arrays, even for a single stop
+        distances, indexes = kd_tree.query(point, k=list(range(1, num_stops + 1)))
+        return to_nearby_stops(distances.tolist(), indexes.tolist())
 
-    def create_token_map(stops: list[BusStop]) -> dict[str, set[str]]:
+    def get_nearest_stops_batch(
+        coords: Sequence[Coordinate] | np.ndarray, num_stops: int = 3
+    ) -> list[list[NearbyStop]]:
         """
-        create map of word tokens to BusStopCodes
+        get the num_stops closest stops to each coordinate, nearest first
+
+        all coordinates are projected and queried in a single call,
+        which is much faster than calling get_nearest_stops for each of them
         """
-        token_map: dict[str, set[str]] = {}
-        for stop in stops:
-            tokens = stop["Description"].lower().split()
+        points = project_coordinates(np.asarray(coords), origin)
+        if len(points) == 0:
+            return []
+        distances, indexes = kd_tree.query(points, k=list(range(1, num_stops + 1)))
+        return [
+            to_nearby_stops(row_distances, row_indexes)
+            for row_distances, row_indexes in zip(distances.tolist(), indexes.tolist())
+        ]
 
-            for token in tokens:
-                if token not in token_map:
-                    # create set if it does not already exist
-                    token_map[token] = set()
-                token_map[token].add(stop["BusStopCode"])
+    def get_stops_within(
+        coord: Coordinate, radius: float, max_stops: Optional[int] = None
+    ) -> list[NearbyStop]:
+        """
+        get stops within radius metres, nearest first
+        at most max_stops stops are returned if it is given
+        """
+        point = project_coordinates(coord, origin)[0]
+        indexes = np.asarray(kd_tree.query_ball_point(point, radius), dtype=np.intp)
+        distances = np.hypot(*(kd_tree.data[indexes] - point).T)
+        order = np.argsort(distances, kind="stable")[:max_stops]
+        return [
+            NearbyStop(stops[idx], distance)
+            for distance, idx in zip(distances[order].tolist(), indexes[order].tolist())
+        ]
 
-        return token_map
+    def get_stop_pairs_within(radius: float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        get every pair of stops within radius metres of each other,
+        as an (n, 2) array of indexes into stops with i < j, and their distances
+        """
+        pairs = kd_tree.query_pairs(radius, output_type="ndarray").reshape(-1, 2)
+        distances = np.hypot(*(kd_tree.data[pairs[:, 0]] - kd_tree.data[pairs[:, 1]]).T)
+        return pairs, distances
 
-    token_map = create_token_map(stops)
+    # create dictionary with BusStopCode as key and BusStop as value
+    stops_map = dict(zip(map(lambda x: x["BusStopCode"], stops), stops))
 
-    def search_possible_stops(query: list[str]) -> list[BusStop]:
+    def get_stop_info(bus_stop_code: str) -> BusStop | None:
         """
-        get a list of bus stops that match a search query
+        obtain BusStop information for a given bus stop code
         """
-        query_tokens = map(lambda x: x.lower(), query)
-        m_query_tokens = map(transform_query_token, query_tokens)
-        stop_ids_set: set[str] = set()
-
-        for query_token in m_query_tokens:
-            if query_token in token_map:
-                if len(stop_ids_set) == 0:
-                    # populate empty set
-                    stop_ids_set.update(token_map[query_token])
-                else:
-                    stop_ids_set = set.intersection(
-                        stop_ids_set, token_map[query_token]
-                    )
-
-        potential_bus_stops = map(get_stop_info, stop_ids_set)
-        bus_stops = [stop for stop in potential_bus_stops if stop is not None]
-        # TODO sort
-        return bus_stops
-
-    return (get_nearest_stops, get_stop_info, search_possible_stops)
+        return stops_map.get(bus_stop_code, None)
+
+    search_possible_stops = stop_search_utility(stops, token_postings)
+
+    return BusStopUtility(
+        get_nearest_stops=get_nearest_stops,
+        get_nearest_stops_batch=get_nearest_stops_batch,
+        get_stops_within=get_stops_within,
+        get_stop_info=get_stop_info,
+        search_possible_stops=search_possible_stops,
+        get_stop_pairs_within=get_stop_pairs_within,
+    )
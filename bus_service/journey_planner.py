@@ -0,0 +1,158 @@
+"""
+plan trips between two bus stops using the routes dataset
+"""
+
+from collections.abc import Callable
+from functools import lru_cache
+from typing import Literal, NamedTuple
+
+from decouple import config
+
+from utils.custom_typings import BusStop
+
+from .bus_route import GetBusRoute, GetStopServices, RouteStops
+
+# number of (origin, destination) pairs cached until the next dataset refresh
+CACHE_SIZE = config("JOURNEY_CACHE_SIZE", default=1000, cast=int)
+MAX_JOURNEYS = 5
+
+type RankBy = Literal["distance", "stops"]
+
+
+class JourneyLeg(NamedTuple):
+    service: str
+    direction: int
+    board: BusStop
+    alight: BusStop
+    stops: int  # number of stops travelled
+    distance: float  # in km
+
+
+class Journey(NamedTuple):
+    legs: tuple[JourneyLeg, ...]
+    stops: int
+    distance: float
+
+
+type PlanJourney = Callable[[str, str, RankBy], tuple[Journey, ...]]
+
+
+def make_journey(*legs: JourneyLeg) -> Journey:
+    return Journey(
+        legs=legs,
+        stops=sum(leg.stops for leg in legs),
+        distance=sum(leg.distance for leg in legs),
+    )
+
+
+def journey_planner_utility(
+    get_route_stops: GetBusRoute, get_stop_services: GetStopServices
+) -> PlanJourney:
+    """
+    plan direct and one transfer trips using the stop to services index
+    and the stops of each route
+
+    results are cached, the cache is dropped with the rest of the index
+    when the routes are refreshed
+    """
+
+    def plan(
+        origin: str, destination: str, rank_by: RankBy = "distance"
+    ) -> tuple[Journey, ...]:
+        """
+        get up to MAX_JOURNEYS trips from origin to destination
+
+        direct trips are listed before trips with a transfer,
+        then trips are ranked by distance or number of stops
+        transfers are only made at a stop served by both services
+        """
+        if origin == destination:
+            return ()
+
+        # positions of the destination along each route serving it
+        destination_positions: dict[tuple[str, int], list[int]] = {}
+        for stop_service in get_stop_services(destination):
+            key = (stop_service.service, stop_service.direction)
+            destination_positions.setdefault(key, []).append(stop_service.sequence)
+
+        routes: dict[tuple[str, int], tuple[RouteStops, list[float]]] = {}
+
+        def get_route(service: str, direction: int) -> tuple[RouteStops, list[float]]:
+            key = (service, direction)
+            if key not in routes:
+                route = get_route_stops(service, direction)
+                assert route is not None  # services are indexed from the routes
+                routes[key] = (route, route.distances.tolist())
+            return routes[key]
+
+        def make_leg(service: str, direction: int, board: int, alight: int):
+            route, distances = get_route(service, direction)
+            return JourneyLeg(
+                service=service,
+                direction=direction,
+                board=route.stops[board],
+                alight=route.stops[alight],
+                stops=alight - board,
+                distance=distances[alight] - distances[board],
+            )
+
+        def next_position(key: tuple[str, int], after: int) -> int | None:
+            """
+            first position of the destination on a route after a position
+            """
+            return next(
+                (p for p in destination_positions.get(key, ()) if p > after), None
+            )
+
+        def rank(journey: Journey) -> tuple:
+            metric = (
+                (journey.distance, journey.stops)
+                if rank_by == "distance"
+                else (journey.stops, journey.distance)
+            )
+            services = [leg.service for leg in journey.legs]
+            return (len(journey.legs), *metric, services)
+
+        direct: dict[str, Journey] = {}
+        # best trip for each pair of services
+        transfers: dict[tuple[str, str], Journey] = {}
+        for first in get_stop_services(origin):
+            first_key = (first.service, first.direction)
+            alight = next_position(first_key, first.sequence)
+            if alight is not None:
+                journey = make_journey(make_leg(*first_key, first.sequence, alight))
+                if first.service not in direct or rank(journey) < rank(
+                    direct[first.service]
+                ):
+                    direct[first.service] = journey
+
+            # transfer at any stop before reaching the destination
+            route, _ = get_route(*first_key)
+            end = len(route.stops) if alight is None else alight
+            for transfer in range(first.sequence + 1, end):
+                transfer_code = route.stops[transfer]["BusStopCode"]
+                for second in get_stop_services(transfer_code):
+                    if second.service == first.service:
+                        continue
+                    second_key = (second.service, second.direction)
+                    second_alight = next_position(second_key, second.sequence)
+                    if second_alight is None:
+                        continue
+                    journey = make_journey(
+                        make_leg(*first_key, first.sequence, transfer),
+                        make_leg(*second_key, second.sequence, second_alight),
+                    )
+                    pair = (first.service, second.service)
+                    if pair not in transfers or rank(journey) < rank(transfers[pair]):
+                        transfers[pair] = journey
+
+        # a transfer is not useful if either service goes there directly
+        useful_transfers = [
+            journey
+            for (first_service, second_service), journey in transfers.items()
+            if first_service not in direct and second_service not in direct
+        ]
+        journeys = sorted([*direct.values(), *useful_transfers], key=rank)
+        return tuple(journeys[:MAX_JOURNEYS])
+
+    return lru_cache(maxsize=CACHE_SIZE)(plan)
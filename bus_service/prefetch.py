@@ -0,0 +1,97 @@
+"""
+keeps arrival timings of frequently used stops warm in the cache
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from collections.abc import Callable
+from datetime import datetime
+from itertools import islice
+
+from decouple import config
+from telegram.ext import Application, ContextTypes
+
+from storage.async_adapter import AsyncStorageUtility
+
+from .bus_arrival import get_request_counts, prefetch_arriving_busses
+
+logger = logging.getLogger(__name__)
+
+# maximum number of upstream requests per minute spent on prefetching
+# prefetching is disabled when set to 0
+# should be kept well below ARRIVAL_CACHE_SIZE so user lookups are not evicted
+REQUESTS_PER_MIN = config("PREFETCH_REQUESTS_PER_MIN", default=0, cast=int)
+# time in seconds between prefetch runs
+INTERVAL = config("PREFETCH_INTERVAL", default=30, cast=int)
+
+
+def rank_stops(saved_counts: Counter[str], request_counts: Counter[str]) -> list[str]:
+    """
+    rank saved stops from most to least likely to be looked up
+
+    stops are scored by the number of users who saved them,
+    plus the number of lookups made at this time of day once there are any
+    """
+    return sorted(
+        saved_counts,
+        key=lambda stop: (-(saved_counts[stop] + request_counts[stop]), stop),
+    )
+
+
+def prefetch_handler(storage_utility: AsyncStorageUtility) -> Callable:
+    """
+    get job callback that prefetches arrival timings of saved stops
+    """
+    # requests each run may make, which can be a fraction of a request
+    # fractions are carried over, so a run is made once they add up to a request
+    credit_per_run = REQUESTS_PER_MIN * INTERVAL / 60
+    # credit unused because stops were fresh is not saved up beyond one run
+    max_credit = max(credit_per_run, 1)
+    credit = 0.0
+
+    async def prefetch(_: ContextTypes.DEFAULT_TYPE) -> None:
+        nonlocal credit
+        credit = min(credit + credit_per_run, max_credit)
+        budget = int(credit)
+        if budget == 0:
+            return
+        ranked_stops = rank_stops(
+            await storage_utility.get_saved_stop_counts(),
+            get_request_counts(datetime.now().hour),
+        )
+        # fetch in rounds until the budget is spent or every stop is fresh
+        # stops that are still fresh are skipped without using the budget
+        fetched = 0
+        remaining = iter(ranked_stops)
+        while fetched < budget:
+            batch = list(islice(remaining, budget - fetched))
+            if len(batch) == 0:
+                break
+            results = await asyncio.gather(
+                *map(prefetch_arriving_busses, batch), return_exceptions=True
+            )
+            # failed requests count towards the budget
+            fetched += sum(1 for result in results if result is not False)
+        credit -= fetched
+        logger.debug("Prefetched arrivals for %d stops", fetched)
+
+    return prefetch
+
+
+def register_prefetch_job(
+    application: Application, storage_utility: AsyncStorageUtility
+) -> None:
+    """
+    schedule prefetching of saved stops if it is enabled
+    """
+    if REQUESTS_PER_MIN <= 0 or application.job_queue is None:
+        return
+    application.job_queue.run_repeating(
+        prefetch_handler(storage_utility), interval=INTERVAL, first=INTERVAL
+    )
+    logger.info(
+        "Prefetching saved stops every %ds, up to %d requests per minute",
+        INTERVAL,
+        REQUESTS_PER_MIN,
+    )
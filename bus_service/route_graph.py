@@ -0,0 +1,165 @@
+"""
+graph of bus stops linked by bus services and short walks between stops
+"""
+
+from collections.abc import Callable, Sequence
+from itertools import pairwise
+from typing import NamedTuple
+
+import numpy as np
+from decouple import config
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from utils.custom_typings import BusStop
+
+from .bus_route import RouteTable
+from .bus_stops import GetStopPairsWithin
+
+# stops within this many metres of each other are linked by a walk
+WALKING_RADIUS = config("WALKING_RADIUS", default=300, cast=float)
+# cost of walking a metre, relative to a metre by bus
+WALKING_COST = config("WALKING_COST", default=4.0, cast=float)
+# csgraph may drop edges with a weight of 0, e.g. a stop repeated along a route
+MIN_WEIGHT = 1.0
+
+
+class RouteGraph(NamedTuple):
+    """
+    stops are nodes, numbered in the order of the list of stops
+
+    graph has an edge from each stop to the next stop along every route,
+    and edges both ways between stops within walking distance,
+    weighted by cost in metres
+    only the cheapest edge between two stops is kept
+    """
+
+    graph: csr_matrix
+    walking: np.ndarray  # bool, whether each edge in graph.data is a walk
+
+
+class RoutePath(NamedTuple):
+    stops: tuple[BusStop, ...]
+    walking: tuple[
+        bool, ...
+    ]  # whether the step from stops[i] to stops[i + 1] is a walk
+    cost: float  # in metres
+
+
+type GetShortestPath = Callable[[str, str], RoutePath | None]
+
+
+def create_route_graph(
+    code_index: dict[str, int],
+    route_table: RouteTable,
+    walking_pairs: np.ndarray,
+    walking_distances: np.ndarray,
+    walking_cost: float = WALKING_COST,
+) -> RouteGraph:
+    """
+    code_index maps BusStopCode to the node of each stop
+    walking_pairs and walking_distances are from GetStopPairsWithin
+    """
+    num_stops = len(code_index)
+
+    # link consecutive rows of each route, leaving out unknown stops
+    nodes = np.array(
+        [code_index.get(code, -1) for code in route_table.stop_codes], dtype=np.intp
+    )
+    routes = np.repeat(np.arange(len(route_table.keys)), np.diff(route_table.offsets))
+    known = nodes >= 0
+    nodes, routes = nodes[known], routes[known]
+    distances = route_table.distances[known].astype(np.float64) * 1000
+    same_route = routes[1:] == routes[:-1]
+
+    walk_from, walk_to = walking_pairs.T
+    walk_weights = walking_distances * walking_cost
+    sources = np.concatenate((nodes[:-1][same_route], walk_from, walk_to))
+    targets = np.concatenate((nodes[1:][same_route], walk_to, walk_from))
+    weights = np.concatenate(
+        (np.diff(distances)[same_route], walk_weights, walk_weights)
+    )
+    walking = np.concatenate(
+        (
+            np.zeros(np.count_nonzero(same_route), dtype=bool),
+            np.ones(2 * len(walk_from), dtype=bool),
+        )
+    )
+
+    # remove loops, e.g. a service that calls at the same stop twice in a row
+    edges = sources != targets
+    sources, targets, walking = sources[edges], targets[edges], walking[edges]
+    weights = np.maximum(weights[edges], MIN_WEIGHT)
+
+    # sort edges into CSR order, cheapest first for each pair of stops
+    order = np.lexsort((weights, targets, sources))
+    sources, targets, weights, walking = (
+        sources[order],
+        targets[order],
+        weights[order],
+        walking[order],
+    )
+    cheapest = np.ones(len(sources), dtype=bool)
+    cheapest[1:] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+    sources, targets, weights, walking = (
+        sources[cheapest],
+        targets[cheapest],
+        weights[cheapest],
+        walking[cheapest],
+    )
+
+    indptr = np.zeros(num_stops + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=num_stops), out=indptr[1:])
+    graph = csr_matrix((weights, targets, indptr), shape=(num_stops, num_stops))
+    return RouteGraph(graph=graph, walking=walking)
+
+
+def route_graph_utility(
+    stops: Sequence[BusStop],
+    route_table: RouteTable,
+    get_stop_pairs_within: GetStopPairsWithin,
+    walking_radius: float = WALKING_RADIUS,
+) -> GetShortestPath:
+    """
+    build the graph once, so each query only runs Dijkstra's algorithm
+    """
+    code_index = {stop["BusStopCode"]: idx for idx, stop in enumerate(stops)}
+    walking_pairs, walking_distances = get_stop_pairs_within(walking_radius)
+    route_graph = create_route_graph(
+        code_index, route_table, walking_pairs, walking_distances
+    )
+    indptr, indices = route_graph.graph.indptr, route_graph.graph.indices
+
+    def is_walking(source: int, target: int) -> bool:
+        start, end = indptr[source], indptr[source + 1]
+        return bool(
+            route_graph.walking[start + np.searchsorted(indices[start:end], target)]
+        )
+
+    def get_shortest_path(origin: str, destination: str) -> RoutePath | None:
+        """
+        get the cheapest path between two stops by bus and walking,
+        or None if the destination cannot be reached
+        """
+        source = code_index.get(origin, None)
+        target = code_index.get(destination, None)
+        if source is None or target is None:
+            return None
+
+        costs, predecessors = dijkstra(
+            route_graph.graph, indices=source, return_predecessors=True
+        )
+        if np.isinf(costs[target]):
+            return None
+
+        path = [target]
+        while path[-1] != source:
+            path.append(int(predecessors[path[-1]]))
+        path.reverse()
+        return RoutePath(
+            stops=tuple(stops[idx] for idx in path),
+            walking=tuple(is_walking(a, b) for a, b in pairwise(path)),
+            cost=float(costs[target]),
+        )
+
+    return get_shortest_path
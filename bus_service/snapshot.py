@@ -0,0 +1,355 @@
+"""
+versioned binary snapshot of the bus stops and routes datasets and their indexes
+
+layout:
+    MAGIC | version (uint32) | header length (uint32) | header (JSON) | arrays
+
+the header records the dtype, shape and offset of each array,
+arrays are aligned so they can be read directly from a memory mapped file
+"""
+
+import json
+import logging
+import os
+import struct
+from collections.abc import Sequence
+from itertools import pairwise
+from typing import Any, NamedTuple, overload
+
+import numpy as np
+
+from utils.custom_typings import AllBusRoutes, AllBusStops, BusRoute, BusStop
+
+from .bus_route import FIRST_LAST_BUS_FIELDS, RouteTable, create_route_table
+from .stop_search import TokenPostings, create_token_postings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"BUSSNAP\0"
+# 2: postings sorted by stop code, 3: postings include aliases
+# 4: route table ordered by StopSequence, with distances and first/last bus times
+VERSION = 4
+ALIGNMENT = 64
+PREAMBLE = struct.Struct("<8sII")  # magic, version, header length
+
+
+class Snapshot(NamedTuple):
+    all_stops: AllBusStops
+    all_routes: AllBusRoutes
+    token_postings: TokenPostings
+    route_table: RouteTable
+
+
+def pack_strings(strings: Sequence[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    pack strings into a utf-8 buffer and the offsets of each string within it
+    """
+    encoded = [string.encode() for string in strings]
+    return (
+        np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        pack_offsets([len(string) for string in encoded]),
+    )
+
+
+def unpack_strings(buffer: np.ndarray, offsets: np.ndarray) -> list[str]:
+    data = buffer.tobytes()
+    bounds = offsets.tolist()
+    return [data[start:end].decode() for start, end in pairwise(bounds)]
+
+
+def pack_offsets(lengths: Sequence[int]) -> np.ndarray:
+    """
+    offsets of consecutive slices with the given lengths
+    """
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+class RouteRows(Sequence[BusRoute]):
+    """
+    bus routes read on demand from the columns of a snapshot
+
+    the route index is loaded from the snapshot directly,
+    so the rows only need to be created if they are used to rebuild it
+    """
+
+    def __init__(self, arrays: dict[str, np.ndarray]) -> None:
+        self.__arrays = arrays
+        self.__services = unpack_strings(arrays["services"], arrays["service_offsets"])
+
+    def __len__(self) -> int:
+        return len(self.__arrays["route_services"])
+
+    def __row(self, idx: int) -> BusRoute:
+        arrays = self.__arrays
+        times = [time.decode() for time in arrays["route_times"][idx].tolist()]
+        return {
+            "ServiceNo": self.__services[arrays["route_services"][idx]],
+            "Direction": int(arrays["route_directions"][idx]),
+            "StopSequence": int(arrays["route_sequences"][idx]),
+            "BusStopCode": arrays["route_stop_codes"][idx].decode(),
+            "Distance": float(arrays["route_distances"][idx]),
+            "WD_FirstBus": times[0],
+            "WD_LastBus": times[1],
+            "SAT_FirstBus": times[2],
+            "SAT_LastBus": times[3],
+            "SUN_FirstBus": times[4],
+            "SUN_LastBus": times[5],
+        }
+
+    @overload
+    def __getitem__(self, idx: int) -> BusRoute: ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> list[BusRoute]: ...
+
+    def __getitem__(self, idx: int | slice) -> BusRoute | list[BusRoute]:
+        if isinstance(idx, slice):
+            return [self.__row(i) for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("route index out of range")
+        return self.__row(idx)
+
+
+def build_arrays(
+    all_stops: AllBusStops,
+    all_routes: AllBusRoutes,
+    token_postings: TokenPostings,
+    route_table: RouteTable,
+) -> dict[str, np.ndarray]:
+    """
+    convert the datasets and their indexes into flat arrays
+    """
+    stops = all_stops["bus_stops"]
+    routes = all_routes["bus_routes"]
+    arrays: dict[str, np.ndarray] = {}
+
+    # stops
+    arrays["stop_codes"] = np.array([s["BusStopCode"] for s in stops], dtype="S5")
+    arrays["stop_coordinates"] = np.array(
+        [(s["Latitude"], s["Longitude"]) for s in stops], dtype=np.float64
+    ).reshape(-1, 2)
+    arrays["stop_descriptions"], arrays["stop_description_offsets"] = pack_strings(
+        [s["Description"] for s in stops]
+    )
+    arrays["stop_road_names"], arrays["stop_road_name_offsets"] = pack_strings(
+        [s["RoadName"] for s in stops]
+    )
+
+    # routes, with service numbers stored once and referenced by index
+    services = sorted({r["ServiceNo"] for r in routes})
+    service_index = {service: idx for idx, service in enumerate(services)}
+    arrays["services"], arrays["service_offsets"] = pack_strings(services)
+    arrays["route_services"] = np.array(
+        [service_index[r["ServiceNo"]] for r in routes], dtype=np.int32
+    )
+    arrays["route_directions"] = np.array(
+        [r["Direction"] for r in routes], dtype=np.int8
+    )
+    arrays["route_sequences"] = np.array(
+        [r["StopSequence"] for r in routes], dtype=np.int32
+    )
+    arrays["route_stop_codes"] = np.array(
+        [r["BusStopCode"] for r in routes], dtype="S5"
+    )
+    arrays["route_distances"] = np.array(
+        [r["Distance"] for r in routes], dtype=np.float64
+    )
+    arrays["route_times"] = np.array(
+        [[r[field] for field in FIRST_LAST_BUS_FIELDS] for r in routes], dtype="S4"
+    ).reshape(-1, len(FIRST_LAST_BUS_FIELDS))
+
+    # route table, with the rows of each (ServiceNo, Direction) in order
+    arrays["route_key_services"] = np.array(
+        [service_index[service] for service, _ in route_table.keys], dtype=np.int32
+    )
+    arrays["route_key_directions"] = np.array(
+        [direction for _, direction in route_table.keys], dtype=np.int8
+    )
+    arrays["route_key_offsets"] = route_table.offsets
+    arrays["route_key_stop_codes"] = np.array(route_table.stop_codes, dtype="S5")
+    arrays["route_key_distances"] = route_table.distances
+    arrays["route_key_first_last_bus"] = route_table.first_last_bus
+
+    # token postings, concatenated in the order of the vocabulary
+    vocabulary = sorted(token_postings)
+    arrays["tokens"], arrays["token_offsets"] = pack_strings(vocabulary)
+    arrays["postings"] = np.array(
+        [idx for token in vocabulary for idx in token_postings[token]],
+        dtype=np.int32,
+    )
+    arrays["posting_offsets"] = pack_offsets(
+        [len(token_postings[token]) for token in vocabulary]
+    )
+
+    return arrays
+
+
+def write_snapshot(
+    path: str,
+    all_stops: AllBusStops,
+    all_routes: AllBusRoutes,
+    token_postings: TokenPostings | None = None,
+    route_table: RouteTable | None = None,
+) -> None:
+    """
+    write the datasets and their indexes to a snapshot file
+
+    the file is written to a temporary path first and then renamed,
+    so a reader never sees a partially written snapshot
+    """
+    if token_postings is None:
+        token_postings = create_token_postings(all_stops["bus_stops"])
+    if route_table is None:
+        route_table = create_route_table(all_routes["bus_routes"])
+    arrays = build_arrays(all_stops, all_routes, token_postings, route_table)
+
+    # lay out arrays after the header, each starting at an aligned offset
+    layout: dict[str, dict[str, Any]] = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        layout[name] = {
+            "dtype": array.dtype.str,
+            "shape": array.shape,
+            "offset": offset,
+        }
+        offset += array.nbytes
+    header = json.dumps(
+        {
+            "stops_checksum": all_stops["checksum"],
+            "routes_checksum": all_routes["checksum"],
+            "arrays": layout,
+        }
+    ).encode()
+    data_start = -(-(PREAMBLE.size + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+    os.replace(tmp_path, path)
+
+
+def map_snapshot(path: str) -> tuple[dict[str, Any], dict[str, np.ndarray]] | None:
+    """
+    memory map a snapshot file
+
+    returns the header and read only views of each array,
+    or None if the file does not exist or was written with a different version
+    raises an error if the file is damaged
+    """
+    try:
+        buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    except (FileNotFoundError, ValueError):
+        return None
+    if len(buffer) < PREAMBLE.size:
+        return None
+    magic, version, header_length = PREAMBLE.unpack(buffer[: PREAMBLE.size].tobytes())
+    if magic != MAGIC or version != VERSION:
+        logger.info("Ignoring snapshot %s with version %d", path, version)
+        return None
+    header = json.loads(buffer[PREAMBLE.size : PREAMBLE.size + header_length].tobytes())
+    data_start = -(-(PREAMBLE.size + header_length) // ALIGNMENT) * ALIGNMENT
+
+    arrays: dict[str, np.ndarray] = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        shape = tuple(spec["shape"])
+        count = int(np.prod(shape))
+        start = data_start + spec["offset"]
+        if start + count * dtype.itemsize > len(buffer):
+            raise ValueError(f"Snapshot is truncated at array {name}")
+        arrays[name] = (
+            buffer[start : start + count * dtype.itemsize].view(dtype).reshape(shape)
+        )
+    return header, arrays
+
+
+def read_snapshot(path: str) -> Snapshot | None:
+    """
+    load the datasets and their indexes from a snapshot file
+
+    returns None if there is no usable snapshot, so the datasets are fetched
+    from the API instead, a damaged file is ignored whatever the error
+    """
+    try:
+        return load_snapshot(path)
+    except Exception:
+        logger.warning("Ignoring unreadable snapshot %s", path, exc_info=True)
+        return None
+
+
+def load_snapshot(path: str) -> Snapshot | None:
+    """
+    load a snapshot file, raising an error if it is damaged
+    """
+    mapped = map_snapshot(path)
+    if mapped is None:
+        return None
+    header, arrays = mapped
+
+    stop_codes = arrays["stop_codes"].tolist()
+    codes = [code.decode() for code in stop_codes]
+    coordinates = arrays["stop_coordinates"].tolist()
+    descriptions = unpack_strings(
+        arrays["stop_descriptions"], arrays["stop_description_offsets"]
+    )
+    road_names = unpack_strings(
+        arrays["stop_road_names"], arrays["stop_road_name_offsets"]
+    )
+    stops: list[BusStop] = [
+        {
+            "BusStopCode": code,
+            "RoadName": road_name,
+            "Description": description,
+            "Latitude": latitude,
+            "Longitude": longitude,
+        }
+        for code, road_name, description, (latitude, longitude) in zip(
+            codes, road_names, descriptions, coordinates
+        )
+    ]
+
+    # reuse the decoded stop codes, since routes almost always refer to known stops
+    services = unpack_strings(arrays["services"], arrays["service_offsets"])
+    decoded_codes = dict(zip(stop_codes, codes))
+    route_codes = [
+        decoded_codes.get(code) or code.decode()
+        for code in arrays["route_key_stop_codes"].tolist()
+    ]
+    # numeric columns are used directly from the memory mapped file
+    route_table = RouteTable(
+        keys=[
+            (services[service_idx], direction)
+            for service_idx, direction in zip(
+                arrays["route_key_services"].tolist(),
+                arrays["route_key_directions"].tolist(),
+            )
+        ],
+        offsets=arrays["route_key_offsets"],
+        stop_codes=route_codes,
+        distances=arrays["route_key_distances"],
+        first_last_bus=arrays["route_key_first_last_bus"],
+    )
+
+    tokens = unpack_strings(arrays["tokens"], arrays["token_offsets"])
+    postings = arrays["postings"].tolist()
+    bounds = arrays["posting_offsets"].tolist()
+    token_postings: TokenPostings = {
+        token: postings[start:end]
+        for token, start, end in zip(tokens, bounds, bounds[1:])
+    }
+
+    return Snapshot(
+        {"checksum": header["stops_checksum"], "bus_stops": stops},
+        {"checksum": header["routes_checksum"], "bus_routes": RouteRows(arrays)},
+        token_postings,
+        route_table,
+    )
@@ -0,0 +1,288 @@
+"""
+ranked search over the descriptions and road names of bus stops
+"""
+
+import heapq
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Callable, Mapping
+from types import MappingProxyType
+from typing import Literal, NamedTuple
+
+from utils.custom_typings import BusStop
+
+from .bus_stop_search_map import expand_tokens, normalise_query
+
+# map of word tokens to the indexes of the stops containing them,
+# sorted by the BusStopCode of each stop
+# abbreviations are also indexed under their full words, and phrases under their
+# abbreviation, e.g. "int" under "interchange" and "choa chu kang" under "cck"
+type TokenPostings = dict[str, list[int]]
+
+# larger than any character, so prefix + PREFIX_END sorts after every word with prefix
+PREFIX_END = chr(0x10FFFF)
+
+# weight of each way a query token can match a stop
+DESCRIPTION_EXACT_MATCH = 4
+DESCRIPTION_PREFIX_MATCH = 3
+ROAD_EXACT_MATCH = 2
+ROAD_PREFIX_MATCH = 1
+
+
+class SearchResult(NamedTuple):
+    stops: list[BusStop]  # best matching stops, best first
+    total: int  # number of stops matching the query, including those not returned
+
+
+class QueryTerm(NamedTuple):
+    exact: frozenset[str]  # the query token
+    prefix: frozenset[str]  # words starting with the query token
+    # words within a few edits of the query token, and the number of edits
+    # only used if the query token does not match any stop otherwise
+    fuzzy: Mapping[str, int] = MappingProxyType({})
+
+
+type SearchPossibleStops = Callable[[list[str], int], SearchResult]
+# tokens of a text with the position of the word each came from
+type IndexTokens = list[tuple[str, int]]
+
+
+def tokenize(text: str) -> list[str]:
+    return text.lower().split()
+
+
+def index_tokens(text: str) -> IndexTokens:
+    """
+    tokens of a text to index, including the aliases of each word
+    e.g. "Opp Blk 1" -> [("opp", 0), ("opposite", 0), ("blk", 1), ("block", 1), ...]
+    """
+    return [
+        (token, position)
+        for position, aliases in enumerate(expand_tokens(tokenize(text)))
+        for token in aliases
+    ]
+
+
+def create_token_postings(
+    stops: list[BusStop],
+    field: Literal["Description", "RoadName"] = "Description",
+    stop_tokens: list[IndexTokens] | None = None,
+) -> TokenPostings:
+    """
+    create map of word tokens in field to indexes of stops in the list of stops
+
+    stop_tokens can be passed in if the tokens of each stop were already created
+    """
+    if stop_tokens is None:
+        stop_tokens = [index_tokens(stop[field]) for stop in stops]
+    token_postings: TokenPostings = {}
+    # visit stops in order of their code, so each postings list is sorted by code
+    order = sorted(range(len(stops)), key=lambda idx: stops[idx]["BusStopCode"])
+    for idx in order:
+        for token, _ in stop_tokens[idx]:
+            if token not in token_postings:
+                # create list if it does not already exist
+                token_postings[token] = []
+            postings = token_postings[token]
+            # a token can appear more than once in a description
+            if len(postings) == 0 or postings[-1] != idx:
+                postings.append(idx)
+
+    return token_postings
+
+
+def trigrams(word: str) -> set[str]:
+    padded = f"${word}$"
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def max_edit_distance(query_token: str) -> int:
+    """
+    number of typos allowed in a query token
+
+    short tokens and numbers are not corrected, since most edits give another word
+    """
+    if len(query_token) < 4 or any(char.isdigit() for char in query_token):
+        return 0
+    return 1 if len(query_token) < 8 else 2
+
+
+def levenshtein(a: str, b: str, max_distance: int) -> int:
+    """
+    edit distance between a and b, or max_distance + 1 if it is larger
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (char_a != char_b),
+                )
+            )
+        if min(current) > max_distance:
+            # the distance can only grow from here
+            return max_distance + 1
+        previous = current
+    return min(previous[-1], max_distance + 1)
+
+
+def prefix_range(words: list[str], prefix: str) -> list[str]:
+    """
+    get the words in a sorted list that start with prefix
+    """
+    return words[bisect_left(words, prefix) : bisect_left(words, prefix + PREFIX_END)]
+
+
+def stop_search_utility(
+    stops: list[BusStop], token_postings: TokenPostings | None = None
+) -> SearchPossibleStops:
+    """
+    build the search index for a list of stops
+
+    token_postings can be passed in if it was already built for these stops,
+    e.g. when loaded from a snapshot
+    """
+    description_tokens = [index_tokens(stop["Description"]) for stop in stops]
+    # number of words in each description
+    description_lengths = [
+        tokens[-1][1] + 1 if len(tokens) > 0 else 0 for tokens in description_tokens
+    ]
+    # many stops are on the same road, so each road name is only tokenized once
+    road_name_tokens = {
+        road_name: index_tokens(road_name)
+        for road_name in {stop["RoadName"] for stop in stops}
+    }
+    stop_road_tokens = [road_name_tokens[stop["RoadName"]] for stop in stops]
+    road_tokens = [
+        frozenset(token for token, _ in tokens) for tokens in stop_road_tokens
+    ]
+
+    if token_postings is None:
+        token_postings = create_token_postings(stops, stop_tokens=description_tokens)
+    road_postings = create_token_postings(stops, "RoadName", stop_road_tokens)
+    vocabulary = sorted(token_postings.keys() | road_postings.keys())
+
+    trigram_index: dict[str, list[int]] = {}
+    for idx, word in enumerate(vocabulary):
+        for trigram in trigrams(word):
+            trigram_index.setdefault(trigram, []).append(idx)
+
+    def resolve(query_token: str) -> QueryTerm:
+        exact = frozenset((query_token,))
+        # e.g. "inter" -> "interchange", which is indexed with "int"
+        return QueryTerm(
+            exact, frozenset(prefix_range(vocabulary, query_token)) - exact
+        )
+
+    def fuzzy_matches(query_token: str) -> dict[str, int]:
+        """
+        get the tokens within a few edits of query_token, and their number of edits
+        """
+        max_edits = max_edit_distance(query_token)
+        if max_edits == 0:
+            return {}
+        query_trigrams = trigrams(query_token)
+        shared = Counter(
+            idx for trigram in query_trigrams for idx in trigram_index.get(trigram, ())
+        )
+        # each edit changes at most 3 trigrams, so closer words must share the rest
+        min_shared = len(query_trigrams) - 3 * max_edits
+        matches: dict[str, int] = {}
+        for idx, count in shared.items():
+            if count < min_shared:
+                continue
+            edits = levenshtein(query_token, vocabulary[idx], max_edits)
+            if edits <= max_edits:
+                matches[vocabulary[idx]] = edits
+        return matches
+
+    def matching_stops(term: QueryTerm) -> set[int]:
+        matches: set[int] = set()
+        for token in term.exact | term.prefix | term.fuzzy.keys():
+            matches.update(token_postings.get(token, ()))
+            matches.update(road_postings.get(token, ()))
+        return matches
+
+    def rank(idx: int, terms: list[QueryTerm]) -> tuple[int, int, float, int, str]:
+        """
+        sort key of a stop matching every term, lower is better
+
+        stops are ranked by how well each term matches, then by the number of typos,
+        then by the fraction of the description matched,
+        then by how early the first match is in the description
+        """
+        description = description_tokens[idx]
+        score = 0
+        edits = 0
+        matched_positions: set[int] = set()
+        for term in terms:
+            weight = 0
+            term_edits: list[int] = []
+            for token, position in description:
+                if token in term.exact:
+                    weight = DESCRIPTION_EXACT_MATCH
+                elif token in term.prefix:
+                    weight = max(weight, DESCRIPTION_PREFIX_MATCH)
+                elif token in term.fuzzy:
+                    # weighted as a prefix match, then ranked by the number of edits
+                    weight = max(weight, DESCRIPTION_PREFIX_MATCH)
+                    term_edits.append(term.fuzzy[token])
+                else:
+                    continue
+                matched_positions.add(position)
+            if weight == 0:
+                # every term matches, so this one must match the road name
+                road = road_tokens[idx]
+                if not term.exact.isdisjoint(road):
+                    weight = ROAD_EXACT_MATCH
+                else:
+                    weight = ROAD_PREFIX_MATCH
+                    term_edits = [term.fuzzy[t] for t in road if t in term.fuzzy]
+            score += weight
+            edits += min(term_edits, default=0)
+
+        length = description_lengths[idx]
+        coverage = len(matched_positions) / length if length > 0 else 0
+        first_position = min(matched_positions, default=length)
+        # stop codes are unique, so the order is always the same
+        return (-score, edits, -coverage, first_position, stops[idx]["BusStopCode"])
+
+    def search_possible_stops(query: list[str], limit: int = 20) -> SearchResult:
+        """
+        get the stops that best match a search query, best first
+
+        a stop matches if every query token is a word, or the start of a word,
+        in its description or road name
+        query tokens that do not match any stop are corrected to the closest words,
+        and ignored if there are none
+        """
+        # remove empty and repeated tokens
+        query_tokens = dict.fromkeys(
+            normalise_query([token.lower() for token in query if token])
+        )
+        matched: list[tuple[QueryTerm, set[int]]] = []
+        for query_token in query_tokens:
+            term = resolve(query_token)
+            if len(stop_idx_set := matching_stops(term)) == 0:
+                # only look for typos if needed, since it is much slower
+                term = term._replace(fuzzy=fuzzy_matches(query_token))
+                stop_idx_set = matching_stops(term)
+            if len(stop_idx_set) > 0:
+                matched.append((term, stop_idx_set))
+        if len(matched) == 0:
+            return SearchResult([], 0)
+
+        # intersect from the smallest set
+        matched.sort(key=lambda x: len(x[1]))
+        candidates = matched[0][1].intersection(*(x[1] for x in matched[1:]))
+        terms = [term for term, _ in matched]
+        # only the top results are sorted
+        top = heapq.nsmallest(limit, candidates, key=lambda idx: rank(idx, terms))
+        return SearchResult([stops[idx] for idx in top], len(candidates))
+
+    return search_possible_stops
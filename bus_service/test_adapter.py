@@ -0,0 +1,77 @@
+import unittest
+from unittest.mock import patch
+
+from utils.custom_typings import AllBusRoutes, AllBusStops
+
+from . import adapter
+from .adapter import BusServiceAdapter
+from .stop_search import create_token_postings
+from .test_bus_route import make_route
+from .test_bus_stops import STOPS
+
+ROUTES = [
+    make_route("975", 1, "45359"),
+    make_route("975", 2, "45029"),
+    make_route("975", 3, "44539"),
+]
+
+
+class TestRefresh(unittest.TestCase):
+    def setUp(self):
+        self.all_stops: AllBusStops = {"checksum": "stops1", "bus_stops": STOPS}
+        self.all_routes: AllBusRoutes = {"checksum": "routes1", "bus_routes": ROUTES}
+        patchers = [
+            patch.object(adapter, "bus_stop_utility", wraps=adapter.bus_stop_utility),
+            patch.object(adapter, "bus_route_utility", wraps=adapter.bus_route_utility),
+        ]
+        self.stop_utility, self.route_utility = [p.start() for p in patchers]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+        self.adapter = BusServiceAdapter(self.all_stops, self.all_routes)
+
+    def test_unchanged(self):
+        self.adapter.refresh(self.all_stops, self.all_routes)
+        self.assertEqual(self.stop_utility.call_count, 1)
+        self.assertEqual(self.route_utility.call_count, 1)
+
+    def test_snapshot_indexes_kept(self):
+        """
+        the postings and route table are kept for writing a snapshot,
+        and reused with the rest of their generation
+        """
+        index = self.adapter.index
+        self.assertEqual(index.token_postings, create_token_postings(STOPS))
+        self.assertEqual(index.route_table.keys, [("975", 1)])
+        self.adapter.refresh(self.all_stops, self.all_routes)
+        self.assertIs(self.adapter.index.token_postings, index.token_postings)
+        self.assertIs(self.adapter.index.route_table, index.route_table)
+
+    def test_routes_changed(self):
+        all_routes: AllBusRoutes = {"checksum": "routes2", "bus_routes": ROUTES[:2]}
+        self.adapter.refresh(self.all_stops, all_routes)
+        self.assertEqual(self.stop_utility.call_count, 1)
+        self.assertEqual(self.route_utility.call_count, 2)
+        route = self.adapter.index.get_route_stops("975", 1)
+        assert route is not None
+        self.assertEqual(len(route.stops), 2)
+
+    def test_stops_changed(self):
+        all_stops: AllBusStops = {"checksum": "stops2", "bus_stops": STOPS[:1]}
+        self.adapter.refresh(all_stops, self.all_routes)
+        # routes are rebuilt since they resolve stops
+        self.assertEqual(self.stop_utility.call_count, 2)
+        self.assertEqual(self.route_utility.call_count, 2)
+
+    def test_previous_index_unaffected(self):
+        previous = self.adapter.index
+        all_stops: AllBusStops = {"checksum": "stops2", "bus_stops": STOPS[:1]}
+        self.adapter.refresh(all_stops, self.all_routes)
+        self.assertIsNot(self.adapter.index, previous)
+        # requests holding the previous generation still see the old data
+        self.assertEqual(previous.stops_checksum, "stops1")
+        self.assertIsNotNone(previous.get_stop_info(STOPS[1]["BusStopCode"]))
+        self.assertIsNone(self.adapter.index.get_stop_info(STOPS[1]["BusStopCode"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
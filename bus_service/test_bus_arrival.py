@@ -1,5 +1,14 @@
+import asyncio
+import os
+import time
 import unittest
-from .bus_arrival import get_arrival_time_mins
+from unittest.mock import patch
+
+import httpx
+
+from . import bus_arrival
+from .bus_arrival import get_arrival_time_mins, get_arriving_busses
+from utils.lru_cache import LRUCache
 
 UNIX_TIME = 1732635550  # 2024-11-26T23:39:10+08:00
 
@@ -31,5 +40,75 @@ class TestGetArrivalTimes(unittest.TestCase):
         self.assertEqual(time_diff, 0)
 
 
+class TestGetArrivingBusses(unittest.TestCase):
+    def setUp(self):
+        self.requests: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            return httpx.Response(200, json={"Services": [{"ServiceNo": "67"}]})
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        self.cache = LRUCache(ttl=20, item_limit=100, hard_ttl=60)
+        patchers = [
+            patch.object(bus_arrival, "__client", client),
+            patch.object(bus_arrival, "__bus_info_cache", self.cache),
+            patch.dict(os.environ, {"ACCOUNT_KEY": "test"}),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_fetch(self):
+        busses = asyncio.run(get_arriving_busses("10001"))
+        self.assertEqual(busses, [{"ServiceNo": "67"}])
+        self.assertEqual(self.requests[0].url.params["BusStopCode"], "10001")
+        self.assertEqual(self.requests[0].headers["AccountKey"], "test")
+
+    def test_cached(self):
+        async def lookup_twice():
+            await get_arriving_busses("10002")
+            await get_arriving_busses("10002")
+
+        asyncio.run(lookup_twice())
+        self.assertEqual(len(self.requests), 1)
+
+    def test_concurrent_stops(self):
+        async def lookup_all():
+            return await asyncio.gather(
+                *(get_arriving_busses(f"2000{i}") for i in range(5))
+            )
+
+        results = asyncio.run(lookup_all())
+        self.assertEqual(len(results), 5)
+        self.assertEqual(len(self.requests), 5)
+
+    def test_concurrent_misses_share_request(self):
+        async def lookup_same_stop():
+            return await asyncio.gather(
+                *(get_arriving_busses("30001") for _ in range(10))
+            )
+
+        results = asyncio.run(lookup_same_stop())
+        self.assertEqual(results, [[{"ServiceNo": "67"}]] * 10)
+        self.assertEqual(len(self.requests), 1)
+
+    def test_stale_served_while_refreshing(self):
+        self.cache.set("40001", [{"ServiceNo": "14"}])
+        # expire the item without reaching the hard ttl
+        item = self.cache.item_cache["40001"]
+        self.cache.item_cache["40001"] = item._replace(expiry=time.monotonic() - 1)
+
+        async def lookup():
+            busses = await get_arriving_busses("40001")
+            # let the background refresh complete
+            await asyncio.sleep(0.01)
+            return busses
+
+        self.assertEqual(asyncio.run(lookup()), [{"ServiceNo": "14"}])
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.cache.get("40001"), [{"ServiceNo": "67"}])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+
+from utils.custom_typings import BusRoute
+
+from .bus_route import (
+    NO_SERVICE,
+    StopService,
+    bus_route_utility,
+    create_route_table,
+    parse_bus_time,
+)
+from .bus_stops import bus_stop_utility
+from .test_bus_stops import STOPS
+
+
+def make_route(
+    service_no: str,
+    sequence: int,
+    bus_stop_code: str,
+    *,
+    direction: int = 1,
+    distance: float | None = None,
+    sun_last_bus: str = "2300",
+) -> BusRoute:
+    """
+    route entry for tests, distance defaults to 0.5km for each stop
+    """
+    return {
+        "ServiceNo": service_no,
+        "Direction": direction,
+        "StopSequence": sequence,
+        "BusStopCode": bus_stop_code,
+        "Distance": sequence * 0.5 if distance is None else distance,
+        "WD_FirstBus": "0500",
+        "WD_LastBus": "2300",
+        "SAT_FirstBus": "0500",
+        "SAT_LastBus": "2300",
+        "SUN_FirstBus": "0600",
+        "SUN_LastBus": sun_last_bus,
+    }
+
+
+ROUTES = [
+    make_route("975", 3, "45029"),  # out of order
+    make_route("975", 1, "45359"),
+    make_route("975", 2, "00000"),  # unknown stop
+    make_route("975", 1, "45029", direction=2),
+    make_route("975", 2, "45359", direction=2),
+    # no service on Sunday evenings
+    make_route("243W", 1, "59009", sun_last_bus="-"),
+    make_route("243W", 2, "59009", sun_last_bus="-"),
+]
+
+
+class TestRouteTable(unittest.TestCase):
+    def test_parse_bus_time(self):
+        self.assertEqual(parse_bus_time("0530"), 330)
+        self.assertEqual(parse_bus_time("0005"), 5)
+        self.assertEqual(parse_bus_time("-"), NO_SERVICE)
+
+    def test_sorted(self):
+        route_table = create_route_table(ROUTES)
+        self.assertEqual(route_table.keys, [("243W", 1), ("975", 1), ("975", 2)])
+        self.assertEqual(route_table.offsets.tolist(), [0, 2, 5, 7])
+        self.assertEqual(route_table.stop_codes[2:5], ["45359", "00000", "45029"])
+        self.assertEqual(route_table.distances[2:5].tolist(), [0.5, 1, 1.5])
+        self.assertEqual(
+            route_table.first_last_bus[0].tolist(),
+            [300, 1380, 300, 1380, 360, NO_SERVICE],
+        )
+
+
+class TestGetRouteStops(unittest.TestCase):
+    def setUp(self):
+        get_stop_info = bus_stop_utility(STOPS).get_stop_info
+        self.get_route_stops, self.get_stop_services = bus_route_utility(
+            ROUTES, get_stop_info
+        )
+
+    def codes(self, bus_number: str, direction: int) -> list[str] | None:
+        route = self.get_route_stops(bus_number, direction)
+        return None if route is None else [stop["BusStopCode"] for stop in route.stops]
+
+    def test_directions(self):
+        self.assertEqual(self.codes("975", 1), ["45359", "45029"])
+        self.assertEqual(self.codes("975", 2), ["45029", "45359"])
+
+    def test_columns_skip_unknown_stops(self):
+        route = self.get_route_stops("975", 1)
+        assert route is not None
+        self.assertEqual(route.distances.tolist(), [0.5, 1.5])
+        self.assertEqual(route.first_last_bus.shape, (2, 6))
+
+    def test_loop_falls_back_to_first_direction(self):
+        self.assertEqual(self.codes("243W", 2), ["59009", "59009"])
+
+    def test_unknown_service(self):
+        self.assertIsNone(self.get_route_stops("0", 1))
+
+    def test_resolved_once(self):
+        self.assertIs(self.get_route_stops("975", 1), self.get_route_stops("975", 1))
+
+
+class TestGetStopServices(unittest.TestCase):
+    def setUp(self):
+        get_stop_info = bus_stop_utility(STOPS).get_stop_info
+        _, self.get_stop_services = bus_route_utility(ROUTES, get_stop_info)
+
+    def test_services(self):
+        self.assertEqual(
+            list(self.get_stop_services("45029")),
+            [StopService("975", 1, 1), StopService("975", 2, 0)],
+        )
+
+    def test_loop(self):
+        # a loop service calls at its terminal twice
+        self.assertEqual(
+            list(self.get_stop_services("59009")),
+            [StopService("243W", 1, 0), StopService("243W", 1, 1)],
+        )
+
+    def test_no_services(self):
+        self.assertEqual(list(self.get_stop_services("14519")), [])
+        self.assertEqual(list(self.get_stop_services("00000")), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,12 @@
 import random
 import unittest
-from .bus_stops import bus_stop_utility
+
+import numpy as np
+
 from utils.custom_typings import BusStop
 
+from .bus_stops import bus_stop_utility
+
 STOPS: list[BusStop] = [
     {
         "BusStopCode": "14519",
@@ -55,11 +59,78 @@ class TestGetNearestStop(unittest.TestCase):
     def test_shuffled(self):
         for _ in range(10):
             random.shuffle(STOPS)
-            get_nearest_stops, _, _ = bus_stop_utility(STOPS)
+            get_nearest_stops = bus_stop_utility(STOPS).get_nearest_stops
             nearest_stops = get_nearest_stops(COORD, 5)
-            stop_codes = list(map(lambda x: x["BusStopCode"], nearest_stops))
+            stop_codes = list(map(lambda x: x.stop["BusStopCode"], nearest_stops))
             self.assertEqual(stop_codes, NEAREST_STOP_CODES)
 
+    def test_distance(self):
+        get_nearest_stops = bus_stop_utility(STOPS).get_nearest_stops
+        nearest_stop = get_nearest_stops(COORD, 1)[0]
+        self.assertEqual(nearest_stop.stop["BusStopCode"], "45359")
+        # haversine distance is 226.1m
+        self.assertAlmostEqual(nearest_stop.distance, 226.1, delta=0.5)
+
+    def test_more_than_available(self):
+        get_nearest_stops = bus_stop_utility(STOPS).get_nearest_stops
+        self.assertEqual(len(get_nearest_stops(COORD, 10)), len(STOPS))
+
+
+class TestGetNearestStopsBatch(unittest.TestCase):
+    def setUp(self):
+        stop_utility = bus_stop_utility(STOPS)
+        self.get_nearest_stops = stop_utility.get_nearest_stops
+        self.get_nearest_stops_batch = stop_utility.get_nearest_stops_batch
+
+    def test_same_as_single_queries(self):
+        coords = [COORD] + [(s["Latitude"], s["Longitude"]) for s in STOPS]
+        batch = self.get_nearest_stops_batch(coords, 3)
+        self.assertEqual(batch, [self.get_nearest_stops(c, 3) for c in coords])
+
+    def test_array(self):
+        batch = self.get_nearest_stops_batch(np.array([COORD, COORD]), 5)
+        for nearest_stops in batch:
+            stop_codes = list(map(lambda x: x.stop["BusStopCode"], nearest_stops))
+            self.assertEqual(stop_codes, NEAREST_STOP_CODES)
+
+    def test_empty(self):
+        self.assertEqual(self.get_nearest_stops_batch([], 3), [])
+
+
+class TestGetStopsWithin(unittest.TestCase):
+    def setUp(self):
+        self.get_stops_within = bus_stop_utility(STOPS).get_stops_within
+
+    def test_radius(self):
+        nearby_stops = self.get_stops_within(COORD, 1000)
+        stop_codes = list(map(lambda x: x.stop["BusStopCode"], nearby_stops))
+        self.assertEqual(stop_codes, ["45359", "45029"])
+        self.assertTrue(all(x.distance <= 1000 for x in nearby_stops))
+
+    def test_max_stops(self):
+        nearby_stops = self.get_stops_within(COORD, 10_000, 3)
+        stop_codes = list(map(lambda x: x.stop["BusStopCode"], nearby_stops))
+        self.assertEqual(stop_codes, NEAREST_STOP_CODES[:3])
+
+    def test_none_within_radius(self):
+        self.assertEqual(self.get_stops_within(COORD, 100), [])
+
+
+class TestGetStopPairsWithin(unittest.TestCase):
+    def test_pairs(self):
+        get_stop_pairs_within = bus_stop_utility(STOPS).get_stop_pairs_within
+        pairs, distances = get_stop_pairs_within(1000)
+        self.assertEqual(
+            [{STOPS[i]["BusStopCode"], STOPS[j]["BusStopCode"]} for i, j in pairs],
+            [{"45029", "45359"}],
+        )
+        self.assertAlmostEqual(distances[0], 629, delta=1)
+
+    def test_no_pairs(self):
+        pairs, distances = bus_stop_utility(STOPS).get_stop_pairs_within(100)
+        self.assertEqual(pairs.shape, (0, 2))
+        self.assertEqual(len(distances), 0)
+
 
 if __name__ == "__main__":
     unittest.main()
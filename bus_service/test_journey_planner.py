@@ -0,0 +1,74 @@
+import unittest
+
+from .bus_route import bus_route_utility
+from .bus_stops import bus_stop_utility
+from .journey_planner import Journey, journey_planner_utility
+from .test_bus_route import make_route
+from .test_bus_stops import STOPS
+
+ROUTES = [
+    make_route("975", 1, "45359", distance=0),
+    make_route("975", 2, "45029", distance=1),
+    make_route("975", 3, "44539", distance=2),
+    # fewer stops after a transfer at 45029, but further
+    make_route("190", 1, "45029", distance=0),
+    make_route("190", 2, "59009", distance=5),
+    # shorter after a transfer at 44539, but more stops
+    make_route("67", 1, "44539", distance=0),
+    make_route("67", 2, "46119", distance=1),
+    make_route("67", 3, "59009", distance=2),
+    # direct, but the longest trip
+    make_route("961", 1, "45359", distance=0),
+    make_route("961", 2, "14519", distance=10),
+    make_route("961", 3, "59009", distance=20),
+]
+
+
+def services(journeys: tuple[Journey, ...]) -> list[list[str]]:
+    return [[leg.service for leg in journey.legs] for journey in journeys]
+
+
+class TestPlanJourney(unittest.TestCase):
+    def setUp(self):
+        get_stop_info = bus_stop_utility(STOPS).get_stop_info
+        get_route_stops, get_stop_services = bus_route_utility(ROUTES, get_stop_info)
+        self.plan = journey_planner_utility(get_route_stops, get_stop_services)
+
+    def test_direct_first(self):
+        journeys = self.plan("45359", "59009", "distance")
+        self.assertEqual(services(journeys), [["961"], ["975", "67"], ["975", "190"]])
+
+    def test_rank_by_stops(self):
+        journeys = self.plan("45359", "59009", "stops")
+        self.assertEqual(services(journeys), [["961"], ["975", "190"], ["975", "67"]])
+
+    def test_legs(self):
+        journey = self.plan("45359", "59009", "distance")[1]
+        self.assertEqual(journey.stops, 4)
+        self.assertAlmostEqual(journey.distance, 4)
+        first, second = journey.legs
+        self.assertEqual(first.board["BusStopCode"], "45359")
+        self.assertEqual(first.alight["BusStopCode"], "44539")
+        self.assertEqual(second.board["BusStopCode"], "44539")
+        self.assertEqual(second.alight["BusStopCode"], "59009")
+
+    def test_no_transfer_onto_direct_service(self):
+        # 975 goes to 44539 directly, so changing onto it is not listed
+        journeys = self.plan("45359", "44539", "distance")
+        self.assertEqual(services(journeys), [["975"]])
+
+    def test_direction_of_travel(self):
+        self.assertEqual(self.plan("59009", "45359", "distance"), ())
+
+    def test_unknown_and_same_stop(self):
+        self.assertEqual(self.plan("00000", "59009", "distance"), ())
+        self.assertEqual(self.plan("59009", "59009", "distance"), ())
+
+    def test_cached(self):
+        journeys = self.plan("45359", "59009", "distance")
+        self.assertIs(self.plan("45359", "59009", "distance"), journeys)
+        self.assertEqual(self.plan.cache_info().hits, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import asyncio
+import unittest
+from collections import Counter
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from . import prefetch
+from .prefetch import prefetch_handler, rank_stops
+
+
+class TestRankStops(unittest.TestCase):
+    def test_saved_counts(self):
+        ranked = rank_stops(Counter({"10001": 1, "10002": 3, "10003": 2}), Counter())
+        self.assertEqual(ranked, ["10002", "10003", "10001"])
+
+    def test_request_counts(self):
+        ranked = rank_stops(
+            Counter({"10001": 1, "10002": 3, "10003": 1}),
+            Counter({"10001": 5, "99999": 10}),
+        )
+        # only saved stops are ranked, ties are broken by BusStopCode
+        self.assertEqual(ranked, ["10001", "10002", "10003"])
+
+
+class TestPrefetch(unittest.TestCase):
+    def test_budget(self):
+        storage_utility = AsyncMock()
+        storage_utility.get_saved_stop_counts.return_value = Counter(
+            {f"1000{i}": 10 - i for i in range(6)}
+        )
+        fetched: list[str] = []
+
+        async def prefetch_arriving_busses(bus_stop_code: str) -> bool:
+            # the most popular stop is still fresh in the cache
+            if bus_stop_code == "10000":
+                return False
+            fetched.append(bus_stop_code)
+            return True
+
+        with (
+            patch.object(prefetch, "REQUESTS_PER_MIN", 6),
+            patch.object(prefetch, "INTERVAL", 30),
+            patch.object(
+                prefetch, "prefetch_arriving_busses", prefetch_arriving_busses
+            ),
+        ):
+            asyncio.run(prefetch_handler(storage_utility)(MagicMock()))
+        self.assertEqual(fetched, ["10001", "10002", "10003"])
+
+    def test_requests_per_minute(self):
+        """
+        requests over each simulated minute never exceed REQUESTS_PER_MIN,
+        including rates below 1 request per run
+        """
+        storage_utility = AsyncMock()
+        storage_utility.get_saved_stop_counts.return_value = Counter(
+            {f"1000{i}": 1 for i in range(10)}
+        )
+        requests = 0
+
+        async def prefetch_arriving_busses(_: str) -> bool:
+            nonlocal requests
+            requests += 1
+            return True
+
+        for requests_per_min, interval in [(1, 30), (1, 45), (6, 30), (5, 20)]:
+            with (
+                patch.object(prefetch, "REQUESTS_PER_MIN", requests_per_min),
+                patch.object(prefetch, "INTERVAL", interval),
+                patch.object(
+                    prefetch, "prefetch_arriving_busses", prefetch_arriving_busses
+                ),
+            ):
+                handler = prefetch_handler(storage_utility)
+                # time of each run in seconds, over 10 minutes
+                run_times = range(interval, 600 + 1, interval)
+                per_run: list[tuple[int, int]] = []
+                for time in run_times:
+                    requests = 0
+                    asyncio.run(handler(MagicMock()))
+                    per_run.append((time, requests))
+            for start in range(0, 600 - 60 + 1, interval):
+                in_minute = sum(n for t, n in per_run if start < t <= start + 60)
+                self.assertLessEqual(in_minute, requests_per_min)
+            # credit beyond one run is dropped, so the total can be below the rate
+            self.assertGreater(sum(n for _, n in per_run), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
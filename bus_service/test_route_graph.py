@@ -0,0 +1,68 @@
+import unittest
+
+from .bus_route import create_route_table
+from .bus_stops import bus_stop_utility
+from .route_graph import route_graph_utility
+from .test_bus_route import make_route
+from .test_bus_stops import STOPS
+
+ROUTES = [
+    make_route("975", 1, "45359", distance=0),
+    make_route("975", 2, "44539", distance=1.5),
+    make_route("975", 3, "59009", distance=12),
+    make_route("67", 1, "45029", distance=0),
+    make_route("67", 2, "46119", distance=6),
+    make_route("67", 3, "59009", distance=13.5),
+    make_route("67", 4, "00000", distance=14),  # unknown stop
+]
+
+
+def codes(path) -> list[str]:
+    return [stop["BusStopCode"] for stop in path.stops]
+
+
+class TestShortestPath(unittest.TestCase):
+    def setUp(self):
+        get_stop_pairs_within = bus_stop_utility(STOPS).get_stop_pairs_within
+        # 45029 and 45359 are about 630m apart
+        self.get_shortest_path = route_graph_utility(
+            STOPS, create_route_table(ROUTES), get_stop_pairs_within, 700
+        )
+
+    def test_ride(self):
+        path = self.get_shortest_path("45359", "59009")
+        assert path is not None
+        # riding is cheaper than walking to 45029 for service 67
+        self.assertEqual(codes(path), ["45359", "44539", "59009"])
+        self.assertEqual(path.walking, (False, False))
+        self.assertAlmostEqual(path.cost, 12_000)
+
+    def test_walk_then_ride(self):
+        path = self.get_shortest_path("45359", "46119")
+        assert path is not None
+        self.assertEqual(codes(path), ["45359", "45029", "46119"])
+        self.assertEqual(path.walking, (True, False))
+
+    def test_walk_both_ways(self):
+        path = self.get_shortest_path("45029", "45359")
+        assert path is not None
+        self.assertEqual(path.walking, (True,))
+
+    def test_unreachable(self):
+        # services only run in one direction
+        self.assertIsNone(self.get_shortest_path("59009", "45359"))
+        self.assertIsNone(self.get_shortest_path("14519", "59009"))
+        self.assertIsNone(self.get_shortest_path("00000", "59009"))
+
+    def test_without_walking(self):
+        get_shortest_path = route_graph_utility(
+            STOPS,
+            create_route_table(ROUTES),
+            bus_stop_utility(STOPS).get_stop_pairs_within,
+            0,
+        )
+        self.assertIsNone(get_shortest_path("45359", "46119"))
+
+
+if __name__ == "__main__":
+    unittest.main()
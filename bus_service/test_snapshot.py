@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from utils.custom_typings import AllBusRoutes, AllBusStops
+
+from .bus_route import create_route_table
+from .snapshot import MAGIC, PREAMBLE, read_snapshot, write_snapshot
+from .stop_search import create_token_postings
+from .test_adapter import ROUTES
+from .test_bus_stops import STOPS
+
+ALL_STOPS: AllBusStops = {"checksum": "abc", "bus_stops": STOPS}
+ALL_ROUTES: AllBusRoutes = {"checksum": "def", "bus_routes": ROUTES}
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = os.path.join(tmp_dir.name, "bus_data.snapshot")
+
+    def test_round_trip(self):
+        write_snapshot(self.path, ALL_STOPS, ALL_ROUTES)
+        snapshot = read_snapshot(self.path)
+        assert snapshot is not None
+        self.assertEqual(snapshot.all_stops, ALL_STOPS)
+        self.assertEqual(snapshot.all_routes["checksum"], ALL_ROUTES["checksum"])
+        self.assertEqual(list(snapshot.all_routes["bus_routes"]), ROUTES)
+        self.assertEqual(snapshot.all_routes["bus_routes"][-1], ROUTES[-1])
+        self.assertEqual(snapshot.token_postings, create_token_postings(STOPS))
+        route_table = create_route_table(ROUTES)
+        self.assertEqual(snapshot.route_table.keys, route_table.keys)
+        self.assertEqual(snapshot.route_table.stop_codes, route_table.stop_codes)
+        for column in ["offsets", "distances", "first_last_bus"]:
+            np.testing.assert_array_equal(
+                getattr(snapshot.route_table, column), getattr(route_table, column)
+            )
+
+    def test_empty_routes(self):
+        all_routes: AllBusRoutes = {"checksum": "", "bus_routes": []}
+        write_snapshot(self.path, ALL_STOPS, all_routes)
+        snapshot = read_snapshot(self.path)
+        assert snapshot is not None
+        self.assertEqual(list(snapshot.all_routes["bus_routes"]), [])
+
+    def test_missing_file(self):
+        self.assertIsNone(read_snapshot(self.path))
+
+    def test_other_version(self):
+        write_snapshot(self.path, ALL_STOPS, ALL_ROUTES)
+        with open(self.path, "r+b") as f:
+            _, version, header_length = PREAMBLE.unpack(f.read(PREAMBLE.size))
+            f.seek(0)
+            f.write(PREAMBLE.pack(MAGIC, version + 1, header_length))
+        self.assertIsNone(read_snapshot(self.path))
+
+    def test_truncated(self):
+        """
+        a damaged snapshot is ignored, so the datasets are fetched instead
+        """
+        write_snapshot(self.path, ALL_STOPS, ALL_ROUTES)
+        size = os.path.getsize(self.path)
+        # within the header, and within the arrays
+        for length in [PREAMBLE.size + 10, size // 2, size - 1]:
+            write_snapshot(self.path, ALL_STOPS, ALL_ROUTES)
+            with open(self.path, "r+b") as f:
+                f.truncate(length)
+            with self.assertLogs("bus_service.snapshot", "WARNING"):
+                self.assertIsNone(read_snapshot(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
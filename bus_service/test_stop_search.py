@@ -0,0 +1,216 @@
+import unittest
+
+from utils.custom_typings import BusStop
+
+from .bus_stop_search_map import expand_tokens, normalise_query
+from .stop_search import (
+    create_token_postings,
+    levenshtein,
+    prefix_range,
+    stop_search_utility,
+)
+
+
+def make_stop(code: str, description: str, road_name: str = "") -> BusStop:
+    return {
+        "BusStopCode": code,
+        "RoadName": road_name,
+        "Description": description,
+        "Latitude": 1.3,
+        "Longitude": 103.8,
+    }
+
+
+STOPS: list[BusStop] = [
+    make_stop("59073", "Opp Yishun Int", "Yishun Ave 2"),
+    make_stop("59009", "Yishun Int", "Yishun Ave 2"),
+    make_stop("28009", "Jurong East Int", "Jurong East St 12"),
+    make_stop("75009", "Tampines Int", "Tampines Ctrl 1"),
+    make_stop("46009", "Woodlands Intl Sch", "Woodlands Ave 2"),
+    make_stop("59011", "Blk 846", "Yishun Ring Rd"),
+    make_stop("10009", "Bt Merah Int", "Bt Merah Ctrl"),
+]
+
+
+def codes(stops: list[BusStop]) -> list[str]:
+    return [stop["BusStopCode"] for stop in stops]
+
+
+class TestTokenPostings(unittest.TestCase):
+    def test_sorted_by_stop_code(self):
+        token_postings = create_token_postings(STOPS)
+        self.assertEqual(
+            codes([STOPS[idx] for idx in token_postings["int"]]),
+            [
+                "10009",
+                "28009",
+                "59009",
+                "59073",
+                "75009",
+            ],
+        )
+
+    def test_road_name(self):
+        token_postings = create_token_postings(STOPS, "RoadName")
+        self.assertEqual(len(token_postings["yishun"]), 3)
+
+    def test_prefix_range(self):
+        words = ["int", "intl", "jurong", "yishun"]
+        self.assertEqual(prefix_range(words, "int"), ["int", "intl"])
+        self.assertEqual(prefix_range(words, "j"), ["jurong"])
+        self.assertEqual(prefix_range(words, "z"), [])
+
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        self.search = stop_search_utility(STOPS)
+
+    def test_exact_match_ranked_first(self):
+        stops, total = self.search(["yishun", "int"], 20)
+        # the road name match is only included with a prefix of "int"
+        self.assertEqual(codes(stops), ["59009", "59073"])
+        self.assertEqual(total, 2)
+
+    def test_abbreviation(self):
+        stops, _ = self.search(["Interchange"], 20)
+        # stops where more of the description matches are ranked first
+        self.assertEqual(codes(stops), ["59009", "75009", "10009", "28009", "59073"])
+
+    def test_prefix_of_full_word(self):
+        # "inter" is the start of "interchange" and "international"
+        stops, _ = self.search(["inter"], 20)
+        self.assertEqual(
+            set(codes(stops)),
+            {
+                "10009",
+                "28009",
+                "59009",
+                "75009",
+                "59073",
+                "46009",
+            },
+        )
+
+    def test_prefix(self):
+        stops, _ = self.search(["jur"], 20)
+        self.assertEqual(codes(stops), ["28009"])
+
+    def test_road_name(self):
+        stops, total = self.search(["yishun"], 20)
+        # description matches are ranked before road name matches
+        self.assertEqual(codes(stops), ["59009", "59073", "59011"])
+        self.assertEqual(total, 3)
+
+    def test_limit(self):
+        stops, total = self.search(["int"], 2)
+        self.assertEqual(codes(stops), ["59009", "75009"])
+        # "int" is also the start of "intl"
+        self.assertEqual(total, 6)
+
+    def test_unknown_tokens_ignored(self):
+        stops, _ = self.search(["", "tampines", "xyz"], 20)
+        self.assertEqual(codes(stops), ["75009"])
+
+    def test_no_match(self):
+        self.assertEqual(self.search(["xyz"], 20), ([], 0))
+
+    def test_deterministic(self):
+        reversed_search = stop_search_utility(STOPS[::-1])
+        self.assertEqual(
+            codes(self.search(["int"], 20).stops),
+            codes(reversed_search(["int"], 20).stops),
+        )
+
+
+class TestFuzzySearch(unittest.TestCase):
+    def setUp(self):
+        self.search = stop_search_utility(
+            STOPS
+            + [
+                make_stop("66009", "S'goon Int", "Upp Serangoon Rd"),
+                make_stop("28011", "Jurong Pt", "Jurong West St 63"),
+                make_stop("12345", "Jurang Ave", "Upp Jurong Rd"),
+            ]
+        )
+
+    def test_levenshtein(self):
+        self.assertEqual(levenshtein("jurog", "jurong", 2), 1)
+        self.assertEqual(levenshtein("serangon", "serangoon", 2), 1)
+        self.assertEqual(levenshtein("kitten", "sitting", 3), 3)
+        # distances above the limit are not calculated exactly
+        self.assertEqual(levenshtein("kitten", "sitting", 1), 2)
+        self.assertEqual(levenshtein("a", "abcd", 1), 2)
+
+    def test_misspelling(self):
+        stops, _ = self.search(["jurog", "int"], 20)
+        self.assertEqual(codes(stops), ["28009"])
+
+    def test_misspelled_full_word(self):
+        # "serangon" -> "serangoon" -> "s'goon", and the road name "serangoon"
+        stops, _ = self.search(["serangon", "int"], 20)
+        self.assertEqual(codes(stops), ["66009"])
+
+    def test_ranked_by_edits(self):
+        # "jurong" is 1 edit away, "jurang" is 2 edits away
+        stops, _ = self.search(["jurrang"], 20)
+        self.assertEqual(codes(stops)[0], "12345")
+        stops, _ = self.search(["jurongg"], 20)
+        self.assertEqual(codes(stops)[-1], "12345")
+
+    def test_correct_spelling_not_fuzzy(self):
+        # stops that only match a correction of "jurang" are not included
+        stops, _ = self.search(["jurang"], 20)
+        self.assertEqual(codes(stops), ["12345"])
+
+    def test_short_tokens_not_corrected(self):
+        self.assertEqual(self.search(["jur0ng"], 20), ([], 0))
+        self.assertEqual(self.search(["ywh"], 20), ([], 0))
+
+
+class TestAbbreviations(unittest.TestCase):
+    def setUp(self):
+        self.search = stop_search_utility(
+            [
+                make_stop("44009", "CCK Int", "Choa Chu Kang Loop"),
+                make_stop("44539", "Choa Chu Kang Stn", "Choa Chu Kang Ave 4"),
+                make_stop("44521", "Opp Choa Chu Kang Stn", "Choa Chu Kang Ave 4"),
+                make_stop("44319", "Bef Food Ctr", "Choa Chu Kang Ave 1"),
+            ]
+        )
+
+    def test_normalise_query(self):
+        self.assertEqual(
+            normalise_query(["choa", "chu", "kang", "int"]), ["cck", "int"]
+        )
+        self.assertEqual(normalise_query(["food", "centre"]), ["fc"])
+        # incomplete phrases are left as they are
+        self.assertEqual(normalise_query(["choa", "chu"]), ["choa", "chu"])
+
+    def test_expand_tokens(self):
+        self.assertEqual(
+            expand_tokens(["opp", "choa", "chu", "kang", "int"]),
+            [
+                ["opp", "opposite"],
+                ["choa", "cck"],
+                ["chu"],
+                ["kang"],
+                ["int", "interchange"],
+            ],
+        )
+
+    def test_phrase(self):
+        # matches the abbreviation and the full phrase in descriptions
+        stops, _ = self.search(["Choa", "Chu", "Kang"], 20)
+        # followed by the road name match
+        self.assertEqual(codes(stops), ["44009", "44539", "44521", "44319"])
+        stops, _ = self.search(["cck", "stn"], 20)
+        self.assertEqual(codes(stops), ["44539", "44521"])
+
+    def test_full_word_and_abbreviation(self):
+        self.assertEqual(self.search(["interchange"], 20), self.search(["int"], 20))
+        stops, _ = self.search(["opposite"], 20)
+        self.assertEqual(codes(stops), ["44521"])
+
+
+if __name__ == "__main__":
+    unittest.main()
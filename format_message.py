@@ -1,8 +1,13 @@
+from collections.abc import Sequence
 from functools import partial
 
 from bus_service.bus_arrival import get_arrival_time_mins
+from bus_service.bus_route import NO_SERVICE, RouteStops, StopService
+from bus_service.journey_planner import Journey
 from utils.custom_typings import BusInfo, BusStop
 
+MAX_SEARCH_RESULTS = 20
+
 # TODO need to refer to documentation on how to serve this information in a standardized manner
 
 
@@ -52,25 +57,97 @@ def __format_result(bus_stop: BusStop) -> str:
     return f"/{bus_stop['BusStopCode']} {bus_stop['Description']}"
 
 
-def bus_stop_search_msg(possible_stops: list[BusStop]) -> str:
+def bus_stop_search_msg(possible_stops: list[BusStop], total: int | None = None) -> str:
     """
     display list of stops matching search query
+
+    total is the number of matching stops, if only the top results were passed in
     """
-    if len(possible_stops) == 0:
+    if total is None:
+        total = len(possible_stops)
+    if total == 0:
         return "No bus stops match the search query"
-    title = f"""Showing {min(20, len(possible_stops))} out of {
-        len(possible_stops)
-    } bus stop{"" if len(possible_stops) == 1 else "s"} matching the search query"""
-    stops = map(__format_result, possible_stops[:20])
+    title = f"""Showing {min(MAX_SEARCH_RESULTS, len(possible_stops))} out of {
+        total
+    } bus stop{"" if total == 1 else "s"} matching the search query"""
+    stops = map(__format_result, possible_stops[:MAX_SEARCH_RESULTS])
     stops_text = "\n".join(stops)
     return f"{title}\n\n{stops_text}"
 
 
-def bus_route_msg(bus_number: str, stops: list[BusStop]) -> str:
+def format_bus_time(minutes: int) -> str:
+    """
+    format minutes after midnight as in the LTA dataset, e.g. 330 -> "0530"
+    """
+    if minutes == NO_SERVICE:
+        return "-"
+    return f"{minutes // 60:02}{minutes % 60:02}"
+
+
+def bus_route_msg(bus_number: str, route: RouteStops) -> str:
     """
-    display list of stops within a bus route
+    display list of stops within a bus route, with the distance along the route
+    and the first and last bus from the first stop
     """
     title = f"Route for bus {bus_number}"
-    stops_text_ls = map(__format_result, stops)
+    if len(route.stops) == 0:
+        return title
+    times = list(map(format_bus_time, route.first_last_bus[0].tolist()))
+    schedule = f"""First/last bus from {route.stops[0]["Description"]}
+Weekdays: {times[0]} - {times[1]}
+Saturdays: {times[2]} - {times[3]}
+Sundays: {times[4]} - {times[5]}"""
+    stops_text_ls = [
+        f"{__format_result(stop)} | {distance:.1f}km"
+        for stop, distance in zip(route.stops, route.distances.tolist())
+    ]
     stops_text = "\n".join(stops_text_ls)
-    return f"{title}\n\n{stops_text}"
+    return f"{title}\n\n{schedule}\n\n{stops_text}"
+
+
+def service_sort_key(service: str) -> tuple[int, str]:
+    """
+    sort services by number, e.g. 2, 10, 67, 67W, 961M
+    """
+    digits = service.rstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+    return (int(digits) if digits.isdigit() else 0, service)
+
+
+def stop_services_msg(bus_stop: BusStop, stop_services: Sequence[StopService]) -> str:
+    """
+    display list of services calling at a bus stop
+    """
+    title = f"{bus_stop['Description']} | {bus_stop['BusStopCode']}"
+    services = sorted({s.service for s in stop_services}, key=service_sort_key)
+    if len(services) == 0:
+        return f"{title}\n\nNo services stop here"
+    return f"{title}\n\nServices stopping here:\n{', '.join(services)}"
+
+
+def journey_msg(
+    origin: BusStop, destination: BusStop, journeys: Sequence[Journey]
+) -> str:
+    """
+    display trips between two bus stops, with the stop to board and alight
+    each service
+    """
+    title = f"""Trips from {origin["Description"]} | {origin["BusStopCode"]} to {
+        destination["Description"]
+    } | {destination["BusStopCode"]}"""
+    if len(journeys) == 0:
+        return f"{title}\n\nNo direct or one transfer trips found"
+    journeys_text_ls = []
+    for journey in journeys:
+        services = " > ".join(leg.service for leg in journey.legs)
+        legs = "\n".join(
+            f"{leg.service}: {__format_result(leg.board)} to "
+            f"{__format_result(leg.alight)} | {leg.stops} stop"
+            f"{'' if leg.stops == 1 else 's'}"
+            for leg in journey.legs
+        )
+        journeys_text_ls.append(
+            f"{services} | {journey.stops} stop{'' if journey.stops == 1 else 's'}"
+            f" | {journey.distance:.1f}km\n{legs}"
+        )
+    journeys_text = "\n\n".join(journeys_text_ls)
+    return f"{title}\n\n{journeys_text}"
@@ -25,7 +25,9 @@ def route_direction_handler(bus_service_adapter: BusServiceAdapter) -> Callable:
         bus_number, direction_str = query.data.split(",")
 
         # craft message
-        route_info = bus_service_adapter.get_route_stops(bus_number, int(direction_str))
+        route_info = bus_service_adapter.index.get_route_stops(
+            bus_number, int(direction_str)
+        )
         if route_info is None:
             await query.edit_message_text("Unknown bus number")
             return
@@ -60,11 +62,11 @@ def bus_stop_handler(bus_service_adapter: BusServiceAdapter) -> Callable:
         stop_id = query.data
 
         # craft message
-        stop_info = bus_service_adapter.get_stop_info(stop_id)
+        stop_info = bus_service_adapter.index.get_stop_info(stop_id)
         if stop_info is None:
             await query.edit_message_text("Unknown bus stop code")
             return
-        busses = get_arriving_busses(stop_id)  # stop_id should never be None
+        busses = await get_arriving_busses(stop_id)  # stop_id should never be None
         reply_msg = next_bus_msg(stop_info, busses, int(time.time()))
 
         # refresh button
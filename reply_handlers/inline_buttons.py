@@ -21,10 +21,17 @@ def make_refresh_button(stop_id: str) -> list[list[InlineKeyboardButton]]:
     return [[InlineKeyboardButton("Refresh", callback_data=stop_id)]]
 
 
-def get_stop_inline_button(bus_stop: BusStop) -> list[InlineKeyboardButton]:
-    return [
-        InlineKeyboardButton(
-            f"{bus_stop['BusStopCode']} | {bus_stop['Description']}",
-            callback_data=bus_stop["BusStopCode"],
-        )
-    ]
+def format_distance(distance: float) -> str:
+    "distance in metres, shown in km once it is over 1km"
+    if distance < 1000:
+        return f"{distance:.0f}m"
+    return f"{distance / 1000:.1f}km"
+
+
+def get_stop_inline_button(
+    bus_stop: BusStop, distance: float | None = None
+) -> list[InlineKeyboardButton]:
+    text = f"{bus_stop['BusStopCode']} | {bus_stop['Description']}"
+    if distance is not None:
+        text += f" ({format_distance(distance)})"
+    return [InlineKeyboardButton(text, callback_data=bus_stop["BusStopCode"])]
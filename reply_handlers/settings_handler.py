@@ -6,7 +6,7 @@ from telegram.ext import Application, CallbackQueryHandler, ContextTypes
 
 from bus_service.adapter import BusServiceAdapter
 from bus_service.bus_stops import GetStopInfo
-from storage.adapter import StorageUtility
+from storage.async_adapter import AsyncStorageUtility
 from utils.bot_utils import get_chat_id
 from utils.constants import SETTINGS_ACTIONS
 
@@ -51,7 +51,7 @@ SETTINGS_REVOKE_CONSENT_KEYBOARD = [
 ]
 
 
-def settings_consent_handler(storage_utility: StorageUtility) -> Callable:
+def settings_consent_handler(storage_utility: AsyncStorageUtility) -> Callable:
     """
     handle settings consent
     """
@@ -62,7 +62,7 @@ def settings_consent_handler(storage_utility: StorageUtility) -> Callable:
         chat_id = get_chat_id(update, context)
         if not chat_id:
             return  # ignore malformed requests
-        storage_utility.save_stops(chat_id, [])
+        await storage_utility.save_stops(chat_id, [])
         settings_handler = show_settings_handler(storage_utility)
         await settings_handler(update, context)
 
@@ -98,7 +98,7 @@ This action is irreversible."""
     return settings_consent_revoke_confirmation
 
 
-def revoke_consent_handler(storage_utility: StorageUtility) -> Callable:
+def revoke_consent_handler(storage_utility: AsyncStorageUtility) -> Callable:
     """
     handle removing settings consent
     """
@@ -110,7 +110,7 @@ def revoke_consent_handler(storage_utility: StorageUtility) -> Callable:
         chat_id = context._chat_id
         if query is None or query.data is None or chat_id is None:
             return
-        storage_utility.remove_user(chat_id)
+        await storage_utility.remove_user(chat_id)
 
         reply_msg = "User configuration settings will not be stored."
         await query.answer()
@@ -153,7 +153,7 @@ Allow the bot to store your settings data?"""
     return
 
 
-def show_settings_handler(storage_utility: StorageUtility) -> Callable:
+def show_settings_handler(storage_utility: AsyncStorageUtility) -> Callable:
     async def show_settings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """
         TODO handle scenario where stops exist or don't exist already
@@ -163,7 +163,7 @@ def show_settings_handler(storage_utility: StorageUtility) -> Callable:
         chat_id = get_chat_id(update, context)
         if chat_id is None:
             return  # ignore malformed requests
-        user_exists = storage_utility.check_user_exists(chat_id)
+        user_exists = await storage_utility.check_user_exists(chat_id)
         if not user_exists:
             return await ask_consent(update, context)
 
@@ -181,7 +181,7 @@ def show_settings_handler(storage_utility: StorageUtility) -> Callable:
 
 
 async def save_stop(
-    storage_utility: StorageUtility,
+    storage_utility: AsyncStorageUtility,
     get_stop_info: GetStopInfo,
     update: Update,
     stop_id: str,
@@ -189,7 +189,7 @@ async def save_stop(
     if update.message is None:
         return
 
-    user_exists = storage_utility.check_user_exists(update.message.chat_id)
+    user_exists = await storage_utility.check_user_exists(update.message.chat_id)
     if not user_exists:
         return await settings_not_enabled_message(update)
 
@@ -198,7 +198,7 @@ async def save_stop(
         await update.message.reply_text("Unable to save unknown bus stop code")
         return
 
-    storage_utility.save_stop(update.message.chat_id, stop_id)
+    await storage_utility.save_stop(update.message.chat_id, stop_id)
     # TODO use message formatter
     await update.message.reply_text(
         f"""Saved bus stop
@@ -227,7 +227,7 @@ def __make_saved_stops_list(
 
 
 def remove_flow_handler(
-    storage_utility: StorageUtility, get_stop_info: GetStopInfo
+    storage_utility: AsyncStorageUtility, bus_service_adapter: BusServiceAdapter
 ) -> Callable:
     async def remove_flow(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """
@@ -239,17 +239,19 @@ def remove_flow_handler(
             # ignore malformed requests
             return
 
-        user_exists = storage_utility.check_user_exists(chat_id)
-        if not user_exists:
+        profile = await storage_utility.get_profile(chat_id)
+        if not profile.exists:
             return await settings_not_enabled_message(update)
 
-        saved_stops = storage_utility.get_saved_stops(chat_id)
+        saved_stops = list(profile.saved_stops)
         if len(saved_stops) > 0:
             text = "Remove a stop from the list below:"
         else:
             text = "List is empty."
         callback_buttons = __make_saved_stops_list(
-            get_stop_info, saved_stops, SETTINGS_ACTIONS.REMOVE
+            bus_service_adapter.index.get_stop_info,
+            saved_stops,
+            SETTINGS_ACTIONS.REMOVE,
         ) + [BACK_TO_SETTINGS_BUTTON]
         reply_markup = InlineKeyboardMarkup(callback_buttons)
         await query.answer()
@@ -259,7 +261,7 @@ def remove_flow_handler(
 
 
 def remove_handler(
-    storage_utility: StorageUtility, get_stop_info: GetStopInfo
+    storage_utility: AsyncStorageUtility, bus_service_adapter: BusServiceAdapter
 ) -> Callable:
     async def remove_stop(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """
@@ -271,21 +273,21 @@ def remove_handler(
             # ignore malformed requests
             return
 
-        user_exists = storage_utility.check_user_exists(chat_id)
+        user_exists = await storage_utility.check_user_exists(chat_id)
         if not user_exists:
             return await settings_not_enabled_message(update)
 
         stop_id = query.data.split(",")[1]
-        storage_utility.remove_stop(chat_id, stop_id)
+        await storage_utility.remove_stop(chat_id, stop_id)
 
-        remove_flow = remove_flow_handler(storage_utility, get_stop_info)
+        remove_flow = remove_flow_handler(storage_utility, bus_service_adapter)
         await remove_flow(update, context)
 
     return remove_stop
 
 
 def reorder_flow_handler(
-    storage_utility: StorageUtility, get_stop_info: GetStopInfo
+    storage_utility: AsyncStorageUtility, bus_service_adapter: BusServiceAdapter
 ) -> Callable:
     async def reorder_flow(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """
@@ -296,14 +298,16 @@ def reorder_flow_handler(
         if query is None or query.data is None or chat_id is None:
             return  # ignore malformed requests
 
-        user_exists = storage_utility.check_user_exists(chat_id)
-        if not user_exists:
+        profile = await storage_utility.get_profile(chat_id)
+        if not profile.exists:
             return await settings_not_enabled_message(update)
 
-        saved_stops = storage_utility.get_saved_stops(chat_id)
+        saved_stops = list(profile.saved_stops)
         text = "Select a stop to reorder from the list below:"
         callback_buttons = __make_saved_stops_list(
-            get_stop_info, saved_stops, SETTINGS_ACTIONS.REORDER_SELECT
+            bus_service_adapter.index.get_stop_info,
+            saved_stops,
+            SETTINGS_ACTIONS.REORDER_SELECT,
         ) + [BACK_TO_SETTINGS_BUTTON]
         reply_markup = InlineKeyboardMarkup(callback_buttons)
         await query.answer()
@@ -353,7 +357,7 @@ def __get_reorder_list_message(
 
 
 def reorder_select_handler(
-    storage_utility: StorageUtility, get_stop_info: GetStopInfo
+    storage_utility: AsyncStorageUtility, bus_service_adapter: BusServiceAdapter
 ) -> Callable:
     async def reorder_select(
         update: Update, context: ContextTypes.DEFAULT_TYPE
@@ -366,16 +370,18 @@ def reorder_select_handler(
         if query is None or query.data is None or chat_id is None:
             return  # ignore malformed requests
 
-        user_exists = storage_utility.check_user_exists(chat_id)
-        if not user_exists:
+        profile = await storage_utility.get_profile(chat_id)
+        if not profile.exists:
             return await settings_not_enabled_message(update)
 
         selected_stop_id = query.data.split(",")[1]
 
-        saved_stops = storage_utility.get_saved_stops(chat_id)
+        saved_stops = list(profile.saved_stops)
         try:
             idx = saved_stops.index(selected_stop_id)
-            text = __get_reorder_list_message(get_stop_info, saved_stops, idx)
+            text = __get_reorder_list_message(
+                bus_service_adapter.index.get_stop_info, saved_stops, idx
+            )
             reply_markup = __make_reorder_keyboard(selected_stop_id, idx)
             await query.answer()
             await query.edit_message_text(text, reply_markup=reply_markup)
@@ -391,26 +397,8 @@ def reorder_select_handler(
     return reorder_select
 
 
-def __reorder_stops_list(saved_stops: list[str], pos: int, dir: str) -> list[str]:
-    ls = saved_stops[::]
-    target = saved_stops[pos]
-    if dir == "0":  # move forward
-        if pos == 0:
-            # already first item
-            return ls
-        ls[pos] = ls[pos - 1]
-        ls[pos - 1] = target
-    else:  # move backwards
-        if pos == len(saved_stops) - 1:
-            # already last item
-            return ls
-        ls[pos] = ls[pos + 1]
-        ls[pos + 1] = target
-    return ls
-
-
 def reorder_handler(
-    storage_utility: StorageUtility, get_stop_info: GetStopInfo
+    storage_utility: AsyncStorageUtility, bus_service_adapter: BusServiceAdapter
 ) -> Callable:
     async def reorder_stop(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """
@@ -422,20 +410,15 @@ def reorder_handler(
             # ignore malformed requests
             return
 
-        user_exists = storage_utility.check_user_exists(chat_id)
+        user_exists = await storage_utility.check_user_exists(chat_id)
         if not user_exists:
             return await settings_not_enabled_message(update)
 
-        _, stop_id, position, direction = query.data.split(",")
-        saved_stops = storage_utility.get_saved_stops(chat_id)
-        # validate the stop exists at that position
-        if saved_stops[int(position)] != stop_id:
-            # TODO show error about invalid data
-            return
-        new_stops_order = __reorder_stops_list(saved_stops, int(position), direction)
-        storage_utility.save_stops(chat_id, new_stops_order)
+        _, stop_id, _, direction = query.data.split(",")
+        # swapped by stop code, so an outdated position does not move the wrong stop
+        await storage_utility.move_stop(chat_id, stop_id, forward=direction == "0")
 
-        reorder_select = reorder_select_handler(storage_utility, get_stop_info)
+        reorder_select = reorder_select_handler(storage_utility, bus_service_adapter)
         await reorder_select(update, context)
 
     return reorder_stop
@@ -444,7 +427,7 @@ def reorder_handler(
 def register_settings_handlers(
     application: Application,
     bus_service_adapter: BusServiceAdapter,
-    storage_utility: StorageUtility,
+    storage_utility: AsyncStorageUtility,
 ) -> None:
     """
     register settings handlers
@@ -475,31 +458,31 @@ def register_settings_handlers(
     )
     application.add_handler(
         CallbackQueryHandler(
-            remove_flow_handler(storage_utility, bus_service_adapter.get_stop_info),
+            remove_flow_handler(storage_utility, bus_service_adapter),
             pattern=SETTINGS_ACTIONS.REMOVE_FLOW.value,
         )
     )
     application.add_handler(
         CallbackQueryHandler(
-            remove_handler(storage_utility, bus_service_adapter.get_stop_info),
+            remove_handler(storage_utility, bus_service_adapter),
             pattern=rf"{SETTINGS_ACTIONS.REMOVE.value},\d{{5}}",
         )
     )
     application.add_handler(
         CallbackQueryHandler(
-            reorder_flow_handler(storage_utility, bus_service_adapter.get_stop_info),
+            reorder_flow_handler(storage_utility, bus_service_adapter),
             pattern=SETTINGS_ACTIONS.REORDER_FLOW.value,
         )
     )
     application.add_handler(
         CallbackQueryHandler(
-            reorder_select_handler(storage_utility, bus_service_adapter.get_stop_info),
+            reorder_select_handler(storage_utility, bus_service_adapter),
             pattern=rf"{SETTINGS_ACTIONS.REORDER_SELECT.value},\d{{5}}",
         )
     )
     application.add_handler(
         CallbackQueryHandler(
-            reorder_handler(storage_utility, bus_service_adapter.get_stop_info),
+            reorder_handler(storage_utility, bus_service_adapter),
             pattern=rf"{SETTINGS_ACTIONS.REORDER.value},\d{{5}},\d,[01]",
         )
     )
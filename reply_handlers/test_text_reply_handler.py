@@ -0,0 +1,47 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from reply_handlers import text_reply_handler
+from reply_handlers.text_reply_handler import message_handler
+
+
+class TestMessageHandler(unittest.TestCase):
+    def reply(self, text: str) -> dict[str, AsyncMock]:
+        """
+        handle a message, and return the mocked command handlers
+        """
+        handlers = {
+            name: AsyncMock()
+            for name in ["stop_services", "plan_journey", "search", "unknown_command"]
+        }
+        update = MagicMock()
+        update.message.text = text
+        with patch.multiple(text_reply_handler, **handlers):
+            handler = message_handler(MagicMock(), AsyncMock())
+            asyncio.run(handler(update, MagicMock()))
+        return handlers
+
+    def test_plan(self):
+        handlers = self.reply("/plan 45359 59009 stops")
+        args = handlers["plan_journey"].call_args.args
+        self.assertEqual(args[3:], ("45359", "59009", "stops"))
+        self.assertEqual(self.reply("plan")["plan_journey"].call_count, 1)
+
+    def test_services(self):
+        handlers = self.reply("services 44009")
+        self.assertEqual(handlers["stop_services"].call_args.args[3], "44009")
+
+    def test_word_starting_with_command(self):
+        """
+        words which only start with a command are unknown
+        """
+        for text in ["planet", "plans 12345", "servicesxyz"]:
+            handlers = self.reply(text)
+            handlers["plan_journey"].assert_not_called()
+            handlers["stop_services"].assert_not_called()
+            handlers["unknown_command"].assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
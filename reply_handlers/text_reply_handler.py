@@ -7,11 +7,21 @@ from telegram.ext import ContextTypes
 
 from bus_service.adapter import BusServiceAdapter, GetRouteStops
 from bus_service.bus_arrival import get_arriving_busses
-from bus_service.bus_stops import GetStopInfo, SearchPossibleStops
-from format_message import bus_route_msg, bus_stop_search_msg, next_bus_msg
+from bus_service.bus_route import GetStopServices
+from bus_service.bus_stops import GetStopInfo
+from bus_service.journey_planner import PlanJourney, RankBy
+from bus_service.stop_search import SearchPossibleStops
+from format_message import (
+    MAX_SEARCH_RESULTS,
+    bus_route_msg,
+    bus_stop_search_msg,
+    journey_msg,
+    next_bus_msg,
+    stop_services_msg,
+)
 from reply_handlers.settings_handler import save_stop
 from saved_stops import list_saved_stops
-from storage.adapter import StorageUtility
+from storage.async_adapter import AsyncStorageUtility
 from .inline_buttons import make_change_route_btn, make_refresh_button
 
 
@@ -24,6 +34,13 @@ REGEX_BUS_NUM = r"^\/?(\d{1,3}[A-Za-z]?)$"
 # route 2
 # /route 307E
 REGEX_ROUTE = r"\/?route\s*(\d{1,3}[A-Za-z]?)?"
+# services 44009
+# /services 44009
+# the command must be followed by a space or the end, so "servicesxyz" is unknown
+REGEX_SERVICES = r"\/?services(?:\s+|$)(\d{5})?"
+# plan 45359 59009
+# /plan 45359 59009 stops
+REGEX_PLAN = r"\/?plan(?:\s+|$)(\d{5})?\s*(\d{5})?\s*(distance|stops)?"
 # search opp heavy
 # /search pei
 REGEX_SEARCH = r"\/?search\s*(.*)"
@@ -38,7 +55,7 @@ REGEX_LIST_SAVED_STOPS = r"\/?list"
 
 
 def message_handler(
-    bus_service_adapter: BusServiceAdapter, storage_utility: StorageUtility
+    bus_service_adapter: BusServiceAdapter, storage_utility: AsyncStorageUtility
 ) -> Callable:
     async def reply(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
         """
@@ -49,29 +66,42 @@ def message_handler(
         if update.message is None or update.message.text is None:
             return
         msg = update.message.text
+        # use the same generation of indexes for the whole request
+        index = bus_service_adapter.index
 
         if match := re.match(REGEX_STOP_CODE, msg):
             stop_code = match.group(1)
-            await bus_stop_code(bus_service_adapter.get_stop_info, update, stop_code)
+            await bus_stop_code(index.get_stop_info, update, stop_code)
         elif match := re.match(REGEX_BUS_NUM, msg, re.IGNORECASE):
             bus_number = match.group(1)
-            await bus_route(bus_service_adapter.get_route_stops, update, bus_number)
+            await bus_route(index.get_route_stops, update, bus_number)
         elif match := re.match(REGEX_ROUTE, msg, re.IGNORECASE):
             bus_number = match.group(1)
-            await bus_route(bus_service_adapter.get_route_stops, update, bus_number)
+            await bus_route(index.get_route_stops, update, bus_number)
+        elif match := re.match(REGEX_SERVICES, msg, re.IGNORECASE):
+            stop_code = match.group(1)
+            await stop_services(
+                index.get_stop_info, index.get_stop_services, update, stop_code
+            )
+        elif match := re.match(REGEX_PLAN, msg, re.IGNORECASE):
+            origin, destination, rank_by = match.groups()
+            await plan_journey(
+                index.get_stop_info,
+                index.plan_journey,
+                update,
+                origin,
+                destination,
+                (rank_by or "distance").lower(),
+            )
         elif match := re.match(REGEX_SEARCH, msg, re.IGNORECASE):
             query_str = match.group(1)
             query: list[str] = re.split(r"\s", query_str)
-            await search(bus_service_adapter.search_possible_stops, update, query)
+            await search(index.search_possible_stops, update, query)
         elif match := re.match(REGEX_ADD_STOP, msg, re.IGNORECASE):
             stop_code = match.group(1)
-            await save_stop(
-                storage_utility, bus_service_adapter.get_stop_info, update, stop_code
-            )
+            await save_stop(storage_utility, index.get_stop_info, update, stop_code)
         elif re.match(REGEX_LIST_SAVED_STOPS, msg, re.IGNORECASE) is not None:
-            await list_saved_stops(
-                storage_utility, bus_service_adapter.get_stop_info, update
-            )
+            await list_saved_stops(storage_utility, index.get_stop_info, update)
         else:
             # unknown command message
             await unknown_command(update)
@@ -93,7 +123,7 @@ async def bus_stop_code(
     if stop_info is None:
         await update.message.reply_text("Unknown bus stop code")
         return
-    busses = get_arriving_busses(stop_id)
+    busses = await get_arriving_busses(stop_id)
     reply_msg = next_bus_msg(stop_info, busses, int(time.time()))
 
     # refresh button
@@ -129,13 +159,70 @@ async def bus_route(
     await update.message.reply_text(text=reply_msg, reply_markup=reply_markup)
 
 
+async def stop_services(
+    get_stop_info: GetStopInfo,
+    get_stop_services: GetStopServices,
+    update: Update,
+    stop_id: str | None,
+) -> None:
+    """
+    reply user with the services calling at a bus stop
+    """
+    if update.message is None:
+        return
+
+    if stop_id is None:
+        await update.message.reply_text("Please provide a bus stop code")
+        return
+
+    stop_info = get_stop_info(stop_id)
+    if stop_info is None:
+        await update.message.reply_text("Unknown bus stop code")
+        return
+    reply_msg = stop_services_msg(stop_info, get_stop_services(stop_id))
+
+    await update.message.reply_text(text=reply_msg)
+
+
+async def plan_journey(
+    get_stop_info: GetStopInfo,
+    plan: PlanJourney,
+    update: Update,
+    origin_id: str | None,
+    destination_id: str | None,
+    rank_by: RankBy,
+) -> None:
+    """
+    reply user with direct and one transfer trips between two bus stops
+    """
+    if update.message is None:
+        return
+
+    if origin_id is None or destination_id is None:
+        await update.message.reply_text(
+            "Please provide the bus stop codes to travel from and to"
+        )
+        return
+
+    origin = get_stop_info(origin_id)
+    destination = get_stop_info(destination_id)
+    if origin is None or destination is None:
+        await update.message.reply_text("Unknown bus stop code")
+        return
+    reply_msg = journey_msg(
+        origin, destination, plan(origin_id, destination_id, rank_by)
+    )
+
+    await update.message.reply_text(text=reply_msg)
+
+
 async def search(
     search_possible_stops: SearchPossibleStops, update: Update, query: list[str]
 ) -> None:
     if update.message is None:
         return
-    possible_stops = search_possible_stops(query)
-    reply_msg = bus_stop_search_msg(possible_stops)
+    possible_stops, total = search_possible_stops(query, MAX_SEARCH_RESULTS)
+    reply_msg = bus_stop_search_msg(possible_stops, total)
 
     await update.message.reply_text(text=reply_msg)
 
@@ -3,13 +3,13 @@ from telegram import InlineKeyboardMarkup, Update
 from bus_service.bus_stops import GetStopInfo
 from reply_handlers.inline_buttons import get_stop_inline_button
 from reply_handlers.settings_handler import settings_not_enabled_message
-from storage.adapter import StorageUtility
+from storage.async_adapter import AsyncStorageUtility
 from utils.custom_typings import BusStop
 from utils.bot_utils import get_chat_id
 
 
 async def list_saved_stops(
-    storage_utility: StorageUtility,
+    storage_utility: AsyncStorageUtility,
     get_stop_info: GetStopInfo,
     update: Update,
 ) -> None:
@@ -21,12 +21,11 @@ async def list_saved_stops(
     if not chat_id or update.message is None:
         return  # ignore malformed requests
 
-    user_exists = storage_utility.check_user_exists(update.message.chat_id)
-    if not user_exists:
+    profile = await storage_utility.get_profile(chat_id)
+    if not profile.exists:
         return await settings_not_enabled_message(update)
 
-    saved_stops = storage_utility.get_saved_stops(chat_id)
-    stops_iterable = map(get_stop_info, saved_stops)
+    stops_iterable = map(get_stop_info, profile.saved_stops)
     stops: list[BusStop] = []
     # TODO: indicate when a saved stop is no longer present
     for stop in stops_iterable:
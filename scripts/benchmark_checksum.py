@@ -0,0 +1,27 @@
+# Run this script to compare the checksum implementations
+# uv run python -m scripts.benchmark_checksum
+
+import hashlib
+import timeit
+from functools import reduce
+
+from scripts.checksum import xor_bytes, xor_digests
+
+NUM_DIGESTS = 30000  # roughly the number of bus routes
+REPEAT = 5
+
+
+def main():
+    digests = [hashlib.sha3_256(str(i).encode()).digest() for i in range(NUM_DIGESTS)]
+    assert reduce(xor_bytes, digests) == xor_digests(digests)
+
+    for name, fn in [
+        ("reduce(xor_bytes)", lambda: reduce(xor_bytes, digests)),
+        ("xor_digests", lambda: xor_digests(digests)),
+    ]:
+        best = min(timeit.repeat(fn, number=1, repeat=REPEAT))
+        print(f"{name:<20} {best * 1000:8.2f} ms for {NUM_DIGESTS} digests")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# Run this script to measure the latency of stop search, including typo correction
+# uv run python -m scripts.benchmark_search [bus_stops.json]
+#
+# uses the stops saved in development mode if given,
+# otherwise a generated dataset of roughly the same size
+
+import json
+import random
+import string
+import sys
+import timeit
+
+from bus_service.stop_search import stop_search_utility, tokenize
+from utils.custom_typings import BusStop
+
+NUM_STOPS = 5200  # roughly the number of bus stops
+NUM_QUERIES = 2000
+
+
+def generate_stops(rng: random.Random) -> list[BusStop]:
+    words = [
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10)))
+        for _ in range(1500)
+    ]
+    return [
+        {
+            "BusStopCode": f"{idx:05}",
+            "RoadName": " ".join(rng.sample(words, 2)),
+            "Description": " ".join(rng.sample(words, rng.randint(1, 4))),
+            "Latitude": 1.3,
+            "Longitude": 103.8,
+        }
+        for idx in range(NUM_STOPS)
+    ]
+
+
+def misspell(rng: random.Random, word: str) -> str:
+    pos = rng.randrange(len(word))
+    char = rng.choice(string.ascii_lowercase)
+    return rng.choice(
+        [
+            word[:pos] + word[pos + 1 :],  # deletion
+            word[:pos] + char + word[pos + 1 :],  # substitution
+            word[:pos] + char + word[pos:],  # insertion
+        ]
+    )
+
+
+def percentile(timings: list[float], p: float) -> float:
+    return sorted(timings)[min(len(timings) - 1, int(len(timings) * p))]
+
+
+def main():
+    rng = random.Random(0)
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            stops: list[BusStop] = json.load(f)["bus_stops"]
+    else:
+        stops = generate_stops(rng)
+
+    build_time = timeit.timeit(lambda: stop_search_utility(stops), number=1)
+    search = stop_search_utility(stops)
+    words = sorted(
+        {
+            token
+            for stop in stops
+            for token in tokenize(stop["Description"])
+            if token.isalpha() and len(token) >= 4
+        }
+    )
+
+    queries = {
+        "exact": [[rng.choice(words)] for _ in range(NUM_QUERIES)],
+        "prefix": [[rng.choice(words)[:3]] for _ in range(NUM_QUERIES)],
+        "typo": [[misspell(rng, rng.choice(words))] for _ in range(NUM_QUERIES)],
+        "typo + exact": [
+            [misspell(rng, rng.choice(words)), rng.choice(words)]
+            for _ in range(NUM_QUERIES)
+        ],
+    }
+
+    print(f"{len(stops)} stops, index built in {build_time * 1000:.1f} ms")
+    for name, query_list in queries.items():
+        timings = [
+            timeit.timeit(lambda query=query: search(query, 20), number=1)
+            for query in query_list
+        ]
+        print(
+            f"{name:<14} p50 {percentile(timings, 0.5) * 1000:6.3f} ms"
+            f"  p99 {percentile(timings, 0.99) * 1000:6.3f} ms"
+            f"  max {max(timings) * 1000:6.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
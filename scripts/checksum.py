@@ -0,0 +1,25 @@
+"""
+order independent checksum of a dataset, computed by XOR-ing the digest of each row
+"""
+
+from collections.abc import Iterable
+
+import numpy as np
+
+DIGEST_SIZE = 32  # sha3_256
+
+
+def xor_bytes(bytes1: bytes, bytes2: bytes) -> bytes:
+    return bytes([b1 ^ b2 for b1, b2 in zip(bytes1, bytes2)])
+
+
+def xor_digests(digests: Iterable[bytes]) -> bytes:
+    """
+    XOR digests together in a single vectorized pass
+
+    gives the same result as reduce(xor_bytes, digests)
+    since XOR is applied bitwise, folding 8 bytes at a time as uint64 does not change it
+    """
+    buffer = b"".join(digests)
+    words = np.frombuffer(buffer, dtype=np.uint64).reshape(-1, DIGEST_SIZE // 8)
+    return np.bitwise_xor.reduce(words, axis=0).tobytes()
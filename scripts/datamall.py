@@ -0,0 +1,116 @@
+"""
+download paginated datasets from LTA DataMall
+"""
+
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 500  # API can only return 500 results at once
+MAX_WORKERS = 8
+RETRIES = 3
+BACKOFF = 0.5  # time in seconds before the first retry, doubles after each attempt
+TIMEOUT = (3.05, 30)  # connect and read timeout in seconds
+
+
+def fetch_page(
+    session: requests.Session,
+    url: str,
+    headers: dict[str, str],
+    skip: int,
+    retries: int = RETRIES,
+    backoff: float = BACKOFF,
+) -> list[Any]:
+    """
+    fetch a single page of results, retrying with exponential backoff on failure
+    """
+    attempt = 0
+    while True:
+        try:
+            res = session.get(f"{url}?$skip={skip}", headers=headers, timeout=TIMEOUT)
+            res.raise_for_status()
+            return res.json()["value"]
+        except (requests.RequestException, ValueError, KeyError) as e:
+            if attempt >= retries:
+                raise
+            delay = backoff * 2**attempt
+            logger.warning("Retrying %s?$skip=%d in %.1fs: %r", url, skip, delay, e)
+            time.sleep(delay)
+            attempt += 1
+
+
+def fetch_all_pages(
+    url: str,
+    headers: dict[str, str],
+    max_workers: int = MAX_WORKERS,
+    retries: int = RETRIES,
+    backoff: float = BACKOFF,
+) -> list[Any]:
+    """
+    fetch every page of a dataset, with up to max_workers pages in flight at once
+
+    pages are requested in order until a short or empty page is returned,
+    then reassembled in order so the result is the same as fetching them one by one
+    pages past the end are only requested to keep the pool busy,
+    so they are allowed to fail
+    """
+    pages: dict[int, list[Any]] = {}
+    errors: dict[int, BaseException] = {}
+    end: int | None = None  # number of pages with results
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    with session, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight: dict[Future[list[Any]], int] = {}
+        next_page = 0
+
+        try:
+            while True:
+                # keep the pool busy until the end of the dataset is found,
+                # or a page fails, in which case the end may never be found
+                while end is None and not errors and len(in_flight) < max_workers:
+                    future = executor.submit(
+                        fetch_page,
+                        session,
+                        url,
+                        headers,
+                        next_page * PAGE_SIZE,
+                        retries,
+                        backoff,
+                    )
+                    in_flight[future] = next_page
+                    next_page += 1
+                if len(in_flight) == 0:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page = in_flight.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        errors[page] = error
+                        continue
+                    rows = future.result()
+                    pages[page] = rows
+                    if len(rows) < PAGE_SIZE:
+                        page_end = page + 1 if rows else page
+                        end = page_end if end is None else min(end, page_end)
+                # a page before the end failed, so the dataset is incomplete
+                failed = [page for page in errors if end is None or page < end]
+                if failed and (end is not None or len(in_flight) == 0):
+                    raise errors[min(failed)]
+        except BaseException:
+            executor.shutdown(cancel_futures=True)
+            raise
+
+    assert end is not None
+    return [row for page in range(end) for row in pages[page]]
@@ -1,12 +1,12 @@
 # Run this script to get an updated routes.json
 
-from functools import reduce
 import hashlib
 import json
-import requests
 
 from decouple import config
 
+from scripts.checksum import xor_digests
+from scripts.datamall import fetch_all_pages
 from utils.custom_typings import AllBusRoutes, BusRoute
 
 URL_GET_ALL_ROUTES = "https://datamall2.mytransport.sg/ltaodataservice/BusRoutes"
@@ -23,35 +23,18 @@ def get_route_hash(stop: BusRoute) -> bytes:
     return msg.digest()
 
 
-def xor_bytes(bytes1: bytes, bytes2: bytes) -> bytes:
-    return bytes([b1 ^ b2 for b1, b2 in zip(bytes1, bytes2)])
-
-
 def bus_routes_checksum(stops: list[BusRoute]) -> str:
     """
     calculate checksum of list of stops
     """
     # no need to sort first since we rely on xor
-    stop_hash_bytes_ls = list(map(lambda x: get_route_hash(x), stops))
-    checksum_bytes = reduce(xor_bytes, stop_hash_bytes_ls)
+    checksum_bytes = xor_digests(map(get_route_hash, stops))
     return checksum_bytes.hex()
 
 
 def fetch_routes() -> list[BusRoute]:
-    all_routes: list[BusRoute] = []  # store all the stops in this array
-    skips = 0  # use skips since API can only return 500 results at once
-
-    # Build query string
     headers = {"AccountKey": config("ACCOUNT_KEY", cast=str)}
-
-    while True:
-        res = requests.get(f"{URL_GET_ALL_ROUTES}?$skip={skips}", headers=headers)
-        json_data = res.json()
-        if not json_data["value"]:  # break loop when resulting json is empty
-            break
-        fetched_all_stops: list[BusRoute] = json_data["value"]
-        all_routes += fetched_all_stops
-        skips += 500
+    all_routes: list[BusRoute] = fetch_all_pages(URL_GET_ALL_ROUTES, headers)
     return all_routes
 
 
@@ -0,0 +1,27 @@
+import hashlib
+import unittest
+from functools import reduce
+
+from .checksum import xor_bytes, xor_digests
+from .fetch_stops import bus_stops_checksum, get_stop_hash
+from .test_fetch_stops import STOPS
+
+
+def digests(count: int) -> list[bytes]:
+    return [hashlib.sha3_256(str(i).encode()).digest() for i in range(count)]
+
+
+class TestXorDigests(unittest.TestCase):
+    def test_same_as_reduce(self):
+        for count in [1, 2, 3, 1000]:
+            self.assertEqual(
+                xor_digests(digests(count)), reduce(xor_bytes, digests(count))
+            )
+
+    def test_stops_checksum_unchanged(self):
+        expected = reduce(xor_bytes, map(get_stop_hash, STOPS)).hex()
+        self.assertEqual(bus_stops_checksum(STOPS), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
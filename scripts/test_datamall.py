@@ -0,0 +1,114 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from utils.custom_typings import BusRoute
+
+from .datamall import PAGE_SIZE, fetch_all_pages
+from .fetch_routes import bus_routes_checksum
+
+ROUTES: list[BusRoute] = [
+    {
+        "ServiceNo": str(i // 40),
+        "Direction": 1,
+        "StopSequence": i % 40 + 1,
+        "BusStopCode": f"{i:05}",
+        "Distance": i % 40,
+        "WD_FirstBus": "0500",
+        "WD_LastBus": "2300",
+        "SAT_FirstBus": "0500",
+        "SAT_LastBus": "2300",
+        "SUN_FirstBus": "0600",
+        "SUN_LastBus": "2300",
+    }
+    for i in range(PAGE_SIZE * 5 + 123)
+]
+
+
+class FakeDataMall(BaseHTTPRequestHandler):
+    """
+    serves ROUTES in pages of PAGE_SIZE like the DataMall API
+    """
+
+    server: "FakeDataMallServer"
+
+    def do_GET(self):
+        skip = int(parse_qs(urlparse(self.path).query)["$skip"][0])
+        self.server.requested_skips.append(skip)
+        if self.server.failures.get(skip, 0) > 0:
+            self.server.failures[skip] -= 1
+            self.send_response(500)
+            self.end_headers()
+            return
+        routes = self.server.routes[skip : skip + PAGE_SIZE]
+        body = json.dumps({"value": routes}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeDataMallServer(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeDataMall)
+        self.requested_skips: list[int] = []
+        # number of times to fail for a given skip
+        self.failures: dict[int, int] = {}
+        self.routes: list[BusRoute] = ROUTES
+
+
+class TestFetchAllPages(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeDataMallServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/BusRoutes"
+
+    def test_same_result_as_serial(self):
+        routes = fetch_all_pages(self.url, {"AccountKey": "test"}, max_workers=4)
+        self.assertEqual(routes, ROUTES)
+        self.assertEqual(bus_routes_checksum(routes), bus_routes_checksum(ROUTES))
+
+    def test_single_worker(self):
+        routes = fetch_all_pages(self.url, {"AccountKey": "test"}, max_workers=1)
+        self.assertEqual(routes, ROUTES)
+        # stops at the first short page
+        self.assertEqual(self.server.requested_skips, [i * PAGE_SIZE for i in range(6)])
+
+    def test_retry(self):
+        self.server.failures = {PAGE_SIZE * 2: 2}
+        routes = fetch_all_pages(self.url, {"AccountKey": "test"}, backoff=0.01)
+        self.assertEqual(routes, ROUTES)
+
+    def test_failure_past_end(self):
+        # pages past the short last page are requested while it is in flight
+        self.server.failures = {PAGE_SIZE * i: 10 for i in range(6, 10)}
+        routes = fetch_all_pages(
+            self.url, {"AccountKey": "test"}, max_workers=8, retries=0
+        )
+        self.assertEqual(routes, ROUTES)
+        self.assertIn(PAGE_SIZE * 7, self.server.requested_skips)
+
+    def test_empty_last_page(self):
+        self.server.routes = ROUTES[: PAGE_SIZE * 5]
+        routes = fetch_all_pages(self.url, {"AccountKey": "test"}, max_workers=1)
+        self.assertEqual(routes, ROUTES[: PAGE_SIZE * 5])
+        self.assertEqual(self.server.requested_skips, [i * PAGE_SIZE for i in range(6)])
+
+    def test_retries_exhausted(self):
+        self.server.failures = {PAGE_SIZE: 10}
+        with self.assertRaises(requests.HTTPError):
+            fetch_all_pages(self.url, {"AccountKey": "test"}, retries=1, backoff=0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
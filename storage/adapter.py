@@ -1,148 +1,204 @@
 import logging
-import sqlite3
+import threading
+from collections import Counter
+from collections.abc import Sequence
 
-from storage.initialize import init
+from decouple import config
+
+from storage.backend import (
+    NO_PROFILE,
+    MoveStop,
+    RemoveStop,
+    RemoveUser,
+    SaveStop,
+    SaveStops,
+    StorageBackend,
+    StorageError,
+    UserProfile,
+    Write,
+    known_profile,
+)
+from storage.memory_backend import MemoryBackend
+from storage.sharded_backend import ShardedSQLiteBackend
+from storage.sqlite_backend import DATABASE_PATH, SQLiteBackend
+from utils.lru_cache import CacheStats, LRUCache
 
 logger = logging.getLogger(__name__)
 
+# sqlite, sharded or memory, if not set the caller of create_backend chooses
+STORAGE_BACKEND: str | None = config("STORAGE_BACKEND", default=None)
+# number of database files used by the sharded backend,
+# users are not moved between files if this is changed
+STORAGE_SHARDS = config("STORAGE_SHARDS", default=4, cast=int)
+# profiles are updated on every write through StorageUtility,
+# the ttl only limits how long changes made outside of it go unnoticed
+PROFILE_CACHE_TTL = config("PROFILE_CACHE_TTL", default=3600, cast=int)
+PROFILE_CACHE_SIZE = config("PROFILE_CACHE_SIZE", default=1000, cast=int)
+
+
+def create_backend(name: str | None = None, default: str = "sqlite") -> StorageBackend:
+    """
+    create the storage backend with the given name,
+    or the one set by STORAGE_BACKEND, falling back to default
+    """
+    name = name or STORAGE_BACKEND or default
+    match name:
+        case "sqlite":
+            return SQLiteBackend(DATABASE_PATH)
+        case "sharded":
+            # bus_arrival_bot.db is stored as bus_arrival_bot.0.db, ...
+            stem, _, suffix = DATABASE_PATH.rpartition(".")
+            paths = [f"{stem}.{i}.{suffix}" for i in range(STORAGE_SHARDS)]
+            return ShardedSQLiteBackend(paths)
+        case "memory":
+            logger.info("Storing user data in memory")
+            return MemoryBackend()
+    raise ValueError(f"Unknown storage backend {name}")
+
 
-# TODO use constant for table name
 class StorageUtility:
-    def __init__(
-        self, in_memory: bool | None = None, con: sqlite3.Connection | None = None
-    ):
-        if in_memory is not None:
-            logger.info("Initializing new database from memory")
-            self.con = sqlite3.connect("file::memory:", uri=True)
-            init(self.con)
-        elif con is None:
-            logger.info("Using database file bus_arrival_bot.db")
-            self.con = sqlite3.connect("bus_arrival_bot.db")
-        else:
-            logger.info("Using specified database file")
-            self.con = con
-        if not has_init_tables(self.con):
-            raise Exception("Database has not been initialized")
+    """
+    user settings kept by a StorageBackend, with a cache of user profiles
+    """
+
+    def __init__(self, backend: StorageBackend):
+        self.backend = backend
+        # keyed by str(chat_id)
+        self.__profile_cache = LRUCache[UserProfile](
+            ttl=PROFILE_CACHE_TTL, item_limit=PROFILE_CACHE_SIZE
+        )
+        # reads and writes run on different threads, so a read which started
+        # before a write may finish after it, and must not cache the old profile
+        # each write increments the generation, and for keys being read,
+        # the generation of their last write is kept until the reads finish
+        self.__lock = threading.Lock()
+        self.__generation = 0
+        self.__reads: Counter[str] = Counter()
+        self.__written: dict[str, int] = {}
+
+    def close(self) -> None:
+        self.backend.close()
+
+    def get_profile(self, chat_id: int) -> UserProfile:
+        """
+        get whether a user exists and the BusStopCode they have saved
+        """
+        cached = self.__profile_cache.get(str(chat_id))
+        if cached is not None:
+            return cached
+        return self.load_profile(chat_id)
+
+    def load_profile(self, chat_id: int) -> UserProfile:
+        """
+        read a profile from the backend and cache it, after the cache missed
+        does not look up the cache, so each lookup is only counted once
+        """
+        key = str(chat_id)
+        with self.__lock:
+            start = self.__generation
+            self.__reads[key] += 1
+        try:
+            profile = self.backend.get_profile(chat_id)
+        except StorageError:
+            # TODO handle error
+            logger.exception("Failed to read profile")
+            profile = None
+        with self.__lock:
+            written = self.__written.get(key, start)
+            self.__reads[key] -= 1
+            if self.__reads[key] == 0:
+                del self.__reads[key]
+                self.__written.pop(key, None)
+            # only cached if the user was not written to during the read
+            if profile is not None and written <= start:
+                self.__profile_cache.set(key, profile)
+        return NO_PROFILE if profile is None else profile
 
     def check_user_exists(self, chat_id: int) -> bool:
         """
         check if a user exists in the database
         """
-        try:
-            cur = self.con.cursor()
-            res = cur.execute(
-                """
-            SELECT EXISTS(SELECT 1 FROM saved_stops WHERE chat_id = ?);
-            """,
-                (chat_id,),
-            )
-            exists: tuple[int] = res.fetchone()
-            return exists[0] == 1
-        except sqlite3.Error as e:
-            # TODO log and handle error
-            print(f"SQLite error: {e}")
-            return False
+        return self.get_profile(chat_id).exists
 
     def get_saved_stops(self, chat_id: int) -> list[str]:
         """
         get list of BusStopCode user has saved
         """
-        try:
-            cur = self.con.cursor()
-            res = cur.execute(
-                """
-            SELECT bus_stop_codes FROM saved_stops WHERE chat_id = ?;
-            """,
-                (chat_id,),
-            )
-            saved_stops_res: tuple[str] | None = res.fetchone()
-            if saved_stops_res is None or saved_stops_res[0] == "":
-                return []
-            saved_stops = saved_stops_res[0].split(",")
-            return saved_stops
-        except sqlite3.Error as e:
-            # TODO log and handle error
-            print(f"SQLite error: {e}")
-            return []
+        return list(self.get_profile(chat_id).saved_stops)
 
-    def save_stops(self, chat_id: int, stops: list[str]) -> bool:
+    def get_saved_stop_counts(self) -> Counter[str]:
         """
-        save list of BusStopCode in DB
-        upserts record if chat_id already exists
+        get the number of users who have saved each BusStopCode
         """
-        saved_stops_str = ",".join(stops)
         try:
-            cur = self.con.cursor()
-            cur.execute(
-                """
-            INSERT INTO saved_stops (chat_id, bus_stop_codes) VALUES (?, ?)
-            ON CONFLICT(chat_id)
-            DO UPDATE SET
-            bus_stop_codes = excluded.bus_stop_codes;
-            """,
-                (chat_id, saved_stops_str),
-            )
-            self.con.commit()
-        except sqlite3.Error as e:
+            return self.backend.get_saved_stop_counts()
+        except StorageError:
             # TODO handle error
-            print(f"SQLite error: {e}")
-            return False
-        finally:
-            return True
+            logger.exception("Failed to read saved stop counts")
+            return Counter()
+
+    def get_cached_profile(self, chat_id: int) -> UserProfile | None:
+        """
+        get a profile without touching the database, if it is cached
+        """
+        return self.__profile_cache.get(str(chat_id))
+
+    def get_cache_stats(self) -> CacheStats:
+        """
+        get hit/miss statistics of the profile cache
+        """
+        return self.__profile_cache.stats()
+
+    def write_batch(self, writes: Sequence[Write]) -> list[bool]:
+        """
+        apply writes in order, committing them together where the backend can
+        returns the result of each write
+        """
+        results = self.backend.write_batch(writes)
+        with self.__lock:
+            for write, result in zip(writes, results):
+                key = str(write.chat_id)
+                self.__generation += 1
+                if key in self.__reads:
+                    self.__written[key] = self.__generation
+                profile = known_profile(write)
+                if result and profile is not None:
+                    self.__profile_cache.set(key, profile)
+                else:
+                    self.__profile_cache.delete(key)
+        return results
+
+    def save_stops(self, chat_id: int, stops: list[str]) -> bool:
+        """
+        save list of BusStopCode in DB, replacing any saved stops
+        creates the user if chat_id does not exist yet
+        """
+        return self.write_batch([SaveStops(chat_id, tuple(stops))])[0]
 
     def save_stop(self, chat_id: int, stop_id: str) -> bool:
         """
-        add a single bus stop to the list of saved stops
+        add a single bus stop to the end of the list of saved stops
+        creates the user if chat_id does not exist yet
+        returns False if the stop was already saved
         """
-        saved_stops = self.get_saved_stops(chat_id)
-        if stop_id in saved_stops:
-            # stop already exists
-            return False
-        return self.save_stops(chat_id, saved_stops + [stop_id])
+        return self.write_batch([SaveStop(chat_id, stop_id)])[0]
 
     def remove_stop(self, chat_id: int, stop_id: str) -> bool:
         """
         remove a single bus stop from the list of saved stops
         """
-        saved_stops = self.get_saved_stops(chat_id)
-        for idx, saved_stop_id in enumerate(saved_stops):
-            if stop_id == saved_stop_id:
-                return self.save_stops(
-                    chat_id, saved_stops[:idx] + saved_stops[idx + 1 :]
-                )
-        return False
+        return self.write_batch([RemoveStop(chat_id, stop_id)])[0]
 
-    def remove_user(self, chat_id: int) -> bool:
+    def move_stop(self, chat_id: int, stop_id: str, forward: bool) -> bool:
         """
-        remove user from DB
+        swap a saved stop with the stop before it (forward)
+        or after it in the list of saved stops
+        returns False if the stop is not saved or is already first or last
         """
-        try:
-            cur = self.con.cursor()
-            cur.execute(
-                """
-            DELETE FROM saved_stops WHERE chat_id = ?;
-            """,
-                (chat_id,),
-            )
-            self.con.commit()
-        except sqlite3.Error as e:
-            # TODO handle error
-            print(f"SQLite error: {e}")
-            return False
-        finally:
-            return True
-
+        return self.write_batch([MoveStop(chat_id, stop_id, forward)])[0]
 
-def has_init_tables(conn: sqlite3.Connection) -> bool:
-    """
-    Return True if the database contains any user-created tables,
-    ignoring SQLite internal tables.
-    """
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT name 
-        FROM sqlite_master 
-        WHERE type='table'
-          AND name NOT LIKE 'sqlite_%';
-    """)
-    return cursor.fetchone() is not None
+    def remove_user(self, chat_id: int) -> bool:
+        """
+        remove user from DB, saved stops are removed with the user
+        """
+        return self.write_batch([RemoveUser(chat_id)])[0]
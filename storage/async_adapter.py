@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from decouple import config
+
+from storage.adapter import StorageUtility
+from storage.backend import (
+    MoveStop,
+    RemoveStop,
+    RemoveUser,
+    SaveStop,
+    SaveStops,
+    UserProfile,
+    Write,
+)
+
+logger = logging.getLogger(__name__)
+
+# seconds the writer waits for more writes before committing,
+# writes queued while the previous commit is running are always grouped
+GROUP_COMMIT_DELAY = config("STORAGE_GROUP_COMMIT_DELAY", default=0.0, cast=float)
+MAX_BATCH_SIZE = 100
+
+
+class AsyncStorageUtility:
+    """
+    StorageUtility for async handlers, so storage I/O never runs on the event loop
+
+    writes are queued for a single writer thread, which applies the writes
+    queued since its last commit in one transaction (group commit)
+    reads use the cached profile if there is one, otherwise they run in the
+    default executor
+    """
+
+    def __init__(self, storage_utility: StorageUtility):
+        self.storage_utility = storage_utility
+        # None asks the writer to stop
+        self.__queue: queue.SimpleQueue[tuple[Write, Future[bool]] | None] = (
+            queue.SimpleQueue()
+        )
+        self.__writer = threading.Thread(
+            target=self.__write_loop, name="storage-writer", daemon=True
+        )
+        self.__writer.start()
+
+    async def get_profile(self, chat_id: int) -> UserProfile:
+        """
+        get whether a user exists and the BusStopCode they have saved
+
+        a read on an executor thread can overlap a commit on the writer thread,
+        StorageUtility only caches the result if no write for the user overlapped it
+        """
+        cached = self.storage_utility.get_cached_profile(chat_id)
+        if cached is not None:
+            return cached
+        return await asyncio.to_thread(self.storage_utility.load_profile, chat_id)
+
+    async def check_user_exists(self, chat_id: int) -> bool:
+        return (await self.get_profile(chat_id)).exists
+
+    async def get_saved_stops(self, chat_id: int) -> list[str]:
+        return list((await self.get_profile(chat_id)).saved_stops)
+
+    async def get_saved_stop_counts(self) -> Counter[str]:
+        return await asyncio.to_thread(self.storage_utility.get_saved_stop_counts)
+
+    async def save_stops(self, chat_id: int, stops: list[str]) -> bool:
+        return await self.write(SaveStops(chat_id, tuple(stops)))
+
+    async def save_stop(self, chat_id: int, stop_id: str) -> bool:
+        return await self.write(SaveStop(chat_id, stop_id))
+
+    async def remove_stop(self, chat_id: int, stop_id: str) -> bool:
+        return await self.write(RemoveStop(chat_id, stop_id))
+
+    async def move_stop(self, chat_id: int, stop_id: str, forward: bool) -> bool:
+        return await self.write(MoveStop(chat_id, stop_id, forward))
+
+    async def remove_user(self, chat_id: int) -> bool:
+        return await self.write(RemoveUser(chat_id))
+
+    async def write(self, write: Write) -> bool:
+        """
+        queue a write, and wait until it has been committed
+        """
+        future: Future[bool] = Future()
+        self.__queue.put((write, future))
+        return await asyncio.wrap_future(future)
+
+    def close(self) -> None:
+        """
+        commit the writes already queued, then stop the writer
+        """
+        self.__queue.put(None)
+        self.__writer.join()
+        self.storage_utility.close()
+
+    def __next_batch(self) -> tuple[list[tuple[Write, Future[bool]]], bool]:
+        """
+        wait for a write, then take up to MAX_BATCH_SIZE writes that are queued
+        or arrive within GROUP_COMMIT_DELAY
+        also returns whether the writer should stop after this batch
+        """
+        item = self.__queue.get()
+        if item is None:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + GROUP_COMMIT_DELAY
+        while len(batch) < MAX_BATCH_SIZE:
+            try:
+                item = self.__queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def __write_loop(self) -> None:
+        stop = False
+        while not stop:
+            batch, stop = self.__next_batch()
+            # writes whose caller was cancelled before they started are skipped
+            batch = [
+                (write, future)
+                for write, future in batch
+                if future.set_running_or_notify_cancel()
+            ]
+            if len(batch) == 0:
+                continue
+            try:
+                results = self.storage_utility.write_batch([w for w, _ in batch])
+            except Exception as e:
+                logger.exception("Failed to write batch of %d", len(batch))
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            logger.debug("Committed %d writes", len(batch))
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
@@ -0,0 +1,109 @@
+"""
+interface shared by the storage backends
+"""
+
+from collections import Counter
+from collections.abc import Sequence
+from typing import NamedTuple, Protocol
+
+
+class StorageError(Exception):
+    """
+    a backend could not read or write user data
+    """
+
+
+class UserProfile(NamedTuple):
+    exists: bool
+    saved_stops: tuple[str, ...]  # BusStopCode in the order the user chose
+
+
+NO_PROFILE = UserProfile(exists=False, saved_stops=())
+
+
+# changes to one user's data, applied with StorageBackend.write_batch
+class SaveStops(NamedTuple):
+    """
+    replace the saved stops, creating the user if they do not exist yet
+    """
+
+    chat_id: int
+    stops: tuple[str, ...]
+
+
+class SaveStop(NamedTuple):
+    """
+    add a stop to the end of the saved stops, creating the user if needed
+    changes nothing if the stop is already saved
+    """
+
+    chat_id: int
+    stop_id: str
+
+
+class RemoveStop(NamedTuple):
+    chat_id: int
+    stop_id: str
+
+
+class MoveStop(NamedTuple):
+    """
+    swap a stop with the one before it (forward) or after it
+    changes nothing if the stop is not saved or is already first or last
+    """
+
+    chat_id: int
+    stop_id: str
+    forward: bool
+
+
+class RemoveUser(NamedTuple):
+    """
+    remove the user together with their saved stops
+    """
+
+    chat_id: int
+
+
+type Write = SaveStops | SaveStop | RemoveStop | MoveStop | RemoveUser
+
+
+def known_profile(write: Write) -> UserProfile | None:
+    """
+    profile after a successful write, if it is known without reading it back
+    """
+    match write:
+        case SaveStops(stops=stops):
+            # duplicates are ignored, keeping the first copy
+            return UserProfile(exists=True, saved_stops=tuple(dict.fromkeys(stops)))
+        case RemoveUser():
+            return NO_PROFILE
+    return None
+
+
+class StorageBackend(Protocol):
+    def get_profile(self, chat_id: int) -> UserProfile:
+        """
+        get whether a user exists and the BusStopCode they have saved
+        raises StorageError if it cannot be read
+        """
+        ...
+
+    def get_saved_stop_counts(self) -> Counter[str]:
+        """
+        get the number of users who have saved each BusStopCode
+        raises StorageError if it cannot be read
+        """
+        ...
+
+    def write_batch(self, writes: Sequence[Write]) -> list[bool]:
+        """
+        apply writes in order, sharing a commit where the backend supports it
+        a write that fails does not affect the others
+
+        returns whether each write changed anything,
+        or False for each write that failed
+        """
+        ...
+
+    def close(self) -> None: ...
@@ -1,22 +1,87 @@
 import sqlite3
 
 TABLE_NAME = "saved_stops"
+USERS_TABLE_NAME = "users"
+
+# stored in PRAGMA user_version
+# 0: saved_stops with a comma separated bus_stop_codes column, created by init
+#    before versions were recorded
+# 1: users and saved_stops with a row for each saved stop
+SCHEMA_VERSION = 1
+
+CREATE_TABLES = f"""
+CREATE TABLE {USERS_TABLE_NAME} (
+    chat_id INTEGER PRIMARY KEY
+);
+
+CREATE TABLE {TABLE_NAME} (
+    chat_id INTEGER NOT NULL
+        REFERENCES {USERS_TABLE_NAME} (chat_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    bus_stop_code TEXT NOT NULL,
+    PRIMARY KEY (chat_id, bus_stop_code)
+) WITHOUT ROWID;
+
+CREATE INDEX idx_saved_stops_position ON {TABLE_NAME} (chat_id, position);
+"""
 
 
 def init(con: sqlite3.Connection):
     try:
-        cur = con.cursor()
-        cur.execute(f"""
-        CREATE TABLE {TABLE_NAME} (
-            chat_id INTEGER PRIMARY KEY,
-            bus_stop_codes TEXT NOT NULL
-        );
+        con.executescript(f"""
+        BEGIN;
+        {CREATE_TABLES}
+        PRAGMA user_version = {SCHEMA_VERSION};
+        COMMIT;
         """)
-        con.commit()
     except sqlite3.Error as e:
+        con.rollback()
         raise Exception("Encountered error while initializing DB", e)
 
 
+def get_schema_version(con: sqlite3.Connection) -> int:
+    (version,) = con.execute("PRAGMA user_version;").fetchone()
+    return version
+
+
+def migrate(con: sqlite3.Connection):
+    """
+    upgrade a database created with an earlier schema to SCHEMA_VERSION
+    """
+    version = get_schema_version(con)
+    if version >= SCHEMA_VERSION:
+        return
+    try:
+        # DDL does not start a transaction implicitly, so BEGIN is explicit
+        con.executescript(f"""
+        BEGIN;
+        ALTER TABLE {TABLE_NAME} RENAME TO {TABLE_NAME}_v0;
+        {CREATE_TABLES}
+        INSERT INTO {USERS_TABLE_NAME} (chat_id) SELECT chat_id FROM {TABLE_NAME}_v0;
+        """)
+        rows = con.execute(f"SELECT chat_id, bus_stop_codes FROM {TABLE_NAME}_v0;")
+        con.executemany(
+            # the same stop was never saved twice, but skip duplicates just in case
+            f"""
+            INSERT OR IGNORE INTO {TABLE_NAME} (chat_id, position, bus_stop_code)
+            VALUES (?, ?, ?);
+            """,
+            [
+                (chat_id, position, bus_stop_code)
+                for chat_id, bus_stop_codes in rows.fetchall()
+                if bus_stop_codes != ""
+                for position, bus_stop_code in enumerate(bus_stop_codes.split(","))
+            ],
+        )
+        # executescript would commit here, before the old table is dropped
+        con.execute(f"DROP TABLE {TABLE_NAME}_v0;")
+        con.execute(f"PRAGMA user_version = {SCHEMA_VERSION};")
+        con.commit()
+    except sqlite3.Error as e:
+        con.rollback()
+        raise Exception("Encountered error while migrating DB", e)
+
+
 def main():
     con = sqlite3.connect("bus_arrival_bot.db")
     init(con)
@@ -27,10 +92,17 @@ def populate_dummy():
     con = sqlite3.connect("bus_arrival_bot.db")
     try:
         cur = con.cursor()
-        save_stops = [(127038678, "45029,43099,42071")]
+        cur.execute(
+            f"INSERT INTO {USERS_TABLE_NAME} (chat_id) VALUES (?)", (127038678,)
+        )
+        save_stops = [
+            (127038678, 0, "45029"),
+            (127038678, 1, "43099"),
+            (127038678, 2, "42071"),
+        ]
         cur.executemany(
-            """
-        INSERT INTO saved_stops (chat_id, bus_stop_codes) VALUES(?, ?)
+            f"""
+        INSERT INTO {TABLE_NAME} (chat_id, position, bus_stop_code) VALUES(?, ?, ?)
         """,
             save_stops,
         )
@@ -0,0 +1,88 @@
+import threading
+from collections import Counter
+from collections.abc import Sequence
+
+from storage.backend import (
+    NO_PROFILE,
+    MoveStop,
+    RemoveStop,
+    RemoveUser,
+    SaveStop,
+    SaveStops,
+    UserProfile,
+    Write,
+)
+
+
+def apply_write(users: dict[int, tuple[str, ...]], write: Write) -> bool:
+    """
+    apply a write to the saved stops of each user
+    returns whether anything changed
+    """
+    match write:
+        case SaveStops(chat_id, stops):
+            # duplicates are ignored, keeping the first copy
+            users[chat_id] = tuple(dict.fromkeys(stops))
+            return True
+        case SaveStop(chat_id, stop_id):
+            # the user is created even if the stop is already saved
+            saved = users.setdefault(chat_id, ())
+            if stop_id in saved:
+                return False
+            users[chat_id] = saved + (stop_id,)
+            return True
+        case RemoveStop(chat_id, stop_id):
+            saved = users.get(chat_id, ())
+            if stop_id not in saved:
+                return False
+            users[chat_id] = tuple(stop for stop in saved if stop != stop_id)
+            return True
+        case MoveStop(chat_id, stop_id, forward):
+            saved = list(users.get(chat_id, ()))
+            if stop_id not in saved:
+                return False
+            i = saved.index(stop_id)
+            j = i - 1 if forward else i + 1
+            if j < 0 or j >= len(saved):
+                return False
+            saved[i], saved[j] = saved[j], saved[i]
+            users[chat_id] = tuple(saved)
+            return True
+        case RemoveUser(chat_id):
+            users.pop(chat_id, None)
+            return True
+
+
+class MemoryBackend:
+    """
+    keeps user settings in a dict, lost when the process exits
+
+    for development, tests and benchmarks, with the same behaviour as SQLiteBackend
+    """
+
+    def __init__(self):
+        # saved stops are tuples, so a profile can share them without copying
+        self.__users: dict[int, tuple[str, ...]] = {}
+        self.__lock = threading.Lock()
+
+    def get_profile(self, chat_id: int) -> UserProfile:
+        with self.__lock:
+            saved = self.__users.get(chat_id)
+        if saved is None:
+            return NO_PROFILE
+        return UserProfile(exists=True, saved_stops=saved)
+
+    def get_saved_stop_counts(self) -> Counter[str]:
+        with self.__lock:
+            saved = list(self.__users.values())
+        counts: Counter[str] = Counter()
+        for stops in saved:
+            counts.update(stops)
+        return counts
+
+    def write_batch(self, writes: Sequence[Write]) -> list[bool]:
+        with self.__lock:
+            return [apply_write(self.__users, write) for write in writes]
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,73 @@
+import logging
+from collections import Counter
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+
+from storage.backend import UserProfile, Write
+from storage.sqlite_backend import SQLiteBackend
+
+logger = logging.getLogger(__name__)
+
+
+class ShardedSQLiteBackend:
+    """
+    spreads users over several SQLite databases by chat_id
+
+    each database has its own write lock and its own writer thread,
+    so the writes of a batch for different shards are committed in parallel
+    the number of shards must not change once users are stored,
+    since a user is only looked up in the shard chosen by their chat_id
+    """
+
+    def __init__(self, paths: Sequence[str]):
+        if len(paths) == 0:
+            raise ValueError("At least one shard is needed")
+        logger.info("Using %d shards", len(paths))
+        self.shards = [SQLiteBackend(path) for path in paths]
+        # a single thread for each shard, so each shard keeps one write connection
+        self.__writers = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"storage-shard-{i}")
+            for i in range(len(paths))
+        ]
+
+    def shard_index(self, chat_id: int) -> int:
+        return chat_id % len(self.shards)
+
+    def get_profile(self, chat_id: int) -> UserProfile:
+        return self.shards[self.shard_index(chat_id)].get_profile(chat_id)
+
+    def get_saved_stop_counts(self) -> Counter[str]:
+        counts: Counter[str] = Counter()
+        for shard in self.shards:
+            counts.update(shard.get_saved_stop_counts())
+        return counts
+
+    def write_batch(self, writes: Sequence[Write]) -> list[bool]:
+        """
+        apply the writes for each shard in one transaction on that shard,
+        with the shards written in parallel
+        writes for the same user keep their order, since they use the same shard
+        a batch is not atomic across shards, each shard commits separately
+        """
+        # positions of the writes for each shard
+        by_shard: dict[int, list[int]] = {}
+        for i, write in enumerate(writes):
+            by_shard.setdefault(self.shard_index(write.chat_id), []).append(i)
+
+        futures = {
+            index: self.__writers[index].submit(
+                self.shards[index].write_batch, [writes[i] for i in positions]
+            )
+            for index, positions in by_shard.items()
+        }
+        results = [False] * len(writes)
+        for index, positions in by_shard.items():
+            for i, result in zip(positions, futures[index].result()):
+                results[i] = result
+        return results
+
+    def close(self) -> None:
+        for writer in self.__writers:
+            writer.shutdown()
+        for shard in self.shards:
+            shard.close()
@@ -0,0 +1,283 @@
+import logging
+import sqlite3
+import threading
+import uuid
+from collections import Counter
+from collections.abc import Sequence
+
+from decouple import config
+
+from storage.backend import (
+    MoveStop,
+    RemoveStop,
+    RemoveUser,
+    SaveStop,
+    SaveStops,
+    StorageError,
+    UserProfile,
+    Write,
+)
+from storage.initialize import init, migrate
+
+logger = logging.getLogger(__name__)
+
+DATABASE_PATH = "bus_arrival_bot.db"
+# path for a new in memory database, as with sqlite3.connect
+# only for use from one thread at a time, e.g. in tests, see SQLiteBackend
+MEMORY = ":memory:"
+# seconds to wait for another connection to finish writing
+BUSY_TIMEOUT = config("SQLITE_BUSY_TIMEOUT", default=5.0, cast=float)
+# prepared statements kept by each connection, keyed by the SQL text
+CACHED_STATEMENTS = 256
+
+
+def configure(con: sqlite3.Connection) -> None:
+    """
+    settings for each new connection
+
+    in WAL mode readers do not block the writer and the writer does not block
+    readers, and synchronous = NORMAL only syncs to disk at checkpoints,
+    so a crash can lose the latest commits but cannot corrupt the database
+    """
+    # persistent for a database file, and ignored by in memory databases
+    con.execute("PRAGMA journal_mode = WAL;")
+    con.execute("PRAGMA synchronous = NORMAL;")
+    # needed for saved stops to be removed with the user
+    con.execute("PRAGMA foreign_keys = ON;")
+
+
+def add_user(con: sqlite3.Connection, chat_id: int) -> None:
+    con.execute(
+        """
+    INSERT OR IGNORE INTO users (chat_id) VALUES (?);
+    """,
+        (chat_id,),
+    )
+
+
+def apply_write(con: sqlite3.Connection, write: Write) -> bool:
+    """
+    run the statements for a write without committing
+    returns whether anything changed
+    """
+    match write:
+        case SaveStops(chat_id, stops):
+            add_user(con, chat_id)
+            con.execute(
+                """
+            DELETE FROM saved_stops WHERE chat_id = ?;
+            """,
+                (chat_id,),
+            )
+            con.executemany(
+                """
+            INSERT OR IGNORE INTO saved_stops (chat_id, position, bus_stop_code)
+            VALUES (?, ?, ?);
+            """,
+                [(chat_id, position, stop) for position, stop in enumerate(stops)],
+            )
+            return True
+        case SaveStop(chat_id, stop_id):
+            add_user(con, chat_id)
+            cur = con.execute(
+                # WHERE is needed before ON CONFLICT to parse INSERT ... SELECT
+                """
+            INSERT INTO saved_stops (chat_id, position, bus_stop_code)
+            SELECT :chat_id, COALESCE(MAX(position) + 1, 0), :stop_id
+            FROM saved_stops WHERE chat_id = :chat_id
+            ON CONFLICT DO NOTHING;
+            """,
+                {"chat_id": chat_id, "stop_id": stop_id},
+            )
+            return cur.rowcount == 1
+        case RemoveStop(chat_id, stop_id):
+            # positions are only used for ordering, so gaps are left as they are
+            cur = con.execute(
+                """
+            DELETE FROM saved_stops WHERE chat_id = ? AND bus_stop_code = ?;
+            """,
+                (chat_id, stop_id),
+            )
+            return cur.rowcount == 1
+        case MoveStop(chat_id, stop_id, forward):
+            cur = con.execute(
+                f"""
+            WITH target AS (
+                SELECT position FROM saved_stops
+                WHERE chat_id = :chat_id AND bus_stop_code = :stop_id
+            ), neighbour AS (
+                SELECT bus_stop_code, position FROM saved_stops
+                WHERE chat_id = :chat_id
+                AND position {"<" if forward else ">"} (SELECT position FROM target)
+                ORDER BY position {"DESC" if forward else "ASC"}
+                LIMIT 1
+            )
+            UPDATE saved_stops
+            SET position = CASE bus_stop_code
+                WHEN :stop_id THEN (SELECT position FROM neighbour)
+                ELSE (SELECT position FROM target)
+            END
+            WHERE chat_id = :chat_id
+            AND bus_stop_code IN (:stop_id, (SELECT bus_stop_code FROM neighbour))
+            AND EXISTS (SELECT 1 FROM neighbour)
+            RETURNING bus_stop_code;
+            """,
+                {"chat_id": chat_id, "stop_id": stop_id},
+            )
+            # rowcount is not set for statements starting with WITH
+            return len(cur.fetchall()) == 2
+        case RemoveUser(chat_id):
+            con.execute(
+                """
+            DELETE FROM users WHERE chat_id = ?;
+            """,
+                (chat_id,),
+            )
+            return True
+
+
+# TODO use constant for table name
+class SQLiteBackend:
+    """
+    stores user settings in a SQLite database file, or in memory for MEMORY
+
+    each thread uses its own connection, opened on first use,
+    since sqlite3 connections cannot be shared between threads
+
+    an in memory database uses a shared cache instead of WAL, which locks whole
+    tables, and a reader fails at once with SQLITE_LOCKED while another thread
+    is writing, as busy_timeout does not apply
+    use MemoryBackend to keep user settings in memory for the bot
+    """
+
+    def __init__(self, path: str = DATABASE_PATH):
+        self.__local = threading.local()
+        self.__connections: list[sqlite3.Connection] = []
+        self.__connections_lock = threading.Lock()
+
+        if path == MEMORY:
+            # a named in memory database with a shared cache can be opened
+            # by every thread, the name keeps it separate from other instances
+            # connections do not wait for each other, see the class docstring
+            self.__database = (
+                f"file:bus_arrival_bot_{uuid.uuid4().hex}?mode=memory&cache=shared"
+            )
+            self.__uri = True
+        else:
+            self.__database = path
+            self.__uri = False
+        logger.info("Using database %s", self.__database)
+        if not has_init_tables(self.con):
+            logger.info("Initializing new database")
+            init(self.con)
+        migrate(self.con)
+
+    @property
+    def con(self) -> sqlite3.Connection:
+        """
+        connection for the current thread
+        """
+        con: sqlite3.Connection | None = getattr(self.__local, "con", None)
+        if con is None:
+            con = sqlite3.connect(
+                self.__database,
+                uri=self.__uri,
+                timeout=BUSY_TIMEOUT,
+                cached_statements=CACHED_STATEMENTS,
+                # only used by one thread, but closed from any thread by close
+                check_same_thread=False,
+            )
+            configure(con)
+            self.__local.con = con
+            # also keeps an in memory database open while any thread is using it
+            with self.__connections_lock:
+                self.__connections.append(con)
+        return con
+
+    def close(self) -> None:
+        """
+        close the connections opened by every thread
+        """
+        with self.__connections_lock:
+            for con in self.__connections:
+                con.close()
+            self.__connections.clear()
+        self.__local = threading.local()
+
+    def get_profile(self, chat_id: int) -> UserProfile:
+        try:
+            cur = self.con.cursor()
+            res = cur.execute(
+                """
+            SELECT saved_stops.bus_stop_code FROM users
+            LEFT JOIN saved_stops ON saved_stops.chat_id = users.chat_id
+            WHERE users.chat_id = ?
+            ORDER BY saved_stops.position;
+            """,
+                (chat_id,),
+            )
+            rows: list[tuple[str | None]] = res.fetchall()
+        except sqlite3.Error as e:
+            raise StorageError(e) from e
+        # no rows if the user does not exist, a row of NULL if they saved no stops
+        return UserProfile(
+            exists=len(rows) > 0,
+            saved_stops=tuple(code for (code,) in rows if code is not None),
+        )
+
+    def get_saved_stop_counts(self) -> Counter[str]:
+        try:
+            cur = self.con.cursor()
+            res = cur.execute(
+                """
+            SELECT bus_stop_code, COUNT(*) FROM saved_stops GROUP BY bus_stop_code;
+            """
+            )
+            return Counter(dict(res.fetchall()))
+        except sqlite3.Error as e:
+            raise StorageError(e) from e
+
+    def write_batch(self, writes: Sequence[Write]) -> list[bool]:
+        """
+        apply writes in order in a single transaction, so they share one commit
+
+        each write runs in its own savepoint, so a write that fails is rolled back
+        without affecting the others
+        """
+        con = self.con
+        results: list[bool] = []
+        try:
+            # an explicit BEGIN, since savepoints outside of a transaction
+            # would commit on release
+            con.execute("BEGIN IMMEDIATE;")
+            for write in writes:
+                con.execute("SAVEPOINT write;")
+                try:
+                    results.append(apply_write(con, write))
+                except sqlite3.Error:
+                    logger.exception("Failed to apply %s", type(write).__name__)
+                    con.execute("ROLLBACK TO write;")
+                    results.append(False)
+                con.execute("RELEASE write;")
+            con.commit()
+        except sqlite3.Error:
+            logger.exception("Failed to write batch of %d", len(writes))
+            if con.in_transaction:
+                con.rollback()
+            results = [False] * len(writes)
+        return results
+
+
+def has_init_tables(conn: sqlite3.Connection) -> bool:
+    """
+    Return True if the database contains any user-created tables,
+    ignoring SQLite internal tables.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT name
+        FROM sqlite_master
+        WHERE type='table'
+          AND name NOT LIKE 'sqlite_%';
+    """)
+    return cursor.fetchone() is not None
@@ -0,0 +1,160 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from . import sqlite_backend
+from .adapter import StorageUtility
+from .async_adapter import AsyncStorageUtility
+from .backend import RemoveUser, SaveStop
+from .sqlite_backend import SQLiteBackend
+
+
+class TestAsyncStorage(unittest.TestCase):
+    def setUp(self):
+        # a database file, since reads and writes run on different threads
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "bus_arrival_bot.db")
+        self.storage_utility = StorageUtility(SQLiteBackend(self.path))
+        self.async_storage_utility = AsyncStorageUtility(self.storage_utility)
+        self.addCleanup(self.async_storage_utility.close)
+
+    def test_write_and_read(self):
+        async def run():
+            await self.async_storage_utility.save_stops(123456, ["222", "333"])
+            await self.async_storage_utility.move_stop(123456, "333", forward=True)
+            self.assertTrue(await self.async_storage_utility.save_stop(123456, "444"))
+            self.assertTrue(await self.async_storage_utility.remove_stop(123456, "222"))
+            return await self.async_storage_utility.get_saved_stops(123456)
+
+        self.assertEqual(asyncio.run(run()), ["333", "444"])
+        self.assertEqual(self.storage_utility.get_saved_stops(123456), ["333", "444"])
+
+    def test_group_commit(self):
+        """
+        writes queued while a batch is committing are committed together
+        """
+        batch_sizes: list[int] = []
+        committing = threading.Event()
+        release = threading.Event()
+        write_batch = self.storage_utility.write_batch
+
+        def blocking_write_batch(writes):
+            batch_sizes.append(len(writes))
+            committing.set()
+            release.wait()
+            return write_batch(writes)
+
+        async def run():
+            first = asyncio.create_task(
+                self.async_storage_utility.save_stop(123456, "10000")
+            )
+            await asyncio.to_thread(committing.wait)
+            rest = [
+                asyncio.create_task(
+                    self.async_storage_utility.save_stop(123456, f"1000{i}")
+                )
+                for i in range(1, 10)
+            ]
+            await asyncio.sleep(0.01)
+            release.set()
+            return await asyncio.gather(first, *rest)
+
+        with patch.object(self.storage_utility, "write_batch", blocking_write_batch):
+            results = asyncio.run(run())
+        self.assertEqual(results, [True] * 10)
+        self.assertEqual(batch_sizes, [1, 9])
+        self.assertEqual(len(self.storage_utility.get_saved_stops(123456)), 10)
+
+    def test_cache_stats(self):
+        """
+        each lookup is counted once, as a hit or a miss
+        """
+
+        async def run():
+            await self.async_storage_utility.get_profile(123456)
+            await self.async_storage_utility.get_profile(123456)
+
+        asyncio.run(run())
+        stats = self.storage_utility.get_cache_stats()
+        self.assertEqual((stats.hits, stats.misses), (1, 1))
+
+    def test_read_during_write(self):
+        """
+        a read on an executor thread which overlaps a write is not cached
+        """
+        self.storage_utility.save_stop(123456, "11111")
+        backend = self.storage_utility.backend
+        get_profile = backend.get_profile
+        read = threading.Event()
+        written = threading.Event()
+
+        def slow_get_profile(chat_id: int):
+            profile = get_profile(chat_id)
+            read.set()
+            written.wait()
+            return profile
+
+        async def run():
+            profile = asyncio.create_task(
+                self.async_storage_utility.get_profile(123456)
+            )
+            await asyncio.to_thread(read.wait)
+            await self.async_storage_utility.save_stop(123456, "22222")
+            written.set()
+            await profile
+            return await self.async_storage_utility.get_saved_stops(123456)
+
+        with patch.object(backend, "get_profile", slow_get_profile):
+            self.assertEqual(asyncio.run(run()), ["11111", "22222"])
+
+    def test_failed_write_isolated(self):
+        """
+        a failed write is rolled back without affecting the rest of the batch
+        """
+
+        apply_write = sqlite_backend.apply_write
+
+        def fail(con: sqlite3.Connection, write) -> bool:
+            if isinstance(write, RemoveUser):
+                con.execute("INSERT INTO users (chat_id) VALUES (999111);")
+                con.execute("SELECT * FROM missing_table;")
+            return apply_write(con, write)
+
+        with patch.object(sqlite_backend, "apply_write", fail):
+            results = self.storage_utility.write_batch(
+                [
+                    SaveStop(123456, "42012"),
+                    RemoveUser(999111),
+                    SaveStop(123456, "42012"),
+                ]
+            )
+        self.assertEqual(results, [True, False, False])
+        self.assertEqual(self.storage_utility.get_saved_stops(123456), ["42012"])
+        self.assertFalse(self.storage_utility.check_user_exists(999111))
+
+    def test_close_commits_queued_writes(self):
+        async def run():
+            writes = [
+                asyncio.create_task(
+                    self.async_storage_utility.save_stop(123456, f"1000{i}")
+                )
+                for i in range(5)
+            ]
+            # let every write be queued
+            await asyncio.sleep(0)
+            await asyncio.to_thread(self.async_storage_utility.close)
+            return await asyncio.gather(*writes)
+
+        self.assertEqual(asyncio.run(run()), [True] * 5)
+        backend = SQLiteBackend(self.path)
+        self.addCleanup(backend.close)
+        self.assertEqual(len(backend.get_profile(123456).saved_stops), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
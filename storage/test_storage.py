@@ -2,13 +2,29 @@
 https://www.sqlite.org/inmemorydb.html
 """
 
+import os
+import sqlite3
+import tempfile
+import threading
 import unittest
-from .adapter import StorageUtility
+from unittest.mock import patch
+
+from . import adapter
+from .adapter import StorageUtility, create_backend
+from .backend import RemoveStop, SaveStop, StorageBackend
+from .initialize import SCHEMA_VERSION, get_schema_version
+from .memory_backend import MemoryBackend
+from .sharded_backend import ShardedSQLiteBackend
+from .sqlite_backend import MEMORY, SQLiteBackend
 
 
 class TestStorage(unittest.TestCase):
+    def create_backend(self) -> StorageBackend:
+        return SQLiteBackend(MEMORY)
+
     def setUp(self):
-        self.storage_utility = StorageUtility(in_memory=True)
+        self.storage_utility = StorageUtility(self.create_backend())
+        self.addCleanup(self.storage_utility.close)
 
     def test_save_0_stops(self):
         """
@@ -59,6 +75,303 @@ class TestStorage(unittest.TestCase):
         stops = self.storage_utility.get_saved_stops(123456)
         self.assertEqual(stops, ["42012"])
 
+    def test_saved_stop_counts(self):
+        """
+        count users who saved each stop
+        """
+        self.storage_utility.save_stops(123456, ["42012", "43099"])
+        self.storage_utility.save_stops(999111, ["42012"])
+        self.storage_utility.save_stops(555555, [])
+        counts = self.storage_utility.get_saved_stop_counts()
+        self.assertEqual(counts, {"42012": 2, "43099": 1})
+
+    def test_save_duplicate_stop(self):
+        """
+        saving a stop twice keeps one copy
+        """
+        self.assertTrue(self.storage_utility.save_stop(123456, "42012"))
+        self.assertTrue(self.storage_utility.save_stop(123456, "43099"))
+        self.assertFalse(self.storage_utility.save_stop(123456, "42012"))
+        stops = self.storage_utility.get_saved_stops(123456)
+        self.assertEqual(stops, ["42012", "43099"])
+
+    def test_remove_stop(self):
+        """
+        remove a stop and add another to the end
+        """
+        self.storage_utility.save_stops(123456, ["222", "333", "444"])
+        self.assertTrue(self.storage_utility.remove_stop(123456, "333"))
+        self.assertFalse(self.storage_utility.remove_stop(123456, "333"))
+        self.storage_utility.save_stop(123456, "555")
+        stops = self.storage_utility.get_saved_stops(123456)
+        self.assertEqual(stops, ["222", "444", "555"])
+
+    def test_move_stop(self):
+        """
+        swap stops with their neighbours
+        """
+        self.storage_utility.save_stops(123456, ["222", "333", "444"])
+        self.storage_utility.remove_stop(123456, "333")
+        self.storage_utility.save_stop(123456, "555")
+        self.assertTrue(self.storage_utility.move_stop(123456, "444", forward=True))
+        self.assertTrue(self.storage_utility.move_stop(123456, "222", forward=False))
+        stops = self.storage_utility.get_saved_stops(123456)
+        self.assertEqual(stops, ["444", "555", "222"])
+
+    def test_move_stop_at_end(self):
+        """
+        the first stop cannot move forward and the last stop cannot move back
+        """
+        self.storage_utility.save_stops(123456, ["222", "333"])
+        self.assertFalse(self.storage_utility.move_stop(123456, "222", forward=True))
+        self.assertFalse(self.storage_utility.move_stop(123456, "333", forward=False))
+        self.assertFalse(self.storage_utility.move_stop(123456, "999", forward=True))
+        stops = self.storage_utility.get_saved_stops(123456)
+        self.assertEqual(stops, ["222", "333"])
+
+    def test_profile(self):
+        """
+        existence and saved stops in one lookup
+        """
+        self.assertEqual(self.storage_utility.get_profile(123456), (False, ()))
+        self.storage_utility.save_stops(123456, [])
+        self.assertEqual(self.storage_utility.get_profile(123456), (True, ()))
+        self.storage_utility.save_stop(123456, "42012")
+        self.assertEqual(self.storage_utility.get_profile(123456), (True, ("42012",)))
+
+    def test_profile_cached(self):
+        """
+        profiles are read from the database once, and updated on writes
+        """
+        self.storage_utility.save_stops(123456, ["42012", "42012", "43099"])
+        backend = self.storage_utility.backend
+        with patch.object(backend, "get_profile") as get_profile:
+            profile = self.storage_utility.get_profile(123456)
+            self.assertEqual(profile, (True, ("42012", "43099")))
+            get_profile.assert_not_called()
+        self.storage_utility.remove_user(123456)
+        with patch.object(backend, "get_profile") as get_profile:
+            self.assertFalse(self.storage_utility.check_user_exists(123456))
+            get_profile.assert_not_called()
+
+    def test_read_during_write(self):
+        """
+        a profile read before a write is not cached once the write has finished
+        """
+        self.storage_utility.save_stop(123456, "11111")
+        backend = self.storage_utility.backend
+        get_profile = backend.get_profile
+        read = threading.Event()
+        written = threading.Event()
+
+        def slow_get_profile(chat_id: int):
+            profile = get_profile(chat_id)
+            read.set()
+            written.wait()
+            return profile
+
+        with patch.object(backend, "get_profile", slow_get_profile):
+            thread = threading.Thread(
+                target=self.storage_utility.get_profile, args=(123456,)
+            )
+            thread.start()
+            read.wait()
+            self.storage_utility.save_stop(123456, "22222")
+            written.set()
+            thread.join()
+        stops = self.storage_utility.get_saved_stops(123456)
+        self.assertEqual(stops, ["11111", "22222"])
+
+    def test_profile_invalidated(self):
+        """
+        changes to single stops are read back from the database
+        """
+        self.storage_utility.save_stops(123456, ["222", "333"])
+        self.storage_utility.move_stop(123456, "333", forward=True)
+        self.assertEqual(self.storage_utility.get_saved_stops(123456), ["333", "222"])
+        self.storage_utility.remove_stop(123456, "333")
+        self.assertEqual(self.storage_utility.get_saved_stops(123456), ["222"])
+
+    def test_remove_user(self):
+        """
+        saved stops are removed with the user
+        """
+        self.storage_utility.save_stops(123456, ["42012"])
+        self.storage_utility.remove_user(123456)
+        self.assertFalse(self.storage_utility.check_user_exists(123456))
+        self.assertEqual(self.storage_utility.get_saved_stop_counts(), {})
+
+
+class TestMemoryStorage(TestStorage):
+    def create_backend(self) -> StorageBackend:
+        return MemoryBackend()
+
+
+class TestShardedStorage(TestStorage):
+    def create_backend(self) -> StorageBackend:
+        return ShardedSQLiteBackend([MEMORY] * 3)
+
+    def test_users_spread_over_shards(self):
+        """
+        each user is stored in one shard, and counts are summed over shards
+        """
+        for chat_id in range(123456, 123462):
+            self.storage_utility.save_stops(chat_id, ["42012"])
+        backend = self.storage_utility.backend
+        assert isinstance(backend, ShardedSQLiteBackend)
+        for index, shard in enumerate(backend.shards):
+            self.assertEqual(shard.get_saved_stop_counts(), {"42012": 2})
+            for chat_id in range(123456, 123462):
+                exists = shard.get_profile(chat_id).exists
+                self.assertEqual(exists, backend.shard_index(chat_id) == index)
+        self.assertEqual(self.storage_utility.get_saved_stop_counts(), {"42012": 6})
+
+    def test_batch_over_shards(self):
+        """
+        results of a batch are in the order of the writes
+        """
+        results = self.storage_utility.write_batch(
+            [
+                SaveStop(123456, "42012"),
+                SaveStop(123457, "42012"),
+                SaveStop(123456, "42012"),
+                RemoveStop(123458, "42012"),
+                SaveStop(123457, "43099"),
+            ]
+        )
+        self.assertEqual(results, [True, True, False, False, True])
+        self.assertEqual(
+            self.storage_utility.get_saved_stops(123457), ["42012", "43099"]
+        )
+
+    def test_shards_written_in_parallel(self):
+        """
+        each shard commits its part of a batch at the same time as the others
+        """
+        backend = self.storage_utility.backend
+        assert isinstance(backend, ShardedSQLiteBackend)
+        # only passed once every shard is writing
+        barrier = threading.Barrier(len(backend.shards), timeout=5)
+        for shard in backend.shards:
+            write_batch = shard.write_batch
+
+            def waiting_write_batch(writes, write_batch=write_batch):
+                barrier.wait()
+                return write_batch(writes)
+
+            self.enterContext(patch.object(shard, "write_batch", waiting_write_batch))
+        results = self.storage_utility.write_batch(
+            [SaveStop(chat_id, "42012") for chat_id in range(123456, 123459)]
+        )
+        self.assertEqual(results, [True] * 3)
+
+
+class TestCreateBackend(unittest.TestCase):
+    def test_memory(self):
+        self.assertIsInstance(create_backend("memory"), MemoryBackend)
+
+    def test_default(self):
+        with patch.object(adapter, "STORAGE_BACKEND", None):
+            self.assertIsInstance(create_backend(default="memory"), MemoryBackend)
+        with patch.object(adapter, "STORAGE_BACKEND", "memory"):
+            self.assertIsInstance(create_backend(default="sqlite"), MemoryBackend)
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            create_backend("postgres")
+
+
+class TestMigration(unittest.TestCase):
+    def test_comma_separated_stops(self):
+        """
+        migrate saved stops from the comma separated format
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "bus_arrival_bot.db")
+        con = sqlite3.connect(path)
+        self.addCleanup(con.close)
+        con.executescript("""
+        CREATE TABLE saved_stops (
+            chat_id INTEGER PRIMARY KEY,
+            bus_stop_codes TEXT NOT NULL
+        );
+        INSERT INTO saved_stops VALUES (123456, '45029,43099,42071'), (999111, '');
+        """)
+        storage_utility = StorageUtility(SQLiteBackend(path))
+        self.addCleanup(storage_utility.close)
+        self.assertEqual(get_schema_version(con), SCHEMA_VERSION)
+        self.assertEqual(
+            storage_utility.get_saved_stops(123456), ["45029", "43099", "42071"]
+        )
+        self.assertTrue(storage_utility.check_user_exists(999111))
+        self.assertEqual(storage_utility.get_saved_stops(999111), [])
+
+        # already migrated
+        SQLiteBackend(path).close()
+        self.assertEqual(len(storage_utility.get_saved_stops(123456)), 3)
+
+
+class TestConnections(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "bus_arrival_bot.db")
+        # a new database file is initialized
+        self.backend = SQLiteBackend(path)
+        self.storage_utility = StorageUtility(self.backend)
+        self.addCleanup(self.storage_utility.close)
+
+    def run_in_thread(self, target):
+        result = []
+        thread = threading.Thread(target=lambda: result.append(target()))
+        thread.start()
+        thread.join()
+        return result[0]
+
+    def read_saved_stops(self):
+        # bypasses the profile cache
+        con = self.backend.con
+        return con.execute("SELECT bus_stop_code FROM saved_stops;").fetchall()
+
+    def test_pragmas(self):
+        con = self.backend.con
+        self.assertEqual(con.execute("PRAGMA journal_mode;").fetchone(), ("wal",))
+        # 1 is NORMAL
+        self.assertEqual(con.execute("PRAGMA synchronous;").fetchone(), (1,))
+
+    def test_connection_per_thread(self):
+        self.storage_utility.save_stops(123456, ["42012"])
+        self.assertIsNot(
+            self.run_in_thread(lambda: self.backend.con),
+            self.backend.con,
+        )
+        self.assertEqual(self.run_in_thread(self.read_saved_stops), [("42012",)])
+
+    def test_read_during_write(self):
+        """
+        readers see the last commit while another connection is writing
+        """
+        self.storage_utility.save_stops(123456, ["42012"])
+        con = self.backend.con
+        con.execute("BEGIN IMMEDIATE;")
+        con.execute("DELETE FROM saved_stops;")
+        try:
+            self.assertEqual(self.run_in_thread(self.read_saved_stops), [("42012",)])
+        finally:
+            con.rollback()
+
+    def test_in_memory_shared_between_threads(self):
+        storage_utility = StorageUtility(SQLiteBackend(MEMORY))
+        self.addCleanup(storage_utility.close)
+        storage_utility.save_stops(123456, ["42012"])
+        self.assertEqual(
+            self.run_in_thread(lambda: storage_utility.get_saved_stops(123456)),
+            ["42012"],
+        )
+        # separate from other in memory databases
+        self.assertFalse(self.storage_utility.check_user_exists(123456))
+
 
 if __name__ == "__main__":
     unittest.main()
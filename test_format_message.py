@@ -1,5 +1,16 @@
 import unittest
-from format_message import bus_stop_search_msg, next_bus_msg
+
+import numpy as np
+
+from bus_service.bus_route import RouteStops, StopService
+from bus_service.journey_planner import JourneyLeg, make_journey
+from format_message import (
+    bus_route_msg,
+    bus_stop_search_msg,
+    journey_msg,
+    next_bus_msg,
+    stop_services_msg,
+)
 from utils.custom_typings import BusStop, BusInfo
 
 STOPS: list[BusStop] = [
@@ -117,6 +128,79 @@ class TestBusSearch(unittest.TestCase):
         self.assertEqual(msg, expected_str)
 
 
+class TestBusRoute(unittest.TestCase):
+    def test_route(self):
+        route = RouteStops(
+            stops=tuple(STOPS[1:3]),
+            distances=np.array([0, 1.25], dtype=np.float32),
+            first_last_bus=np.array(
+                [[330, 1410, 330, 1410, 360, -1], [332, 1412, 332, 1412, 362, -1]],
+                dtype=np.int16,
+            ),
+        )
+        msg = bus_route_msg("975", route)
+        expected_str = """Route for bus 975
+
+First/last bus from Opp Heavy Veh Pk
+Weekdays: 0530 - 2330
+Saturdays: 0530 - 2330
+Sundays: 0600 - -
+
+/45029 Opp Heavy Veh Pk | 0.0km
+/45359 Blk 790 | 1.2km"""
+        self.assertEqual(msg, expected_str)
+
+
+class TestStopServices(unittest.TestCase):
+    def test_services(self):
+        stop_services = [
+            StopService("961M", 1, 3),
+            StopService("67", 1, 10),
+            StopService("67", 2, 5),
+            StopService("2", 1, 1),
+            StopService("67W", 1, 1),
+        ]
+        msg = stop_services_msg(STOPS[0], stop_services)
+        expected_str = """Resorts World Sentosa | 14519
+
+Services stopping here:
+2, 67, 67W, 961M"""
+        self.assertEqual(msg, expected_str)
+
+    def test_no_services(self):
+        msg = stop_services_msg(STOPS[0], [])
+        self.assertEqual(msg, "Resorts World Sentosa | 14519\n\nNo services stop here")
+
+
+class TestJourney(unittest.TestCase):
+    def test_journeys(self):
+        journeys = [
+            make_journey(JourneyLeg("975", 1, STOPS[2], STOPS[1], 1, 0.5)),
+            make_journey(
+                JourneyLeg("961", 1, STOPS[2], STOPS[0], 2, 1.25),
+                JourneyLeg("190", 1, STOPS[0], STOPS[1], 3, 2),
+            ),
+        ]
+        msg = journey_msg(STOPS[2], STOPS[1], journeys)
+        expected_str = """Trips from Blk 790 | 45359 to Opp Heavy Veh Pk | 45029
+
+975 | 1 stop | 0.5km
+975: /45359 Blk 790 to /45029 Opp Heavy Veh Pk | 1 stop
+
+961 > 190 | 5 stops | 3.2km
+961: /45359 Blk 790 to /14519 Resorts World Sentosa | 2 stops
+190: /14519 Resorts World Sentosa to /45029 Opp Heavy Veh Pk | 3 stops"""
+        self.assertEqual(msg, expected_str)
+
+    def test_no_journeys(self):
+        msg = journey_msg(STOPS[2], STOPS[1], [])
+        self.assertEqual(
+            msg,
+            "Trips from Blk 790 | 45359 to Opp Heavy Veh Pk | 45029\n\n"
+            "No direct or one transfer trips found",
+        )
+
+
 class TestBusArrival(unittest.TestCase):
     def test_arrival(self):
         msg = next_bus_msg(STOPS[0], BUS_123, 1736351595)
@@ -1,3 +1,4 @@
+from collections.abc import Sequence
 from typing import TypedDict
 
 
@@ -20,7 +21,7 @@ class BusRoute(TypedDict):
 
 
 class AllBusRoutes(TypedDict):
-    bus_routes: list[BusRoute]
+    bus_routes: Sequence[BusRoute]
     checksum: str
 
 
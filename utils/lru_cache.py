@@ -1,5 +1,6 @@
 from collections import OrderedDict
 from dataclasses import dataclass, field
+import threading
 import time
 from typing import Generic, NamedTuple, TypeVar
 
@@ -8,43 +9,132 @@ T = TypeVar("T")
 
 class CacheItem(NamedTuple, Generic[T]):
     value: T
-    expiry: int
+    expiry: float
+    hard_expiry: float
+
+
+class CacheStats(NamedTuple):
+    hits: int  # includes stale hits
+    stale_hits: int
+    misses: int
+    evictions: int  # items dropped to stay within item_limit
+    expirations: int  # items dropped after hard_ttl
+    size: int
 
 
 @dataclass
 class LRUCache(Generic[T]):
+    """
+    least recently used cache where items expire after ttl seconds
+
+    expiry uses a monotonic clock so it is not affected by changes to the system time
+    all operations are O(1) and guarded by a lock, so the cache can be shared
+    between threads and between coroutines (the lock is never held across an await)
+    """
+
     item_cache: OrderedDict[str, CacheItem[T]] = field(default_factory=OrderedDict)
-    ttl: int = 20  # time in seconds
+    ttl: float = 20  # time in seconds
     item_limit: int = 100
+    # time in seconds an item is kept for, stale items can be read with get_stale
+    # defaults to ttl, meaning items are discarded as soon as they expire
+    hard_ttl: float | None = None
+    hits: int = field(default=0, init=False)
+    stale_hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+    evictions: int = field(default=0, init=False)
+    expirations: int = field(default=0, init=False)
+    __lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False, compare=False
+    )
 
-    def __is_expired(self, item: CacheItem[T]) -> bool:
-        return int(time.time()) > item.expiry
+    def __is_expired(self, item: CacheItem[T], now: float) -> bool:
+        return now >= item.expiry
 
-    def __touch(self, key: str) -> None:
-        "re-insert key to update insertion order"
-        item = self.item_cache.get(key, None)
-        if item is not None:
-            self.item_cache[key] = CacheItem(item.value, int(time.time()) + self.ttl)
-            self.item_cache.move_to_end(key)
-
-    def get(self, key: str) -> T | None:
+    def __get_item(self, key: str, now: float) -> CacheItem[T] | None:
+        "get item and update its recency, must be called with the lock held"
         item = self.item_cache.get(key, None)
         if item is None:
+            self.misses += 1
             return None
-        if self.__is_expired(item):
+        if now >= item.hard_expiry:
             del self.item_cache[key]
+            self.expirations += 1
+            self.misses += 1
             return None
-        self.__touch(key)
-        return item.value
+        # move key to the end to update recency, expiry is left unchanged
+        self.item_cache.move_to_end(key)
+        return item
+
+    def get(self, key: str) -> T | None:
+        with self.__lock:
+            now = time.monotonic()
+            item = self.__get_item(key, now)
+            if item is None:
+                return None
+            if self.__is_expired(item, now):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return item.value
+
+    def get_stale(self, key: str) -> tuple[T, bool] | None:
+        """
+        get an item even if it has expired, as long as it is within hard_ttl
+
+        returns the value together with whether it has expired
+        """
+        with self.__lock:
+            now = time.monotonic()
+            item = self.__get_item(key, now)
+            if item is None:
+                return None
+            is_expired = self.__is_expired(item, now)
+            self.hits += 1
+            if is_expired:
+                self.stale_hits += 1
+            return item.value, is_expired
+
+    def is_fresh(self, key: str) -> bool:
+        """
+        check if an unexpired item exists
+        does not update recency or statistics
+        """
+        with self.__lock:
+            item = self.item_cache.get(key, None)
+            return item is not None and not self.__is_expired(item, time.monotonic())
 
     def set(self, key: str, value: T) -> None:
-        if key in self.item_cache:
-            # remove old entry
-            del self.item_cache[key]
+        with self.__lock:
+            if key in self.item_cache:
+                # remove old entry
+                del self.item_cache[key]
+
+            if len(self.item_cache) >= self.item_limit:
+                # delete oldest item
+                self.item_cache.popitem(last=False)
+                self.evictions += 1
+
+            # add item to cache
+            now = time.monotonic()
+            hard_ttl = (
+                self.ttl if self.hard_ttl is None else max(self.ttl, self.hard_ttl)
+            )
+            self.item_cache[key] = CacheItem(value, now + self.ttl, now + hard_ttl)
 
-        if len(self.item_cache) >= self.item_limit:
-            # delete oldest item
-            self.item_cache.popitem(last=False)
+    def delete(self, key: str) -> None:
+        """
+        remove an item, e.g. when the value it was read from has changed
+        """
+        with self.__lock:
+            self.item_cache.pop(key, None)
 
-        # add item to cache
-        self.item_cache[key] = CacheItem(value, int(time.time()) + self.ttl)
+    def stats(self) -> CacheStats:
+        with self.__lock:
+            return CacheStats(
+                hits=self.hits,
+                stale_hits=self.stale_hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                expirations=self.expirations,
+                size=len(self.item_cache),
+            )
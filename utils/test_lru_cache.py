@@ -1,7 +1,9 @@
+import threading
+
 from freezegun import freeze_time
 import pytest
 
-from .lru_cache import LRUCache
+from .lru_cache import CacheStats, LRUCache
 
 
 def test_key_existence():
@@ -83,6 +85,15 @@ def test_none_values_are_allowed():
     assert "a" in cache.item_cache
 
 
+def test_delete():
+    cache = LRUCache(ttl=5, item_limit=5)
+    cache.set("a", 1)
+    cache.delete("a")
+    cache.delete("b")
+    assert cache.get("a") is None
+    assert cache.stats().size == 0
+
+
 @pytest.mark.parametrize("ttl", [1, 2, 3])
 def test_parametrized_ttl(ttl):
     with freeze_time() as frozen_datetime:
@@ -90,3 +101,72 @@ def test_parametrized_ttl(ttl):
         cache.set("a", "value")
         frozen_datetime.tick(ttl + 1)
         assert cache.get("a") is None
+
+
+def test_get_does_not_extend_expiry():
+    with freeze_time() as frozen_datetime:
+        cache = LRUCache(ttl=3, item_limit=10)
+        cache.set("a", 1)
+        frozen_datetime.tick(2)
+        assert cache.get("a") == 1
+        frozen_datetime.tick(2)
+        assert cache.get("a") is None
+
+
+def test_get_stale():
+    with freeze_time() as frozen_datetime:
+        cache = LRUCache(ttl=2, item_limit=10, hard_ttl=5)
+        cache.set("a", 1)
+        assert cache.get_stale("a") == (1, False)
+        frozen_datetime.tick(3)
+        # expired but still within hard ttl
+        assert cache.get("a") is None
+        assert cache.get_stale("a") == (1, True)
+        frozen_datetime.tick(3)
+        assert cache.get_stale("a") is None
+        assert "a" not in cache.item_cache
+
+
+def test_get_stale_without_hard_ttl():
+    with freeze_time() as frozen_datetime:
+        cache = LRUCache(ttl=2, item_limit=10)
+        cache.set("a", 1)
+        frozen_datetime.tick(3)
+        assert cache.get_stale("a") is None
+
+
+def test_stats():
+    with freeze_time() as frozen_datetime:
+        cache = LRUCache(ttl=2, item_limit=2, hard_ttl=4)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.set("c", 3)  # evicts "a"
+        assert cache.get("a") is None
+        assert cache.get("b") == 2
+        frozen_datetime.tick(3)
+        assert cache.get_stale("c") == (3, True)
+        frozen_datetime.tick(2)
+        assert cache.get_stale("c") is None  # expires "c"
+        assert cache.stats() == CacheStats(
+            hits=2, stale_hits=1, misses=2, evictions=1, expirations=1, size=1
+        )
+
+
+def test_concurrent_access():
+    cache = LRUCache(ttl=10, item_limit=50)
+
+    def worker(offset: int):
+        for i in range(1000):
+            key = f"k{(i + offset) % 100}"
+            cache.set(key, i)
+            cache.get(key)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = cache.stats()
+    assert stats.size == len(cache.item_cache) <= 50
+    assert stats.hits + stats.misses == 8 * 1000